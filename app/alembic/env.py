@@ -8,6 +8,7 @@ from app.models.users import Users
 from app.models.orders import Order
 from app.models.files import Files
 from app.models.chat import Chat
+from app.models.outbox import OutboxEvent
 
 load_dotenv()
 
@@ -0,0 +1,167 @@
+import logging
+import os
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.exc import ProgrammingError
+
+from app.api.base import BaseApi
+from app.models.constants import ORDER_STATUSES
+from app.models.users import Users
+from app.schemas.analytics import OrdersAnalytics, SignupsAnalytics
+from app.services.analytics import (
+    ORDERS_DAILY,
+    SIGNUPS_DAILY,
+    AnalyticsCache,
+    orders_report_query,
+    signups_report_query,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsApi(BaseApi):
+    DEFAULT_DAYS = int(os.getenv("ANALYTICS_DEFAULT_DAYS", 30))
+    MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", 366))
+    cache = AnalyticsCache()
+
+    def __init__(self):
+        super().__init__()
+        self.router.add_api_route(
+            "/orders",
+            self.get_orders_analytics,
+            methods=["GET"],
+            response_model=OrdersAnalytics,
+        )
+        self.router.add_api_route(
+            "/signups",
+            self.get_signups_analytics,
+            methods=["GET"],
+            response_model=SignupsAnalytics,
+        )
+
+    def check_superuser(self, user: Users):
+        if not user.is_superuser:
+            raise HTTPException(status_code=403, detail="Forbidden")
+
+    def period(
+        self, date_from: Optional[date], date_to: Optional[date]
+    ) -> tuple[date, date]:
+        """
+        Период отчёта: по умолчанию последние DEFAULT_DAYS дней,
+        не длиннее MAX_DAYS.
+        """
+        date_to = date_to or date.today()
+        date_from = date_from or date_to - timedelta(days=self.DEFAULT_DAYS - 1)
+        if date_from > date_to:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="date_from must not be after date_to",
+            )
+        if (date_to - date_from).days >= self.MAX_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Period must not exceed {self.MAX_DAYS} days",
+            )
+        return date_from, date_to
+
+    async def report_rows(self, query) -> Optional[list]:
+        """
+        Строки отчёта или None, если представления ещё нет: оно создаётся
+        при запуске приложения и задачей обновления.
+        """
+        try:
+            async with self.db as db:
+                return (await db.execute(query)).all()
+        except ProgrammingError as e:
+            logger.error(f"Представление аналитики недоступно: {e}")
+            return None
+
+    async def get_orders_analytics(
+        self,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> OrdersAnalytics:
+        """
+        Заказы и GMV по дням и статусам из mv_orders_daily.
+        Ответ кэшируется до следующего обновления представлений.
+        Args:
+            date_from: Начало периода включительно
+            date_to: Конец периода включительно
+            current_user: Авторизованный суперпользователь
+        """
+        self.check_superuser(current_user)
+        date_from, date_to = self.period(date_from, date_to)
+        key = await self.cache.key("orders", f"{date_from}:{date_to}")
+        cached = await self.cache.get(key)
+        if cached:
+            return OrdersAnalytics(**cached)
+        rows = await self.report_rows(orders_report_query(date_from, date_to))
+        if rows is None:
+            return OrdersAnalytics(
+                date_from=date_from,
+                date_to=date_to,
+                refreshed_at=None,
+                orders=0,
+                gmv=0,
+                rows=[],
+            )
+        report = OrdersAnalytics(
+            date_from=date_from,
+            date_to=date_to,
+            refreshed_at=await self.cache.refreshed_at(ORDERS_DAILY),
+            orders=sum(row.orders for row in rows),
+            gmv=sum(row.gmv for row in rows),
+            rows=[
+                {
+                    "day": row.day,
+                    "status": ORDER_STATUSES.get(row.status_id, str(row.status_id)),
+                    "orders": row.orders,
+                    "gmv": row.gmv,
+                }
+                for row in rows
+            ],
+        )
+        await self.cache.set(key, report.model_dump(mode="json"))
+        return report
+
+    async def get_signups_analytics(
+        self,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> SignupsAnalytics:
+        """
+        Регистрации пользователей по дням из mv_signups_daily.
+        Ответ кэшируется до следующего обновления представлений.
+        Args:
+            date_from: Начало периода включительно
+            date_to: Конец периода включительно
+            current_user: Авторизованный суперпользователь
+        """
+        self.check_superuser(current_user)
+        date_from, date_to = self.period(date_from, date_to)
+        key = await self.cache.key("signups", f"{date_from}:{date_to}")
+        cached = await self.cache.get(key)
+        if cached:
+            return SignupsAnalytics(**cached)
+        rows = await self.report_rows(signups_report_query(date_from, date_to))
+        if rows is None:
+            return SignupsAnalytics(
+                date_from=date_from,
+                date_to=date_to,
+                refreshed_at=None,
+                signups=0,
+                rows=[],
+            )
+        report = SignupsAnalytics(
+            date_from=date_from,
+            date_to=date_to,
+            refreshed_at=await self.cache.refreshed_at(SIGNUPS_DAILY),
+            signups=sum(row.signups for row in rows),
+            rows=[{"day": row.day, "signups": row.signups} for row in rows],
+        )
+        await self.cache.set(key, report.model_dump(mode="json"))
+        return report
@@ -3,22 +3,47 @@ from fastapi import (
     HTTPException,
     status,
 )
-from sqlalchemy import (
-    select,
-    desc,
-)
+from sqlalchemy import select
 from uuid import UUID
-from typing import List
-from app.models.chat import Chat, Message
+from datetime import datetime
+from typing import List, Optional
+from app.models.chat import Chat, ChatParticipant
 from app.models.users import Users
-from app.schemas.chat import ChatOut, MessageOut
+from app.schemas.chat import (
+    ChatOut,
+    GroupChatCreate,
+    MessageOut,
+    UnreadOut,
+    InboxChatOut,
+    LastMessageOut,
+    PresenceOut,
+)
 from app.api.base import BaseApi
+from app.services.chat import (
+    contacts_query,
+    inbox_query,
+    messages_page_query,
+    user_chats_clause,
+)
+from app.services.chat_cache import ChatCache
+from app.services.decryption import message_decryptor
+from app.services.delivery import UnreadCounters
+from app.services.presence import Presence
+from app.services.search import SEARCH_ENABLED, messages_by_ids_query, search_query
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
 class ChatApi(BaseApi):
+    MESSAGES_PAGE_LIMIT = 200
+    INBOX_PAGE_LIMIT = 100
+    PREVIEW_LENGTH = 100
+    GROUP_MAX_MEMBERS = 5000
+    chat_cache = ChatCache()
+    unread_counters = UnreadCounters()
+    presence = Presence()
+
     def __init__(self):
         super().__init__()
         self.tags = ["Chats"]
@@ -35,12 +60,59 @@ class ChatApi(BaseApi):
             methods=["GET"],
             response_model=List[ChatOut],
         )
+        self.router.add_api_route(
+            "/group",
+            self.create_group_chat,
+            methods=["POST"],
+            response_model=ChatOut,
+            status_code=status.HTTP_201_CREATED,
+        )
+        self.router.add_api_route(
+            "/inbox",
+            self.get_inbox,
+            methods=["GET"],
+            response_model=List[InboxChatOut],
+        )
+        self.router.add_api_route(
+            "/unread",
+            self.get_unread,
+            methods=["GET"],
+            response_model=UnreadOut,
+        )
+        self.router.add_api_route(
+            "/presence",
+            self.get_presence,
+            methods=["GET"],
+            response_model=List[PresenceOut],
+        )
         self.router.add_api_route(
             "/{chat_id}/messages",
             self.get_messages,
             methods=["GET"],
             response_model=List[MessageOut],
         )
+        self.router.add_api_route(
+            "/{chat_id}/search",
+            self.search_messages,
+            methods=["GET"],
+            response_model=List[MessageOut],
+        )
+        self.router.add_api_route(
+            "/{chat_id}/read",
+            self.mark_read,
+            methods=["POST"],
+        )
+        self.router.add_api_route(
+            "/{chat_id}/members",
+            self.add_member,
+            methods=["POST"],
+            status_code=status.HTTP_201_CREATED,
+        )
+        self.router.add_api_route(
+            "/{chat_id}/members/{user_id}",
+            self.remove_member,
+            methods=["DELETE"],
+        )
 
     async def create_chat(
         self,
@@ -57,8 +129,14 @@ class ChatApi(BaseApi):
         Returns:
             ChatOut: Созданный чат
         Raises:
-            HTTPException: Если пользователь не имеет прав или участники не найдены
+            HTTPException: Если пользователь не имеет прав, участники не найдены
+                или заказчик и исполнитель совпадают
         """
+        if customer_id == performer_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Customer and performer must be different users",
+            )
         if current_user.id not in [customer_id, performer_id]:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -94,6 +172,54 @@ class ChatApi(BaseApi):
                 )
             chat = Chat(customer_id=customer_id, performer_id=performer_id)
             db.add(chat)
+            await db.flush()
+            db.add_all(
+                [
+                    ChatParticipant(chat_id=chat.id, user_id=customer_id),
+                    ChatParticipant(chat_id=chat.id, user_id=performer_id),
+                ]
+            )
+            await self.update_db(db, chat)
+        return chat
+
+    async def create_group_chat(
+        self,
+        group: GroupChatCreate,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> ChatOut:
+        """
+        Создание группового чата. Создатель становится участником автоматически.
+        Args:
+            group: Название чата и ID участников
+            current_user: Авторизованный пользователь
+        Returns:
+            ChatOut: Созданный чат
+        Raises:
+            HTTPException: Если участников слишком много или они не найдены
+        """
+        member_ids = set(group.member_ids) | {current_user.id}
+        if len(member_ids) > self.GROUP_MAX_MEMBERS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Group chat can have at most "
+                f"{self.GROUP_MAX_MEMBERS} members",
+            )
+        async with self.db as db:
+            found = await db.execute(select(Users.id).where(Users.id.in_(member_ids)))
+            if len(found.scalars().all()) != len(member_ids):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Some members not found",
+                )
+            chat = Chat(is_group=True, title=group.title, created_by=current_user.id)
+            db.add(chat)
+            await db.flush()
+            db.add_all(
+                [
+                    ChatParticipant(chat_id=chat.id, user_id=member_id)
+                    for member_id in member_ids
+                ]
+            )
             await self.update_db(db, chat)
         return chat
 
@@ -110,62 +236,332 @@ class ChatApi(BaseApi):
         """
         async with self.db as db:
             chats = await db.execute(
-                select(Chat).where(
-                    (Chat.customer_id == current_user.id)
-                    | (Chat.performer_id == current_user.id)
-                )
+                select(Chat).where(user_chats_clause(current_user.id))
             )
             chats = chats.scalars().all()
         return chats
 
+    async def get_inbox(
+        self,
+        before_at: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+        limit: int = 20,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> List[InboxChatOut]:
+        """
+        Список чатов для экрана «входящие»: последнее сообщение,
+        время активности и число непрочитанных по каждому чату.
+        Args:
+            before_at: Курсор - last_message_at последнего чата предыдущей страницы
+            before_id: Курсор - ID последнего чата предыдущей страницы
+            limit: Лимит записей
+            current_user: Авторизованный пользователь
+        Returns:
+            List[InboxChatOut]: Чаты от недавно активных к старым
+        """
+        if (before_at is None) != (before_id is None):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="before_at and before_id must be passed together",
+            )
+        limit = max(1, min(limit, self.INBOX_PAGE_LIMIT))
+        async with self.db as db:
+            rows = await db.execute(
+                inbox_query(current_user.id, before_at, before_id, limit)
+            )
+            rows = rows.all()
+        unread = await self.unread_counters.get_all(current_user.id)
+        previews = await message_decryptor.decrypt_many(
+            (message.id, message.ciphertext) for _, message in rows if message
+        )
+        previews = iter(previews)
+        inbox = []
+        for chat, message in rows:
+            last_message = None
+            if message:
+                last_message = LastMessageOut(
+                    id=message.id,
+                    sender_id=message.sender_id,
+                    preview=next(previews)[: self.PREVIEW_LENGTH],
+                    created_at=message.created_at,
+                )
+            inbox.append(
+                InboxChatOut(
+                    id=chat.id,
+                    customer_id=chat.customer_id,
+                    performer_id=chat.performer_id,
+                    is_group=bool(chat.is_group),
+                    created_at=chat.created_at,
+                    last_message_at=chat.last_message_at,
+                    last_message=last_message,
+                    unread=unread.get(chat.id, 0),
+                )
+            )
+        return inbox
+
     async def get_messages(
         self,
         chat_id: int,
-        skip: int = 0,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
         limit: int = 50,
         current_user: Users = Depends(BaseApi.get_current_user),
     ) -> List[MessageOut]:
         """
-        Получение сообщений в чате с пагинацией.
+        Получение сообщений в чате с keyset-пагинацией.
         Args:
-            chat_id: UUID чата
-            skip: Пропуск записей
+            chat_id: ID чата
+            before_id: Курсор - вернуть сообщения старше указанного
+            after_id: Курсор - вернуть сообщения новее указанного
             limit: Лимит записей
-            current_user: Авторизованный пользователь
 
         Returns:
-            List[MessageOut]: Список сообщений
+            List[MessageOut]: Список сообщений. Без курсора и с before_id -
+            от новых к старым, с after_id - в хронологическом порядке.
         Raises:
             HTTPException: Если чат не найден или пользователь не имеет доступа
         """
+        if before_id is not None and after_id is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Use either before_id or after_id, not both",
+            )
+        limit = max(1, min(limit, self.MESSAGES_PAGE_LIMIT))
+        first_page = before_id is None and after_id is None
+        if first_page:
+            cached = await self.chat_cache.get_recent(chat_id, current_user.id, limit)
+            if cached is not None:
+                texts = await message_decryptor.decrypt_many(
+                    (msg["id"], self.chat_cache.ciphertext(msg)) for msg in cached
+                )
+                for msg, text in zip(cached, texts):
+                    msg.pop("payload", None)
+                    msg["content"] = text
+                return cached
+        async with self.db as db:
+            messages = await db.execute(
+                messages_page_query(
+                    chat_id, current_user.id, before_id, after_id, limit
+                )
+            )
+            messages = messages.scalars().all()
+            if not messages:
+                # пустая страница: отличаем пустой чат от отсутствия доступа
+                chat = await db.get(Chat, chat_id)
+                if not chat:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Chat not found",
+                    )
+                if not await self.chat_cache.is_member(db, chat_id, current_user.id):
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail="You do not have access to this chat",
+                    )
+            if first_page:
+                await self.chat_cache.warm(db, chat_id)
+        texts = await message_decryptor.decrypt_many(
+            (msg.id, msg.ciphertext) for msg in messages
+        )
+        for msg, text in zip(messages, texts):
+            msg.content = text
+        return messages
+
+    async def search_messages(
+        self,
+        chat_id: int,
+        q: str,
+        before_id: Optional[int] = None,
+        limit: int = 20,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> List[MessageOut]:
+        """
+        Поиск сообщений чата по словам через слепой индекс.
+        Расшифровываются только найденные сообщения.
+        Args:
+            chat_id: ID чата
+            q: Слова для поиска, ищутся сообщения со всеми словами
+            before_id: Курсор - ID последнего сообщения предыдущей страницы
+            limit: Лимит записей
+            current_user: Авторизованный пользователь
+        Returns:
+            List[MessageOut]: Найденные сообщения от новых к старым
+        """
+        if not SEARCH_ENABLED:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Message search is disabled",
+            )
+        limit = max(1, min(limit, self.MESSAGES_PAGE_LIMIT))
+        query = search_query(chat_id, current_user.id, q, before_id, limit)
+        if query is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Search query has no searchable words",
+            )
+        async with self.db as db:
+            message_ids = (await db.execute(query)).scalars().all()
+            if not message_ids:
+                if not await self.chat_cache.is_member(db, chat_id, current_user.id):
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail="You do not have access to this chat",
+                    )
+                return []
+            messages = await db.execute(messages_by_ids_query(message_ids))
+            messages = messages.scalars().all()
+        texts = await message_decryptor.decrypt_many(
+            (msg.id, msg.ciphertext) for msg in messages
+        )
+        for msg, text in zip(messages, texts):
+            msg.content = text
+        return messages
+
+    async def get_unread(
+        self,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> UnreadOut:
+        """
+        Счётчики непрочитанных сообщений по всем чатам пользователя.
+        Args:
+            current_user: Авторизованный пользователь
+        Returns:
+            UnreadOut: Непрочитанные по чатам и их общее количество
+        """
+        chats = await self.unread_counters.get_all(current_user.id)
+        return UnreadOut(chats=chats, total=sum(chats.values()))
+
+    async def get_presence(
+        self,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> List[PresenceOut]:
+        """
+        Присутствие всех собеседников пользователя:
+        один запрос к БД за списком контактов и один к Redis за статусами.
+        Args:
+            current_user: Авторизованный пользователь
+        Returns:
+            List[PresenceOut]: В сети ли собеседник и когда был активен
+        """
+        async with self.db as db:
+            contacts = await db.execute(contacts_query(current_user.id))
+            contacts = [
+                user_id
+                for user_id in contacts.scalars().all()
+                if user_id and user_id != current_user.id
+            ]
+        statuses = await self.presence.get_many(contacts)
+        return [
+            PresenceOut(user_id=user_id, **status)
+            for user_id, status in statuses.items()
+        ]
+
+    async def mark_read(
+        self,
+        chat_id: int,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ):
+        """
+        Сброс счётчика непрочитанных сообщений чата.
+        Args:
+            chat_id: ID чата
+            current_user: Авторизованный пользователь
+        """
+        await self.unread_counters.reset(current_user.id, chat_id)
+        return {"message": f"Chat {chat_id} marked as read"}
+
+    async def add_member(
+        self,
+        chat_id: int,
+        user_id: UUID,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ):
+        """
+        Добавление участника в групповой чат. Добавлять может любой участник.
+        Args:
+            chat_id: ID чата
+            user_id: ID добавляемого пользователя
+            current_user: Авторизованный пользователь
+        Raises:
+            HTTPException: Если чат не групповой, нет доступа
+                или пользователь уже участник
+        """
         async with self.db as db:
-            chat = await db.execute(select(Chat).where(Chat.id == chat_id))
-            chat = chat.scalars().first()
-            if not chat:
+            chat = await self.get_group_chat(db, chat_id)
+            members = await self.chat_cache.get_members(db, chat_id)
+            if current_user.id not in members:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="You do not have access to this chat",
+                )
+            if user_id in members:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="User is already a member of this chat",
+                )
+            if len(members) >= self.GROUP_MAX_MEMBERS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Group chat can have at most "
+                    f"{self.GROUP_MAX_MEMBERS} members",
+                )
+            if not await self.user_exists(db, user_id):
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Chat not found",
+                    detail="User not found",
                 )
+            db.add(ChatParticipant(chat_id=chat.id, user_id=user_id))
+            await self.update_db(db)
+        await self.chat_cache.invalidate_members(chat_id)
+        return {"message": f"User {user_id} added to chat {chat_id}"}
 
-            if current_user.id not in [chat.customer_id, chat.performer_id]:
+    async def remove_member(
+        self,
+        chat_id: int,
+        user_id: UUID,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ):
+        """
+        Удаление участника из группового чата.
+        Выйти может сам участник, удалить другого - только создатель чата.
+        Args:
+            chat_id: ID чата
+            user_id: ID удаляемого пользователя
+            current_user: Авторизованный пользователь
+        Raises:
+            HTTPException: Если чат не групповой, нет прав
+                или пользователь не участник
+        """
+        async with self.db as db:
+            chat = await self.get_group_chat(db, chat_id)
+            if current_user.id not in [user_id, chat.created_by]:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
-                    detail="You do not have access to this chat",
+                    detail="Only the chat creator can remove other members",
                 )
+            participant = await db.get(ChatParticipant, (chat_id, user_id))
+            if not participant:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User is not a member of this chat",
+                )
+            await db.delete(participant)
+            await self.update_db(db)
+        await self.chat_cache.invalidate_members(chat_id)
+        await self.unread_counters.reset(user_id, chat_id)
+        return {"message": f"User {user_id} removed from chat {chat_id}"}
 
-            messages = await db.execute(
-                select(Message)
-                .where(Message.chat_id == chat_id)
-                .order_by(desc(Message.created_at))
-                .offset(skip)
-                .limit(limit)
+    @staticmethod
+    async def get_group_chat(db, chat_id: int) -> Chat:
+        chat = await db.get(Chat, chat_id)
+        if not chat:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat not found",
             )
-            messages = messages.scalars().all()
-        for msg in messages:
-            try:
-                msg.content = self.security.cipher.decrypt(
-                    msg.content.encode()
-                ).decode()
-            except Exception:
-                msg.content = "Ошибка расшифровки"
-        return messages
+        if not chat.is_group:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Members can be changed only in group chats",
+            )
+        return chat
@@ -1,14 +1,36 @@
 import os
 import uuid
+from datetime import datetime
 from io import BytesIO
 from operator import or_
+from typing import Optional
 from uuid import UUID
 from app.core.storage import SupabaseStorage
-from sqlalchemy import delete, select, update
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.orm import selectinload
 from app.api.base import BaseApi
-from app.models.users import Users
+from app.models.users import Users, UserSkills
+from app.models.constants import ORDER_STATUSES
+from app.services.leaderboard import Leaderboard, increment_stats_query
+from app.services.orders import (
+    ASSIGNED_ROLE,
+    CREATED_ROLE,
+    completed_by,
+    counter_deltas,
+    counter_key,
+    counters_upsert_query,
+    feed_query,
+    is_open,
+    user_orders_query,
+)
+from app.services.outbox import (
+    ORDER_CREATED,
+    ORDER_DELETED,
+    ORDER_UPDATED,
+    add_event,
+)
 from app.schemas.orders import (
+    OrderDashboard,
     OrderList,
     CreateOrder,
     OrderBase,
@@ -23,10 +45,15 @@ from fastapi import (
 from app.models.orders import (
     Order,
     OrderAttachment,
+    OrderSkill,
+    UserOrderCounter,
 )
 
 
 class OrdersApi(BaseApi):
+    FEED_PAGE_LIMIT = int(os.getenv("ORDER_FEED_PAGE_LIMIT", 50))
+    leaderboard = Leaderboard()
+
     def __init__(self):
         super().__init__()
         self.router.add_api_route(
@@ -35,6 +62,15 @@ class OrdersApi(BaseApi):
         self.router.add_api_route(
             "", self.get_orders, methods=["GET"], response_model=OrderList
         )
+        self.router.add_api_route(
+            "/feed", self.get_feed, methods=["GET"], response_model=OrderList
+        )
+        self.router.add_api_route(
+            "/dashboard",
+            self.get_dashboard,
+            methods=["GET"],
+            response_model=OrderDashboard,
+        )
         self.router.add_api_route(
             "/{order_uuid}",
             self.retrieve_order,
@@ -61,6 +97,25 @@ class OrdersApi(BaseApi):
             methods=["DELETE"],
         )
 
+    @staticmethod
+    async def count_skills(db, skill_ids: set[int]) -> int:
+        """
+        Количество существующих навыков из переданных.
+        """
+        result = await db.execute(
+            select(func.count()).where(UserSkills.id.in_(skill_ids))
+        )
+        return result.scalar_one()
+
+    @staticmethod
+    async def update_counters(db, before, after):
+        """
+        Обновляет счётчики дашборда в текущей транзакции.
+        """
+        deltas = counter_deltas(before, after)
+        if deltas:
+            await db.execute(counters_upsert_query(deltas))
+
     async def create_order(
         self,
         data: CreateOrder,
@@ -74,6 +129,9 @@ class OrdersApi(BaseApi):
                 raise HTTPException(
                     status_code=400, detail="Assigned user does not exist"
                 )
+            skill_ids = set(data.skills)
+            if skill_ids and await self.count_skills(db, skill_ids) != len(skill_ids):
+                raise HTTPException(status_code=400, detail="Unknown skill")
             order = Order(
                 name=data.name,
                 body=data.body,
@@ -83,9 +141,41 @@ class OrdersApi(BaseApi):
                 status_id=data.status,
                 deadline=data.deadline,
                 attachments=data.attachments,
+                skills=[
+                    OrderSkill(
+                        skill_id=skill_id,
+                        is_open=is_open(data.status, data.assign_to),
+                    )
+                    for skill_id in sorted(skill_ids)
+                ],
             )
             db.add(order)
+            await db.flush()
+            await self.update_counters(db, None, counter_key(order))
+            stats = None
+            performer = completed_by(order.status_id, order.assign_to)
+            if performer is not None:
+                # заказ создан сразу завершённым - засчитывается исполнителю
+                stats = (
+                    await db.execute(
+                        increment_stats_query(performer, completed_orders=1)
+                    )
+                ).scalar_one()
+            add_event(
+                db,
+                ORDER_CREATED,
+                {
+                    "order_id": order.id,
+                    "created_by": order.created_by,
+                    "assign_to": order.assign_to,
+                    "status_id": order.status_id,
+                    "skills": sorted(skill_ids),
+                },
+                aggregate_id=order.id,
+            )
             await self.update_db(db, order)
+        if stats is not None:
+            await self.leaderboard.update(stats)
         return order
 
     async def get_orders(
@@ -105,6 +195,101 @@ class OrdersApi(BaseApi):
         except Exception:
             raise HTTPException(status_code=500, detail="Internal Server Error")
 
+    async def get_feed(
+        self,
+        before_at: Optional[datetime] = None,
+        before_id: Optional[UUID] = None,
+        limit: int = 20,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> OrderList:
+        """
+        Лента исполнителя: открытые заказы с его навыками, от новых к старым.
+        Args:
+            before_at: Курсор - created_at последнего заказа предыдущей страницы
+            before_id: Курсор - ID последнего заказа предыдущей страницы
+            limit: Лимит записей
+            current_user: Авторизованный пользователь
+        """
+        if (before_at is None) != (before_id is None):
+            raise HTTPException(
+                status_code=400,
+                detail="before_at and before_id must be passed together",
+            )
+        limit = max(1, min(limit, self.FEED_PAGE_LIMIT))
+        async with self.db as db:
+            result = await db.execute(
+                feed_query(current_user.id, before_at, before_id, limit)
+            )
+            orders = result.scalars().all()
+        return OrderList(orders=orders)
+
+    async def get_dashboard(
+        self,
+        created_before_at: Optional[datetime] = None,
+        created_before_id: Optional[UUID] = None,
+        assigned_before_at: Optional[datetime] = None,
+        assigned_before_id: Optional[UUID] = None,
+        limit: int = 20,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> OrderDashboard:
+        """
+        Заказы текущего пользователя: созданные им и назначенные ему,
+        у каждого списка свой курсор, плюс количество заказов по статусам.
+        Args:
+            created_before_at: Курсор созданных - created_at последнего заказа
+            created_before_id: Курсор созданных - ID последнего заказа
+            assigned_before_at: Курсор назначенных - created_at последнего заказа
+            assigned_before_id: Курсор назначенных - ID последнего заказа
+            limit: Лимит записей в каждом списке
+            current_user: Авторизованный пользователь
+        """
+        if (created_before_at is None) != (created_before_id is None) or (
+            assigned_before_at is None
+        ) != (assigned_before_id is None):
+            raise HTTPException(
+                status_code=400,
+                detail="before_at and before_id must be passed together",
+            )
+        limit = max(1, min(limit, self.FEED_PAGE_LIMIT))
+        async with self.db as db:
+            created = await db.execute(
+                user_orders_query(
+                    current_user.id,
+                    CREATED_ROLE,
+                    created_before_at,
+                    created_before_id,
+                    limit,
+                )
+            )
+            assigned = await db.execute(
+                user_orders_query(
+                    current_user.id,
+                    ASSIGNED_ROLE,
+                    assigned_before_at,
+                    assigned_before_id,
+                    limit,
+                )
+            )
+            counters = await db.execute(
+                select(
+                    UserOrderCounter.role,
+                    UserOrderCounter.status_id,
+                    UserOrderCounter.count,
+                ).where(UserOrderCounter.user_id == current_user.id)
+            )
+            counts = {
+                role: dict.fromkeys(ORDER_STATUSES.values(), 0)
+                for role in (CREATED_ROLE, ASSIGNED_ROLE)
+            }
+            for role, status_id, count in counters.all():
+                if status_id in ORDER_STATUSES:
+                    counts[role][ORDER_STATUSES[status_id]] = count
+            return OrderDashboard(
+                created=created.scalars().all(),
+                assigned=assigned.scalars().all(),
+                counts=counts,
+            )
+
     async def retrieve_order(
         self,
         order_uuid: UUID,
@@ -142,22 +327,73 @@ class OrdersApi(BaseApi):
         Обновление заказа, если он принадлежит текущему пользователю.
         """
         async with self.db as db:
-            query = select(Order).where(
-                Order.id == order_uuid, Order.created_by == current_user.id
+            # блокировка: параллельные обновления не засчитают заказ дважды
+            query = (
+                select(Order)
+                .where(Order.id == order_uuid, Order.created_by == current_user.id)
+                .with_for_update()
             )
             result = await db.execute(query)
             order = result.scalar_one_or_none()
             if not order:
                 raise HTTPException(status_code=404, detail="Order not found")
+            credited = completed_by(order.status_id, order.assign_to)
+            before = counter_key(order)
+            changes = data.model_dump(exclude_unset=True)
+            values = dict(changes)
+            if "deadline" in changes:
+                # новый дедлайн - новое напоминание
+                values["deadline_reminder_sent_at"] = None
             update_query = (
                 update(Order)
                 .where(Order.id == order_uuid)
-                .values(**data.model_dump(exclude_unset=True))
+                .values(**values)
                 .returning(Order)
             )
             updated_result = await db.execute(update_query)
             updated_order = updated_result.scalar_one()
+            await self.update_counters(db, before, counter_key(updated_order))
+            if {"status_id", "assign_to"} & changes.keys():
+                # заказ выходит из ленты исполнителей или возвращается в неё
+                await db.execute(
+                    update(OrderSkill)
+                    .where(OrderSkill.order_id == order_uuid)
+                    .values(
+                        is_open=is_open(
+                            updated_order.status_id, updated_order.assign_to
+                        )
+                    )
+                )
+            add_event(
+                db,
+                ORDER_UPDATED,
+                {
+                    "order_id": order_uuid,
+                    "created_by": updated_order.created_by,
+                    "assign_to": updated_order.assign_to,
+                    "changes": changes,
+                },
+                aggregate_id=order_uuid,
+            )
+            stats = []
+            performer = completed_by(updated_order.status_id, updated_order.assign_to)
+            if performer != credited:
+                # завершённый заказ засчитывается исполнителю, смена
+                # статуса или исполнителя переносит или снимает его;
+                # строки блокируются в порядке user_id, как в reconcile
+                changes_by_user = [
+                    (user_id, delta)
+                    for user_id, delta in ((credited, -1), (performer, 1))
+                    if user_id is not None
+                ]
+                for user_id, delta in sorted(changes_by_user):
+                    stats_result = await db.execute(
+                        increment_stats_query(user_id, completed_orders=delta)
+                    )
+                    stats.append(stats_result.scalar_one())
             await self.update_db(db)
+        for performer_stats in stats:
+            await self.leaderboard.update(performer_stats)
         return updated_order
 
     async def delete_order(
@@ -169,17 +405,39 @@ class OrdersApi(BaseApi):
         Удаление заказа, если он принадлежит текущему пользователю.
         """
         async with self.db as db:
-            query = select(Order).where(
-                Order.id == order_uuid, Order.created_by == current_user.id
+            # счётчики считаются по строке, которую удалил именно этот
+            # запрос: параллельное удаление получит 404, а после
+            # параллельного обновления вернётся уже новый статус
+            delete_query = (
+                delete(Order)
+                .where(Order.id == order_uuid, Order.created_by == current_user.id)
+                .returning(Order.created_by, Order.assign_to, Order.status_id)
             )
-            result = await db.execute(query)
-            order = result.scalar_one_or_none()
+            order = (await db.execute(delete_query)).one_or_none()
             if not order:
                 raise HTTPException(status_code=404, detail="Order not found")
-            delete_query = delete(Order).where(Order.id == order_uuid)
-            await db.execute(delete_query)
+            await self.update_counters(db, counter_key(order), None)
+            stats = None
+            credited = completed_by(order.status_id, order.assign_to)
+            if credited is not None:
+                stats = (
+                    await db.execute(
+                        increment_stats_query(credited, completed_orders=-1)
+                    )
+                ).scalar_one()
+            add_event(
+                db,
+                ORDER_DELETED,
+                {
+                    "order_id": order_uuid,
+                    "created_by": order.created_by,
+                    "assign_to": order.assign_to,
+                },
+                aggregate_id=order_uuid,
+            )
             await db.commit()
-
+        if stats is not None:
+            await self.leaderboard.update(stats)
         return f"Order id {order_uuid} deleted"
 
     async def attach_file_to_order(
@@ -1,23 +1,41 @@
+import os
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import func, select
+from sqlalchemy import exists, func, select
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
-from app.models.users import Users
+from app.models.orders import Order
+from app.models.users import Review, Users, user_review_connector
 from app.schemas.users import (
     UserCreate,
     UserUpdate,
     UserResponse,
     UserList,
+    ReviewCreate,
+    ReviewResponse,
+    PerformerRating,
+    LeaderboardEntry,
 )
-from typing import Dict
+from app.services.leaderboard import Leaderboard, increment_stats_query
+from app.services.orders import COMPLETED_STATUS_ID
+from typing import Dict, List, Literal
 from app.api.base import BaseApi
 
 
 class UsersApi(BaseApi):
+    LEADERBOARD_PAGE_LIMIT = int(os.getenv("LEADERBOARD_PAGE_LIMIT", 100))
+    leaderboard = Leaderboard()
+
     def __init__(self):
         super().__init__()
         self.router.add_api_route(
             "", self.get_users, methods=["GET"], response_model=UserList
         )
+        self.router.add_api_route(
+            "/leaderboard",
+            self.get_leaderboard,
+            methods=["GET"],
+            response_model=List[LeaderboardEntry],
+        )
         self.router.add_api_route(
             "",
             self.create_user,
@@ -34,6 +52,19 @@ class UsersApi(BaseApi):
             methods=["PATCH"],
             response_model=UserResponse,
         )
+        self.router.add_api_route(
+            "/{user_id}/rating",
+            self.get_rating,
+            methods=["GET"],
+            response_model=PerformerRating,
+        )
+        self.router.add_api_route(
+            "/{user_id}/reviews",
+            self.create_review,
+            methods=["POST"],
+            response_model=ReviewResponse,
+            status_code=status.HTTP_201_CREATED,
+        )
 
     def check_superuser(self, user: Users):
         if not user.is_superuser:
@@ -144,3 +175,120 @@ class UsersApi(BaseApi):
             db.add(db_user)
             await self.update_db(db, db_user)
         return db_user
+
+    async def create_review(
+        self,
+        user_id: UUID,
+        data: ReviewCreate,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> ReviewResponse:
+        """
+        Отзыв об исполнителе. Оставить его может только заказчик
+        завершённого исполнителем заказа, один раз на исполнителя.
+        Агрегаты исполнителя обновляются в той же транзакции,
+        рейтинг в Redis - после коммита.
+        """
+        if user_id == current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot review yourself",
+            )
+        async with self.db as db:
+            if not await self.user_exists(db, user_id):
+                raise HTTPException(status_code=404, detail="User not found")
+            if not await self.has_completed_order(db, current_user.id, user_id):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No completed order with this user",
+                )
+            review = Review(
+                text=data.text,
+                score=data.score,
+                created_by=current_user.id,
+                performer_id=user_id,
+            )
+            db.add(review)
+            try:
+                await db.flush()
+            except IntegrityError:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Review already exists",
+                )
+            await db.execute(
+                user_review_connector.insert().values(
+                    user_id=user_id, review_id=review.id
+                )
+            )
+            stats = (
+                await db.execute(
+                    increment_stats_query(
+                        user_id, reviews_count=1, score_sum=data.score
+                    )
+                )
+            ).scalar_one()
+            await self.update_db(db, review)
+        await self.leaderboard.update(stats)
+        return review
+
+    @staticmethod
+    async def has_completed_order(db, customer_id: UUID, performer_id: UUID) -> bool:
+        """Есть ли заказ заказчика, завершённый этим исполнителем."""
+        result = await db.execute(
+            select(
+                exists().where(
+                    Order.created_by == customer_id,
+                    Order.assign_to == performer_id,
+                    Order.status_id == COMPLETED_STATUS_ID,
+                )
+            )
+        )
+        return result.scalar()
+
+    async def get_rating(
+        self,
+        user_id: UUID,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> PerformerRating:
+        """
+        Рейтинг исполнителя: агрегаты и места в рейтингах из Redis.
+        """
+        return PerformerRating(
+            user_id=user_id, **await self.leaderboard.profile(user_id)
+        )
+
+    async def get_leaderboard(
+        self,
+        board: Literal["rating", "completed"] = "rating",
+        offset: int = 0,
+        limit: int = 20,
+        current_user: Users = Depends(BaseApi.get_current_user),
+    ) -> List[LeaderboardEntry]:
+        """
+        Лучшие исполнители по средней оценке или числу завершённых заказов.
+        Страница читается из sorted set'а, имена - одним запросом.
+        """
+        offset = max(offset, 0)
+        limit = max(1, min(limit, self.LEADERBOARD_PAGE_LIMIT))
+        page = await self.leaderboard.page(board, offset, limit)
+        user_ids = [user_id for user_id, _ in page]
+        stats = await self.leaderboard.get_many(user_ids)
+        async with self.db as db:
+            usernames = dict(
+                (
+                    await db.execute(
+                        select(Users.id, Users.username).where(
+                            Users.id.in_([UUID(user_id) for user_id in user_ids])
+                        )
+                    )
+                ).all()
+            )
+        return [
+            LeaderboardEntry(
+                rank=offset + position + 1,
+                user_id=user_id,
+                username=usernames.get(UUID(user_id)),
+                **stats[user_id],
+            )
+            for position, user_id in enumerate(user_ids)
+        ]
@@ -1,6 +1,9 @@
 from celery import Celery
+from celery.signals import before_task_publish
 from dotenv import load_dotenv
+from kombu import Queue
 import os
+import time
 
 load_dotenv()
 
@@ -21,14 +24,90 @@ celery_app.conf.update(
     broker_connection_retry_on_startup=True,
 )
 
+# Очереди по семействам задач, у каждого семейства свой воркер
+# (см. docker-compose), поэтому поток уведомлений не задерживает
+# обслуживание, а тяжёлые пакетные задачи - уведомления.
+# Приоритеты в Redis: 0 - самый высокий, 9 - самый низкий;
+# сообщения раскладываются по спискам PRIORITY_STEPS.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 3
+PRIORITY_LOW = 9
+PRIORITY_STEPS = [0, 3, 6, 9]
+
+celery_app.conf.update(
+    task_queues=(
+        Queue("default"),
+        Queue("notifications"),
+        Queue("email"),
+        Queue("maintenance"),
+        Queue("bulk"),
+    ),
+    task_default_queue="default",
+    task_default_priority=PRIORITY_NORMAL,
+    task_queue_max_priority=max(PRIORITY_STEPS),
+    task_routes={
+        "app.tasks.notifications.*": {
+            "queue": "notifications",
+            "priority": PRIORITY_HIGH,
+        },
+        "app.tasks.outbox.*": {"queue": "notifications", "priority": PRIORITY_HIGH},
+        "app.tasks.email_tasks.*": {"queue": "email", "priority": PRIORITY_NORMAL},
+        "app.tasks.celery_period_tasks.*": {
+            "queue": "maintenance",
+            "priority": PRIORITY_HIGH,
+        },
+        "app.tasks.deadlines.*": {"queue": "maintenance", "priority": PRIORITY_NORMAL},
+        "app.tasks.leaderboard.*": {"queue": "maintenance", "priority": PRIORITY_LOW},
+        "app.tasks.order_counters.*": {
+            "queue": "maintenance",
+            "priority": PRIORITY_LOW,
+        },
+        "app.tasks.message_encryption.*": {"queue": "bulk", "priority": PRIORITY_LOW},
+        "app.tasks.message_search.*": {"queue": "bulk", "priority": PRIORITY_LOW},
+        "app.tasks.chat_inbox.*": {"queue": "bulk", "priority": PRIORITY_LOW},
+        "app.tasks.order_feed.*": {"queue": "bulk", "priority": PRIORITY_NORMAL},
+        "app.tasks.analytics.*": {"queue": "bulk", "priority": PRIORITY_NORMAL},
+        "app.tasks.probes.probe_latency": {"queue": "notifications"},
+        "app.tasks.probes.probe_load": {"queue": "bulk", "priority": PRIORITY_LOW},
+    },
+    broker_transport_options={
+        "priority_steps": PRIORITY_STEPS,
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    # воркер берёт из брокера не больше, чем может выполнить сейчас,
+    # иначе срочная задача ждёт за уже разобранными долгими
+    worker_prefetch_multiplier=int(os.getenv("CELERY_PREFETCH_MULTIPLIER", 1)),
+)
+
 # импорт селери модулей
 celery_app.conf.imports = (
+    "app.tasks.analytics",
+    "app.tasks.chat_inbox",
     "app.tasks.default_tasks",
+    "app.tasks.deadlines",
     "app.tasks.celery_period_tasks",
+    "app.tasks.heartbeats",
+    "app.tasks.leaderboard",
+    "app.tasks.metrics",
     "app.tasks.email_tasks",
+    "app.tasks.message_encryption",
+    "app.tasks.message_search",
+    "app.tasks.notifications",
+    "app.tasks.order_counters",
+    "app.tasks.order_feed",
+    "app.tasks.outbox",
+    "app.tasks.probes",
 )
 
 # хранение celerybeat-schedule
 celery_app.conf.beat_schedule_filename = os.path.join(
     os.path.dirname(os.path.dirname(__file__)), "tasks", "celerybeat-schedule"
 )
+
+
+@before_task_publish.connect
+def stamp_sent_at(headers=None, **kwargs):
+    """Время публикации задачи - по нему считается ожидание в очереди."""
+    if headers is not None:
+        headers.setdefault("sent_at", time.time())
@@ -29,7 +29,12 @@ class PgSingleton:
     @property
     def engine(self) -> AsyncEngine:
         if not self._engine:
-            self._engine = create_async_engine(os.getenv("DATABASE_URL"))
+            self._engine = create_async_engine(
+                os.getenv("DATABASE_URL"),
+                pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+                max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+                pool_pre_ping=True,
+            )
         return self._engine
 
     @property
@@ -47,6 +52,16 @@ class PgSingleton:
         if self.engine:
             await self.engine.dispose()
 
+    def reset(self):
+        """
+        Забывает движок, унаследованный от родительского процесса.
+        Соединения родителя не закрываются, их сокеты ему и принадлежат.
+        """
+        if self._engine:
+            self._engine.sync_engine.dispose(close=False)
+        self._engine = None
+        self._session_maker = None
+
 
 class RedisSingleton:
     _instance = None
@@ -80,6 +95,10 @@ class RedisSingleton:
             except Exception as e:
                 logging.error(f"Ошибка при закрытии соединения с Redis: {e}")
 
+    def reset(self):
+        """Забывает клиент, созданный в другом процессе или event loop."""
+        self._redis_client = None
+
     @property
     async def redis_client(self) -> redis.Redis:
         if self._redis_client is None:
@@ -0,0 +1,160 @@
+"""
+Шифрование сообщений чата.
+
+Конверт версии 1 хранится в messages.payload сырыми байтами:
+    [0]      версия формата (0x01)
+    [1]      ID ключа
+    [2:14]   nonce, 12 байт
+    [14:]    шифротекст AES-GCM вместе с тегом (16 байт)
+Версия и ID ключа входят в associated data и защищены тегом.
+
+Ключи задаются переменной MESSAGE_KEYS вида "2:<base64>,1:<base64>",
+первый ключ активный, остальные нужны для чтения до перешифровки.
+Без MESSAGE_KEYS ключ с ID 1 выводится из ENCRYPTION_KEY через HKDF.
+Старые сообщения (Fernet-токены в messages.content) читаются ENCRYPTION_KEY.
+
+BlindIndex - слепой индекс для поиска по зашифрованным сообщениям:
+вместо слов хранятся усечённые HMAC нормализованных токенов.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+import unicodedata
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+class MessageCipher:
+    VERSION = 1
+    HEADER_SIZE = 2
+    NONCE_SIZE = 12
+    MAX_KEY_ID = 255
+
+    def __init__(self, keys: dict[int, bytes], legacy_key: str | bytes | None = None):
+        if not keys:
+            raise ValueError("Не задан ни один ключ шифрования сообщений")
+        for key_id in keys:
+            # ID ключа занимает в конверте один байт
+            if not 0 <= key_id <= self.MAX_KEY_ID:
+                raise ValueError(
+                    f"ID ключа шифрования {key_id} вне диапазона 0..{self.MAX_KEY_ID}"
+                )
+        self.active_key_id = next(iter(keys))
+        self._ciphers = {key_id: AESGCM(key) for key_id, key in keys.items()}
+        self._legacy = Fernet(legacy_key) if legacy_key else None
+
+    @classmethod
+    def from_env(cls) -> "MessageCipher":
+        legacy_key = os.getenv("ENCRYPTION_KEY")
+        raw_keys = os.getenv("MESSAGE_KEYS")
+        if raw_keys:
+            keys = {}
+            for item in raw_keys.split(","):
+                key_id, key = item.strip().split(":", 1)
+                keys[int(key_id)] = base64.urlsafe_b64decode(key)
+        else:
+            keys = {1: cls.derive_key(legacy_key)}
+        return cls(keys, legacy_key)
+
+    @staticmethod
+    def derive_key(
+        legacy_key: str | bytes, info: bytes = b"iplance:messages:v1"
+    ) -> bytes:
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=info,
+        ).derive(base64.urlsafe_b64decode(legacy_key))
+
+    def encrypt(self, text: str) -> bytes:
+        header = bytes((self.VERSION, self.active_key_id))
+        nonce = os.urandom(self.NONCE_SIZE)
+        ciphertext = self._ciphers[self.active_key_id].encrypt(
+            nonce, text.encode(), header
+        )
+        return header + nonce + ciphertext
+
+    def decrypt(self, payload: bytes | str) -> str:
+        """Расшифровывает конверт или старый Fernet-токен."""
+        if isinstance(payload, str):
+            return self._decrypt_legacy(payload.encode())
+        if payload[:1] != bytes((self.VERSION,)):
+            return self._decrypt_legacy(payload)
+        header = payload[: self.HEADER_SIZE]
+        nonce = payload[self.HEADER_SIZE : self.HEADER_SIZE + self.NONCE_SIZE]
+        ciphertext = payload[self.HEADER_SIZE + self.NONCE_SIZE :]
+        cipher = self._ciphers.get(payload[1])
+        if cipher is None:
+            raise ValueError(f"Неизвестный ключ шифрования {payload[1]}")
+        return cipher.decrypt(nonce, ciphertext, header).decode()
+
+    def _decrypt_legacy(self, token: bytes) -> str:
+        if self._legacy is None:
+            raise ValueError("Не задан ключ для старого формата сообщений")
+        return self._legacy.decrypt(token).decode()
+
+    def needs_rotation(self, payload: bytes | str | None) -> bool:
+        """Сообщение в старом формате или зашифровано неактивным ключом."""
+        if not isinstance(payload, bytes) or payload[:1] != bytes((self.VERSION,)):
+            return True
+        return payload[1] != self.active_key_id
+
+
+class BlindIndex:
+    """
+    Токены сообщения для поиска без расшифровки истории.
+
+    Текст приводится к NFKC и нижнему регистру, ё заменяется на е,
+    затем режется на слова. Каждое слово превращается в HMAC-SHA256
+    от (ID чата, слово), усечённый до HASH_SIZE байт: одно и то же слово
+    в разных чатах даёт разные хэши, и частоты нельзя сопоставить между чатами.
+    Ищутся только слова целиком, без префиксов и опечаток.
+
+    Ключ задаётся MESSAGE_SEARCH_KEY (base64) или выводится из ENCRYPTION_KEY.
+    """
+
+    HASH_SIZE = 16
+    MIN_TOKEN_LENGTH = 2
+    MAX_TOKEN_LENGTH = 64
+    MAX_TOKENS = 256
+    WORD = re.compile(r"\w+")
+
+    def __init__(self, key: bytes):
+        self._key = key
+
+    @classmethod
+    def from_env(cls) -> "BlindIndex":
+        key = os.getenv("MESSAGE_SEARCH_KEY")
+        if key:
+            return cls(base64.urlsafe_b64decode(key))
+        return cls(
+            MessageCipher.derive_key(
+                os.getenv("ENCRYPTION_KEY"), info=b"iplance:search:v1"
+            )
+        )
+
+    @classmethod
+    def normalize(cls, text: str) -> list[str]:
+        """Уникальные слова текста в порядке появления."""
+        text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+        words = {}
+        for word in cls.WORD.findall(text):
+            if cls.MIN_TOKEN_LENGTH <= len(word) <= cls.MAX_TOKEN_LENGTH:
+                words.setdefault(word, None)
+                if len(words) >= cls.MAX_TOKENS:
+                    break
+        return list(words)
+
+    def hash(self, chat_id: int, word: str) -> bytes:
+        message = chat_id.to_bytes(8, "big") + word.encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()[: self.HASH_SIZE]
+
+    def tokens(self, chat_id: int, text: str) -> list[bytes]:
+        return [self.hash(chat_id, word) for word in self.normalize(text)]
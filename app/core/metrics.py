@@ -0,0 +1,45 @@
+"""
+Метрики Prometheus веб-приложения.
+Отдаются на отдельном порту APP_METRICS_PORT (запускается в app.main),
+а не на публичном порту API - так же, как метрики Celery.
+"""
+
+import logging
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("APP_METRICS_PORT", 9807))
+
+CHAT_DECRYPT_SECONDS = Histogram(
+    "chat_decrypt_seconds",
+    "Время расшифровки сообщений в рамках одного запроса",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+CHAT_DECRYPT_MESSAGES = Counter(
+    "chat_decrypt_messages_total",
+    "Количество расшифрованных сообщений",
+    ["source"],
+)
+WS_CONNECTIONS = Gauge(
+    "ws_connections",
+    "Открытые WebSocket подключения процесса",
+)
+WS_REAPED = Counter(
+    "ws_reaped_total",
+    "WebSocket подключения, закрытые из-за неактивности",
+)
+
+
+def serve_metrics():
+    if not METRICS_PORT:
+        return
+    try:
+        start_http_server(METRICS_PORT)
+    except OSError as e:
+        # порт уже занят другим процессом приложения на этом хосте
+        logger.error(f"Не удалось открыть порт метрик {METRICS_PORT}: {e}")
+        return
+    logger.info(f"Метрики приложения доступны на порту {METRICS_PORT}")
@@ -6,6 +6,7 @@ from jose import jwt
 from passlib.context import CryptContext
 from fastapi import Response
 from app.core.database import RedisSingleton
+from app.core.encryption import BlindIndex, MessageCipher
 from cryptography.fernet import Fernet
 
 
@@ -16,6 +17,8 @@ class Security:
     def __init__(self):
         self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
         self.cipher = Fernet(os.getenv("ENCRYPTION_KEY"))
+        self.message_cipher = MessageCipher.from_env()
+        self.blind_index = BlindIndex.from_env()
         self.ACCESS_TOKEN_EXPIRE_MINUTES = int(
             os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 300)
         )
@@ -9,7 +9,13 @@ import logging
 from dotenv import load_dotenv
 import os
 from starlette.middleware.cors import CORSMiddleware
-from app.utils.websocket.chat.websocket_router import router as websocket_router
+from app.core.metrics import serve_metrics
+from app.services.analytics import ensure_views
+from app.utils.websocket.chat.websocket_router import (
+    drain_websockets,
+    manager as websocket_manager,
+    router as websocket_router,
+)
 
 logger = logging.getLogger("  app  ")
 logging.basicConfig(level=logging.INFO)
@@ -28,14 +34,26 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Ошибка подключения к БД: {e}")
 
+    try:
+        async with db.session as session:
+            await ensure_views(session)
+        logger.info("Представления аналитики на месте")
+    except Exception as e:
+        logger.error(f"Ошибка создания представлений аналитики: {e}")
+
     try:
         await RedisSingleton().init_redis()
         logger.info("Redis подключён")
     except Exception as e:
         logger.error(f"Ошибка подключения к Redis: {e}")
 
+    websocket_manager.start()
+    serve_metrics()
+
     yield
 
+    # сокеты закрываются до БД и Redis: их обработчикам нужны оба соединения
+    await drain_websockets()
     await db.close_connections()
     await RedisSingleton().close_redis()
     logger.info("Сервис был остановлен!")
@@ -74,4 +92,10 @@ if __name__ == "__main__":
         host=os.getenv("HOST", "0.0.0.0"),
         port=int(os.getenv("PORT", 8000)),
         reload=os.getenv("DEBUG", "True").lower() == "true",
+        ws_ping_interval=websocket_manager.PING_INTERVAL,
+        ws_ping_timeout=websocket_manager.PING_INTERVAL,
+        # сжатие с контекстом между фреймами почти вдвое уменьшает
+        # сообщения чата (python -m app.scripts.bench_ws_protocol)
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower()
+        == "true",
     )
@@ -1,5 +1,15 @@
 import uuid
-from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, UUID
+from sqlalchemy import (
+    Integer,
+    String,
+    Boolean,
+    ForeignKey,
+    DateTime,
+    UUID,
+    Index,
+    LargeBinary,
+    func,
+)
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from app.models.base_model import Base
@@ -7,6 +17,11 @@ from app.models.base_model import Base
 
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # список чатов пользователя по последней активности
+        Index("ix_chats_customer_activity", "customer_id", "last_message_at", "id"),
+        Index("ix_chats_performer_activity", "performer_id", "last_message_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     customer_id: Mapped[uuid.UUID] = mapped_column(
@@ -17,6 +32,16 @@ class Chat(Base):
     )
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     is_group: Mapped[bool] = mapped_column(Boolean, default=False)
+    # для групповых чатов: название и создатель, участники - в chat_participants
+    title: Mapped[str] = mapped_column(String(100), nullable=True)
+    created_by: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id"), nullable=True
+    )
+    # денормализация последнего сообщения, обновляется в save_message
+    last_message_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.utcnow, server_default=func.now()
+    )
+    last_message_id: Mapped[int] = mapped_column(Integer, nullable=True)
 
     customer = relationship("Users", foreign_keys=[customer_id])
     performer = relationship("Users", foreign_keys=[performer_id])
@@ -32,24 +57,52 @@ class Chat(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # keyset-пагинация истории чата: (chat_id, created_at, id)
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"))
     sender_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
-    content: Mapped[str] = mapped_column(String, nullable=False)
+    # Fernet-токен, старый формат; новые сообщения пишутся в payload
+    content: Mapped[str] = mapped_column(String, nullable=True)
+    # конверт app.core.encryption.MessageCipher
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)
     file_url: Mapped[str] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     chat = relationship("Chat", back_populates="messages")
     sender = relationship("Users")
 
+    @property
+    def ciphertext(self) -> bytes | str:
+        return self.payload if self.payload is not None else self.content
+
 
 class ChatParticipant(Base):
     __tablename__ = "chat_participants"
+    __table_args__ = (Index("ix_chat_participants_user_id", "user_id"),)
 
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), primary_key=True)
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
 
 
+class MessageSearchToken(Base):
+    """
+    Слепой индекс сообщений (app.core.encryption.BlindIndex).
+    Первичный ключ (chat_id, token_hash, message_id) сам служит
+    индексом для поиска сообщений чата по хэшу слова.
+    """
+
+    __tablename__ = "message_search_tokens"
+
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), primary_key=True)
+    token_hash: Mapped[bytes] = mapped_column(LargeBinary, primary_key=True)
+    message_id: Mapped[int] = mapped_column(
+        ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True
+    )
+
+
 class ChatAttachment(Base):
     __tablename__ = "chat_attachments"
 
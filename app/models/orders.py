@@ -2,11 +2,14 @@ import uuid
 from datetime import datetime
 from app.models.base_model import Base
 from sqlalchemy import (
+    Boolean,
     Integer,
     String,
     ForeignKey,
     DateTime,
+    Index,
     func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import (
@@ -18,6 +21,22 @@ from sqlalchemy.orm import (
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # заказы, ждущие напоминания о дедлайне: индекс содержит только их
+        # и уменьшается по мере отправки напоминаний
+        Index(
+            "ix_orders_deadline_reminder_pending",
+            "deadline",
+            "id",
+            postgresql_where=text(
+                "deadline IS NOT NULL AND deadline_reminder_sent_at IS NULL "
+                "AND status_id <> 3"
+            ),
+        ),
+        # заказы пользователя на дашборде от новых к старым
+        Index("ix_orders_created_by_created_at_id", "created_by", "created_at", "id"),
+        Index("ix_orders_assign_to_created_at_id", "assign_to", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), default=uuid.uuid4, primary_key=True
@@ -38,6 +57,7 @@ class Order(Base):
         DateTime, nullable=False, server_default=func.now()
     )
     deadline: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    deadline_reminder_sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     attachments = relationship(
         "OrderAttachment", back_populates="order", cascade="all, delete-orphan"
     )
@@ -48,6 +68,9 @@ class Order(Base):
         "Users", back_populates="orders_assigned", foreign_keys=[assign_to]
     )
     status = relationship("OrderStatus", back_populates="orders")
+    skills = relationship(
+        "OrderSkill", back_populates="order", cascade="all, delete-orphan"
+    )
 
 
 class OrderStatus(Base):
@@ -71,3 +94,60 @@ class OrderAttachment(Base):
     file_id: Mapped[str] = mapped_column(String, nullable=False)
 
     order = relationship("Order", back_populates="attachments")
+
+
+class OrderSkill(Base):
+    """
+    Навыки заказа - инвертированный индекс для ленты исполнителя.
+    created_at и is_open денормализованы из orders, чтобы страница ленты
+    читалась из частичного индекса без обращения к заказам.
+    """
+
+    __tablename__ = "order_skills"
+    __table_args__ = (
+        # открытые заказы по навыку от новых к старым
+        Index(
+            "ix_order_skills_feed",
+            "skill_id",
+            "created_at",
+            "order_id",
+            postgresql_where=text("is_open"),
+        ),
+    )
+
+    order_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("orders.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    skill_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("user_skills.id", ondelete="CASCADE"), primary_key=True
+    )
+    # now() - время начала транзакции, совпадает с orders.created_at
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, server_default=func.now()
+    )
+    is_open: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+
+    order = relationship("Order", back_populates="skills")
+
+
+class UserOrderCounter(Base):
+    """
+    Количество заказов пользователя по роли и статусу для дашборда.
+    Обновляется вместе с заказами, чтение - по первичному ключу без COUNT.
+    """
+
+    __tablename__ = "user_order_counters"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    # created - заказчик, assigned - исполнитель
+    role: Mapped[str] = mapped_column(String(10), primary_key=True)
+    status_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("order_statuses.id"), primary_key=True
+    )
+    count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
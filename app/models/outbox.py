@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, Text, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base_model import Base
+
+
+class OutboxEvent(Base):
+    """
+    Событие, записанное в одной транзакции с изменением данных.
+    Доставляется задачей app.tasks.outbox.relay_outbox и удаляется после
+    публикации, поэтому в таблице лежат только неотправленные события.
+    Событие, обработчик которого падает, откладывается на retry_at, после
+    OUTBOX_MAX_ATTEMPTS попыток получает dead_at и больше не выбирается:
+    такие события разбираются вручную.
+    """
+
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # очередь ретранслятора: в индексе только живые события
+        Index(
+            "ix_outbox_events_pending", "id", postgresql_where=text("dead_at IS NULL")
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    topic: Mapped[str] = mapped_column(String(100), nullable=False)
+    aggregate_id: Mapped[str] = mapped_column(String(64), nullable=True)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    attempts: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+    retry_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    dead_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, server_default=func.now()
+    )
@@ -11,6 +11,10 @@ from sqlalchemy import (
     func,
     Table,
     Column,
+    Index,
+    CheckConstraint,
+    SmallInteger,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import (
@@ -25,6 +29,8 @@ user_skills_connector = Table(
     Base.metadata,
     Column("user_id", UUID, ForeignKey("users.id"), primary_key=True),
     Column("skill_id", Integer, ForeignKey("user_skills.id"), primary_key=True),
+    # исполнители по навыку: ключ (user_id, skill_id) этот поиск не обслуживает
+    Index("ix_user_skills_connector_skill_id", "skill_id", "user_id"),
 )
 
 user_review_connector = Table(
@@ -85,13 +91,28 @@ class UserSkills(Base):
 
 
 class Review(Base):
+    """
+    Отзыв заказчика об исполнителе. score и performer_id пусты у отзывов,
+    написанных до появления оценок: такие отзывы не входят в рейтинг.
+    """
     __tablename__ = "reviews"
+    __table_args__ = (
+        CheckConstraint("score BETWEEN 1 AND 5", name="ck_reviews_score"),
+        # один отзыв с оценкой от заказчика исполнителю
+        UniqueConstraint(
+            "created_by", "performer_id", name="uq_reviews_created_by_performer_id"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     text: Mapped[str] = mapped_column(String, nullable=False)
+    score: Mapped[int] = mapped_column(SmallInteger, nullable=True)
     created_by: Mapped[uuid.UUID] = mapped_column(
         ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
+    performer_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=True
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
     users: Mapped[List["Users"]] = relationship(
@@ -99,4 +120,28 @@ class Review(Base):
     )
 
 
+class PerformerStats(Base):
+    """
+    Агрегаты исполнителя, обновляются при записи отзыва и завершении заказа.
+    Средняя оценка - score_sum / reviews_count.
+    """
+    __tablename__ = "performer_stats"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    completed_orders: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    reviews_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    score_sum: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, server_default=func.now(), onupdate=func.now()
+    )
+
+
 from app.models.orders import Order
@@ -3,6 +3,7 @@ from app.api.chat import ChatApi
 from app.api.users import UsersApi
 from app.api.orders import OrdersApi
 from app.api.auth import AuthApi
+from app.api.analytics import AnalyticsApi
 
 
 def get_router() -> APIRouter:
@@ -16,16 +17,21 @@ def get_router() -> APIRouter:
         Подключает роутеры:
         - auth: Аутентификация и авторизация (/auth/*)
         - users: Управление пользователями (/users/*)
+        - analytics: Отчёты для администраторов (/analytics/*)
     """
     router = APIRouter()
     users = UsersApi()
     orders = OrdersApi()
     chats = ChatApi()
     auth = AuthApi()
+    analytics = AnalyticsApi()
 
     router.include_router(auth.router, prefix=auth.prefix, tags=auth.tags)
     router.include_router(users.router, prefix=users.prefix, tags=users.tags)
     router.include_router(orders.router, prefix=orders.prefix, tags=orders.tags)
     router.include_router(chats.router, prefix=chats.prefix, tags=chats.tags)
+    router.include_router(
+        analytics.router, prefix=analytics.prefix, tags=analytics.tags
+    )
 
     return router
@@ -0,0 +1,33 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class OrdersDailyRow(BaseModel):
+    day: date
+    status: str
+    orders: int
+    gmv: int
+
+
+class OrdersAnalytics(BaseModel):
+    date_from: date
+    date_to: date
+    refreshed_at: Optional[datetime]
+    orders: int
+    gmv: int
+    rows: List[OrdersDailyRow]
+
+
+class SignupsDailyRow(BaseModel):
+    day: date
+    signups: int
+
+
+class SignupsAnalytics(BaseModel):
+    date_from: date
+    date_to: date
+    refreshed_at: Optional[datetime]
+    signups: int
+    rows: List[SignupsDailyRow]
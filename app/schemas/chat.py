@@ -1,8 +1,8 @@
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class MessageBase(BaseModel):
@@ -26,9 +26,45 @@ class MessageOut(MessageBase):
 
 class ChatOut(BaseModel):
     id: int
-    customer_id: UUID
-    performer_id: UUID
+    customer_id: Optional[UUID] = None
+    performer_id: Optional[UUID] = None
+    is_group: Optional[bool] = False
+    title: Optional[str] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class GroupChatCreate(BaseModel):
+    title: str = Field(min_length=1, max_length=100)
+    member_ids: List[UUID] = []
+
+
+class LastMessageOut(BaseModel):
+    id: int
+    sender_id: UUID
+    preview: str
+    created_at: datetime
+
+
+class InboxChatOut(BaseModel):
+    id: int
+    customer_id: Optional[UUID]
+    performer_id: Optional[UUID]
+    is_group: bool
+    created_at: datetime
+    last_message_at: datetime
+    last_message: Optional[LastMessageOut] = None
+    unread: int = 0
+
+
+class UnreadOut(BaseModel):
+    chats: Dict[int, int]
+    total: int
+
+
+class PresenceOut(BaseModel):
+    user_id: UUID
+    online: bool
+    last_seen: Optional[datetime] = None
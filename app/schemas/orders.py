@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from uuid import UUID
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 
 class OrderBase(BaseModel):
@@ -26,6 +26,13 @@ class OrderList(BaseModel):
         from_attributes = True
 
 
+class OrderDashboard(BaseModel):
+    created: List[OrderBase]
+    assigned: List[OrderBase]
+    # роль (created/assigned) -> название статуса -> количество заказов
+    counts: Dict[str, Dict[str, int]]
+
+
 class CreateOrder(BaseModel):
     name: str
     body: str
@@ -34,6 +41,7 @@ class CreateOrder(BaseModel):
     status: int = 1
     deadline: Optional[datetime]
     attachments: list[str] = []
+    skills: list[int] = []
 
     class ConfigDict:
         from_attributes = True
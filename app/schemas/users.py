@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
 from uuid import UUID
 from datetime import datetime
 from typing import Optional
@@ -43,3 +43,37 @@ class UserResponse(UserBase):
 class UserList(BaseModel):
     total: int
     items: list[UserResponse]
+
+
+class ReviewCreate(BaseModel):
+    text: str
+    score: int = Field(ge=1, le=5)
+
+
+class ReviewResponse(BaseModel):
+    id: int
+    text: str
+    score: Optional[int]
+    created_by: UUID
+    created_at: datetime
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class PerformerRating(BaseModel):
+    user_id: UUID
+    completed_orders: int
+    reviews_count: int
+    rating: Optional[float]
+    completed_rank: Optional[int]
+    rating_rank: Optional[int]
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: UUID
+    username: Optional[str]
+    completed_orders: int
+    reviews_count: int
+    rating: Optional[float]
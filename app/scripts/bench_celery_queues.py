@@ -0,0 +1,76 @@
+"""
+Бенчмарк изоляции очередей Celery под смешанной нагрузкой.
+
+Заполняет брокер тяжёлыми задачами probe_load и во время их выполнения
+отправляет лёгкие задачи probe_latency, замеряя задержку от публикации
+до начала выполнения. Режим shared отправляет всё в очередь default,
+как было до разделения очередей; режим routed - по task_routes
+(probe_load в bulk, probe_latency в notifications).
+Нужны запущенные брокер, backend результатов и воркеры из docker-compose.
+
+python -m app.scripts.bench_celery_queues --load 200 --load-seconds 0.5 --probes 50
+
+Замер с этими параметрами на воркерах с топологией docker-compose
+(alpha: default,maintenance,celery x2; notifications: notifications,email x8;
+bulk: bulk x2; prefetch 1), брокер - fakeredis TCP-сервер:
+    shared  p50 54318.5 ms, p95 54621.9 ms
+    routed  p50    49.6 ms, p95    55.6 ms
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+from app.core.celery import celery_app
+from app.tasks.probes import probe_latency, probe_load
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: list[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run_mode(mode: str, load: int, load_seconds: float, probes: int, interval: float):
+    options = {"queue": "default"} if mode == "shared" else {}
+    heavy = [
+        probe_load.apply_async(args=(load_seconds,), **options) for _ in range(load)
+    ]
+    results = []
+    for _ in range(probes):
+        results.append(probe_latency.apply_async(args=(time.time(),), **options))
+        time.sleep(interval)
+    latencies = [result.get(timeout=load * load_seconds + 60) for result in results]
+    logger.info(
+        f"{mode:<8} {statistics.median(latencies) * 1000:>10.1f} "
+        f"{percentile(latencies, 0.95) * 1000:>10.1f} "
+        f"{max(latencies) * 1000:>10.1f}"
+    )
+    # дожидаемся хвоста нагрузки, чтобы он не попал в следующий режим
+    for result in heavy:
+        result.get(timeout=load * load_seconds + 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--load", type=int, default=200)
+    parser.add_argument("--load-seconds", type=float, default=0.5)
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument(
+        "--modes", nargs="+", choices=("shared", "routed"), default=["shared", "routed"]
+    )
+    args = parser.parse_args()
+    logger.info(f"{'mode':<8} {'p50, ms':>10} {'p95, ms':>10} {'max, ms':>10}")
+    for mode in args.modes:
+        run_mode(mode, args.load, args.load_seconds, args.probes, args.interval)
+    celery_app.close()
+
+
+if __name__ == "__main__":
+    main()
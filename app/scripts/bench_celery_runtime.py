@@ -0,0 +1,123 @@
+"""
+Бенчмарк пропускной способности задачи send_notification в одном процессе.
+
+Сравнивает прежнюю схему (asyncio.run на каждую задачу; чтобы соединения
+не переживали свой loop, движок и Redis закрываются после каждого вызова)
+с постоянным loop процесса из app.tasks.runtime и пулом движка.
+Перед каждой задачей в окно дайджеста добавляется одно сообщение,
+задача выполняется через apply(), как её выполнил бы воркер, без брокера.
+Создаёт временных пользователей и чат, после замера удаляет их.
+
+python -m app.scripts.bench_celery_runtime --tasks 2000
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+
+from dotenv import load_dotenv
+from sqlalchemy import delete
+
+from app.core.database import PgSingleton, RedisSingleton
+from app.models.chat import Chat
+from app.models.users import Users
+from app.tasks import runtime
+from app.tasks.notifications import (
+    async_send_notification,
+    batcher,
+    send_notification,
+)
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("app.tasks.notifications").setLevel(logging.WARNING)
+
+load_dotenv()
+
+
+async def seed() -> tuple[int, list[uuid.UUID]]:
+    suffix = uuid.uuid4().hex[:8]
+    async with PgSingleton().session as db:
+        users = [
+            Users(
+                username=f"bench_{role}_{suffix}",
+                email=f"bench_{role}_{suffix}@example.com",
+                phone=f"bench_{role}_{suffix}",
+                hashed_password="-",
+            )
+            for role in ("customer", "performer")
+        ]
+        db.add_all(users)
+        await db.flush()
+        chat = Chat(customer_id=users[0].id, performer_id=users[1].id)
+        db.add(chat)
+        await db.commit()
+        return chat.id, [user.id for user in users]
+
+
+async def cleanup(chat_id: int, user_ids: list[uuid.UUID]):
+    async with PgSingleton().session as db:
+        await db.execute(delete(Chat).where(Chat.id == chat_id))
+        await db.execute(delete(Users).where(Users.id.in_(user_ids)))
+        await db.commit()
+
+
+async def legacy_call(chat_id: int, sender_id: uuid.UUID):
+    try:
+        await batcher.add(chat_id, sender_id)
+        await async_send_notification(chat_id)
+    finally:
+        await RedisSingleton().close_redis()
+        await PgSingleton().close_connections()
+        PgSingleton().reset()
+
+
+def persistent_call(chat_id: int, sender_id: uuid.UUID):
+    runtime.run(batcher.add(chat_id, sender_id))
+    send_notification.apply(args=(chat_id,)).get()
+
+
+def measure(name: str, call, tasks: int):
+    started = time.perf_counter()
+    for _ in range(tasks):
+        call()
+    elapsed = time.perf_counter() - started
+    logger.info(f"{name:<22} {tasks / elapsed:>10.1f} {elapsed / tasks * 1000:>10.2f}")
+
+
+def run(tasks: int):
+    chat_id, user_ids = runtime.run(seed())
+    try:
+        logger.info(f"{'mode':<22} {'tasks/s':>10} {'ms/task':>10}")
+        runtime.shutdown_worker_process()
+        measure(
+            "asyncio.run per task",
+            lambda: asyncio.run(legacy_call(chat_id, user_ids[0])),
+            tasks,
+        )
+        runtime.init_worker_process()
+        # первый вызов открывает пул - не учитываем его
+        persistent_call(chat_id, user_ids[0])
+        measure(
+            "persistent loop",
+            lambda: persistent_call(chat_id, user_ids[0]),
+            tasks,
+        )
+    finally:
+        runtime.run(cleanup(chat_id, user_ids))
+        runtime.shutdown_worker_process()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.tasks)
+
+
+if __name__ == "__main__":
+    main()
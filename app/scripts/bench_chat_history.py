@@ -0,0 +1,133 @@
+"""
+Бенчмарк пагинации истории чата: OFFSET против keyset (before_id).
+
+Создаёт временных пользователей и чат, заливает в него N сообщений
+через generate_series и замеряет латентность страницы на разной глубине.
+После замера тестовые данные удаляются (если не передан --keep).
+
+python -m app.scripts.bench_chat_history --messages 1000000
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, desc, select, text
+
+from app.core.database import PgSingleton
+from app.models.chat import Chat, Message
+from app.models.users import Users
+from app.services.chat import messages_page_query
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+async def seed(db, messages: int) -> tuple[int, uuid.UUID, list[uuid.UUID]]:
+    suffix = uuid.uuid4().hex[:8]
+    users = [
+        Users(
+            username=f"bench_{role}_{suffix}",
+            email=f"bench_{role}_{suffix}@example.com",
+            phone=f"bench_{role}_{suffix}",
+            hashed_password="-",
+        )
+        for role in ("customer", "performer")
+    ]
+    db.add_all(users)
+    await db.flush()
+    chat = Chat(customer_id=users[0].id, performer_id=users[1].id)
+    db.add(chat)
+    await db.flush()
+    await db.execute(
+        text(
+            "INSERT INTO messages (chat_id, sender_id, content, created_at) "
+            "SELECT :chat_id, :sender_id, 'bench', "
+            "now() - make_interval(secs => :total - n) "
+            "FROM generate_series(1, :total) AS n"
+        ),
+        {"chat_id": chat.id, "sender_id": users[0].id, "total": messages},
+    )
+    await db.commit()
+    await db.execute(text("ANALYZE messages"))
+    return chat.id, users[0].id, [user.id for user in users]
+
+
+async def cleanup(db, chat_id: int, user_ids: list[uuid.UUID]):
+    await db.execute(delete(Message).where(Message.chat_id == chat_id))
+    await db.execute(delete(Chat).where(Chat.id == chat_id))
+    await db.execute(delete(Users).where(Users.id.in_(user_ids)))
+    await db.commit()
+
+
+async def measure(db, query, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await db.execute(query)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def run(messages: int, page_size: int, repeats: int, keep: bool):
+    db_connection = PgSingleton()
+    async with db_connection.session as db:
+        logger.info(f"Заливка {messages} сообщений...")
+        chat_id, user_id, user_ids = await seed(db, messages)
+        try:
+            depths = sorted(
+                {0, 1_000, 10_000, 100_000, messages // 2, messages - page_size}
+            )
+            logger.info(f"{'depth':>10} {'offset, ms':>12} {'keyset, ms':>12}")
+            for depth in depths:
+                if depth < 0 or depth >= messages:
+                    continue
+                offset_query = (
+                    select(Message)
+                    .where(Message.chat_id == chat_id)
+                    .order_by(desc(Message.created_at))
+                    .offset(depth)
+                    .limit(page_size)
+                )
+                # курсор - последнее сообщение предыдущей страницы
+                cursor = None
+                if depth:
+                    cursor = await db.scalar(
+                        select(Message.id)
+                        .where(Message.chat_id == chat_id)
+                        .order_by(desc(Message.created_at), desc(Message.id))
+                        .offset(depth - 1)
+                        .limit(1)
+                    )
+                keyset_query = messages_page_query(
+                    chat_id, user_id, before_id=cursor, limit=page_size
+                )
+                offset_ms = await measure(db, offset_query, repeats)
+                keyset_ms = await measure(db, keyset_query, repeats)
+                logger.info(f"{depth:>10} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+        finally:
+            if not keep:
+                await cleanup(db, chat_id, user_ids)
+    await db_connection.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="не удалять данные")
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.page_size, args.repeats, args.keep))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк отправки почты одним процессом воркера.
+
+Сравнивает отправку с новым SMTP соединением на каждое письмо
+и пачки EmailSender через пул соединений разного размера.
+По умолчанию поднимает локальный SMTP приёмник aiosmtpd,
+с --host/--port отправляет на указанный сервер.
+Печатает писем в секунду.
+
+python -m app.scripts.bench_email --emails 2000 --pool-sizes 1 4 8
+"""
+
+import argparse
+import asyncio
+import logging
+import smtplib
+import socket
+import time
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+
+from app.services.email import EmailSender, SmtpPool, recipient_headers, render
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("mail.log").setLevel(logging.WARNING)
+
+
+def make_items(count: int, recipients: int) -> list[dict]:
+    return [
+        {
+            "to": f"bench{i % recipients}@example.com",
+            "template": "chat_digest",
+            "context": {"text": f"{i % 10 + 1} new messages in chat 1"},
+        }
+        for i in range(count)
+    ]
+
+
+def connection_per_email(host: str, port: int, items: list[dict]):
+    for item in items:
+        body = render(item["template"], item["context"], EmailSender.SENDER)
+        with smtplib.SMTP(host, port) as client:
+            client.sendmail(
+                EmailSender.SENDER, [item["to"]], recipient_headers(item["to"]) + body
+            )
+
+
+async def pooled(host: str, port: int, items: list[dict], size: int, batch: int):
+    pool = SmtpPool(host, port, size=size)
+    sender = EmailSender(pool)
+    for start in range(0, len(items), batch):
+        errors = await sender.send_batch(items[start : start + batch])
+        failed = [error for error in errors if error is not None]
+        if failed:
+            raise failed[0]
+    pool.close()
+
+
+def report(name: str, count: int, elapsed: float):
+    logger.info(f"{name:<24} {count / elapsed:>10.1f}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(host, port, emails: int, pool_sizes: list[int], batch: int):
+    controller = None
+    if host is None:
+        controller = Controller(Sink(), hostname="127.0.0.1", port=free_port())
+        controller.start()
+        host, port = controller.hostname, controller.port
+    try:
+        items = make_items(emails, recipients=100)
+        logger.info(f"{'mode':<24} {'emails/s':>10}")
+        started = time.perf_counter()
+        connection_per_email(host, port, items)
+        report("connection per email", emails, time.perf_counter() - started)
+        for size in pool_sizes:
+            started = time.perf_counter()
+            asyncio.run(pooled(host, port, items, size, batch))
+            report(f"pool {size}, batch {batch}", emails, time.perf_counter() - started)
+    finally:
+        if controller:
+            controller.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=25)
+    args = parser.parse_args()
+    run(args.host, args.port, args.emails, args.pool_sizes, args.batch)
+
+
+if __name__ == "__main__":
+    main()
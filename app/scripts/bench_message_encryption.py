@@ -0,0 +1,73 @@
+"""
+Бенчмарк формата хранения сообщений: Fernet-токен против конверта AES-GCM.
+
+Для сообщений разной длины печатает размер хранимого значения
+и время шифрования/расшифровки одного сообщения. БД не нужна.
+
+python -m app.scripts.bench_message_encryption
+"""
+
+import argparse
+import logging
+import time
+
+from cryptography.fernet import Fernet
+
+from app.core.encryption import MessageCipher
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def per_message_us(func, items, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - started) / (repeats * len(items)) * 1_000_000
+
+
+def run(sizes: list[int], messages: int, repeats: int):
+    legacy_key = Fernet.generate_key()
+    fernet = Fernet(legacy_key)
+    cipher = MessageCipher({1: MessageCipher.derive_key(legacy_key)}, legacy_key)
+    logger.info(
+        f"{'size':>6} {'fernet, B':>10} {'gcm, B':>8} {'saved':>7} "
+        f"{'fernet enc+dec, us':>19} {'gcm enc+dec, us':>16}"
+    )
+    for size in sizes:
+        texts = ["x" * size for _ in range(messages)]
+        # Fernet-токен хранится строкой: content = token.decode()
+        tokens = [fernet.encrypt(text.encode()).decode() for text in texts]
+        envelopes = [cipher.encrypt(text) for text in texts]
+        fernet_size = sum(len(token) for token in tokens) / messages
+        gcm_size = sum(len(envelope) for envelope in envelopes) / messages
+
+        fernet_us = per_message_us(
+            lambda text: fernet.decrypt(fernet.encrypt(text.encode())),
+            texts,
+            repeats,
+        )
+        gcm_us = per_message_us(
+            lambda text: cipher.decrypt(cipher.encrypt(text)), texts, repeats
+        )
+        logger.info(
+            f"{size:>6} {fernet_size:>10.0f} {gcm_size:>8.0f} "
+            f"{1 - gcm_size / fernet_size:>7.1%} "
+            f"{fernet_us:>19.1f} {gcm_us:>16.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 128, 1024, 8192])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.messages, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Бенчмарк форматов фреймов WebSocket чата.
+
+Сравнивает прежний формат "ws_data: {...}" с конвертами JSON и MessagePack,
+по одному событию на фрейм и пачками, без сжатия и с permessage-deflate
+(сырой deflate, как в расширении: с сохранением контекста между фреймами
+и без него). Печатает байты на сообщение и время кодирования + разбора.
+
+python -m app.scripts.bench_ws_protocol --messages 5000 --batch 20
+"""
+
+import argparse
+import logging
+import random
+import re
+import string
+import time
+import uuid
+import zlib
+
+from app.utils.websocket.protocol import JSON, LEGACY, MSGPACK, envelope
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# так старый формат разбирают клиенты: repr словаря не является JSON
+LEGACY_FIELD = re.compile(r"'(\w+)': ('[^']*'|UUID\('[^']*'\)|\d+)")
+
+
+def make_events(count: int, text_size: int) -> list[dict]:
+    users = [(uuid.uuid4(), f"user{i}") for i in range(20)]
+    events = []
+    for message_id in range(1, count + 1):
+        user_id, username = random.choice(users)
+        text = "".join(random.choices(string.ascii_letters + " ", k=text_size))
+        events.append(
+            envelope(
+                "message",
+                42,
+                {
+                    "message_id": message_id,
+                    "user_id": user_id,
+                    "username": username,
+                    "message": text,
+                },
+                cmid=uuid.uuid4().hex[:12],
+            )
+        )
+    return events
+
+
+def legacy_decode(frame: str) -> dict:
+    return dict(LEGACY_FIELD.findall(frame))
+
+
+def deflate_sizes(frames: list) -> tuple[int, int]:
+    """Суммарный размер со сжатием: без контекста и с контекстом между фреймами."""
+    frames = [frame if isinstance(frame, bytes) else frame.encode() for frame in frames]
+    no_context = 0
+    for frame in frames:
+        compressor = zlib.compressobj(wbits=-15)
+        no_context += len(
+            compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        )
+    compressor = zlib.compressobj(wbits=-15)
+    with_context = sum(
+        len(compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH))
+        for frame in frames
+    )
+    return no_context, with_context
+
+
+def run_case(name: str, codec, events: list[dict], batch: int, decode=None):
+    decode = decode or codec.decode
+    chunks = [events[start : start + batch] for start in range(0, len(events), batch)]
+    started = time.perf_counter()
+    frames = [frame for chunk in chunks for frame in codec.encode(chunk)]
+    encode_us = (time.perf_counter() - started) / len(events) * 1_000_000
+    started = time.perf_counter()
+    for frame in frames:
+        decode(frame)
+    decode_us = (time.perf_counter() - started) / len(events) * 1_000_000
+
+    raw = sum(len(frame) for frame in frames)
+    started = time.perf_counter()
+    no_context, with_context = deflate_sizes(frames)
+    deflate_us = (time.perf_counter() - started) / len(events) * 1_000_000 / 2
+    count = len(events)
+    logger.info(
+        f"{name:<18} {raw / count:>8.1f} {no_context / count:>10.1f} "
+        f"{with_context / count:>10.1f} {encode_us:>9.2f} {decode_us:>9.2f} "
+        f"{deflate_us:>10.2f}"
+    )
+
+
+def run(messages: int, batch: int, text_size: int):
+    events = make_events(messages, text_size)
+    logger.info(
+        f"{'format':<18} {'B/msg':>8} {'deflate':>10} {'deflate+ctx':>10} "
+        f"{'enc, us':>9} {'dec, us':>9} {'deflate, us':>10}"
+    )
+    run_case("legacy repr", LEGACY, events, 1, decode=legacy_decode)
+    run_case("json", JSON, events, 1)
+    run_case("msgpack", MSGPACK, events, 1)
+    run_case(f"json x{batch}", JSON, events, batch)
+    run_case(f"msgpack x{batch}", MSGPACK, events, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=20)
+    parser.add_argument("--text-size", type=int, default=80)
+    args = parser.parse_args()
+    run(args.messages, args.batch, args.text_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Нагрузочный тест WebSocket чата.
+
+Создаёт временных пользователей и групповые чаты, подключает к
+/ws/chat/{chat_id} по клиенту на каждого участника и отправляет сообщения
+с заданной частотой на чат (пуассоновский поток). Каждое сообщение несёт
+cmid, по которому получатели считают задержку доставки.
+
+Отчёт: задержка подключения (до первого события state), p50/p99 доставки,
+потерянные доставки, пропускная способность и CPU/память сервера
+по /metrics на порту APP_METRICS_PORT. Результат сохраняется в JSON,
+два прогона сравниваются через --compare.
+
+Сервер должен работать на той же БД и с тем же SECRET_KEY.
+Метрики процесса снимаются с одного воркера: для честного замера
+запускайте uvicorn с --workers 1.
+
+python -m app.scripts.ws_load_test --chats 100 --users-per-chat 5 --rate 2
+python -m app.scripts.ws_load_test --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import delete
+from websockets.asyncio.client import connect
+
+from app.core.database import PgSingleton
+from app.core.security import Security
+from app.models.chat import Chat, ChatParticipant, Message
+from app.models.users import Users
+from app.utils.websocket.protocol import CODECS, envelope
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# метрики, которые сравниваются между прогонами: путь в отчёте, чем меньше - лучше
+COMPARED = [
+    ("connect_ms.p50", True),
+    ("connect_ms.p99", True),
+    ("delivery_ms.p50", True),
+    ("delivery_ms.p99", True),
+    ("delivery_ms.max", True),
+    ("deliveries.drop_rate", True),
+    ("throughput.delivered_per_sec", False),
+    ("server.cpu_percent", True),
+    ("server.rss_mb_peak", True),
+]
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def at(share: float) -> float:
+        return round(values[min(len(values) - 1, int(share * len(values)))], 2)
+
+    return {"p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": at(1.0)}
+
+
+@dataclass
+class Stats:
+    connect_ms: list[float] = field(default_factory=list)
+    connect_failed: int = 0
+    delivery_ms: list[float] = field(default_factory=list)
+    # cmid -> (время отправки, сколько доставок ожидается)
+    sent: dict[str, tuple[float, int]] = field(default_factory=dict)
+    received: dict[str, int] = field(default_factory=dict)
+    send_errors: int = 0
+    disconnects: int = 0
+
+
+class Client:
+    def __init__(self, url: str, token: str, chat_id: int, codec, stats: Stats):
+        self.url = f"{url}/ws/chat/{chat_id}?token={token}"
+        self.chat_id = chat_id
+        self.codec = codec
+        self.stats = stats
+        self.websocket = None
+        self.ready = asyncio.Event()
+
+    async def run(self, stop: asyncio.Event):
+        started = time.perf_counter()
+        try:
+            async with connect(
+                self.url, subprotocols=[self.codec.subprotocol], max_queue=None
+            ) as websocket:
+                self.websocket = websocket
+                receiver = asyncio.create_task(self.receive(started))
+                stopper = asyncio.create_task(stop.wait())
+                await asyncio.wait(
+                    {receiver, stopper}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if receiver.done() and not stop.is_set():
+                    # сервер закрыл соединение посреди теста
+                    self.stats.disconnects += 1
+                receiver.cancel()
+                stopper.cancel()
+        except Exception as e:
+            if not self.ready.is_set():
+                self.stats.connect_failed += 1
+                logger.debug(f"Ошибка подключения: {e}")
+            else:
+                self.stats.disconnects += 1
+        finally:
+            self.websocket = None
+            self.ready.set()
+
+    async def receive(self, started: float):
+        async for frame in self.websocket:
+            now = time.perf_counter()
+            for item in self.codec.decode(frame):
+                if item["type"] == "state" and not self.ready.is_set():
+                    self.stats.connect_ms.append((now - started) * 1000)
+                    self.ready.set()
+                elif item["type"] == "ping":
+                    await self.send(envelope("pong"))
+                elif item["type"] == "message" and item.get("cmid") in self.stats.sent:
+                    sent_at, _ = self.stats.sent[item["cmid"]]
+                    self.stats.delivery_ms.append((now - sent_at) * 1000)
+                    self.stats.received[item["cmid"]] = (
+                        self.stats.received.get(item["cmid"], 0) + 1
+                    )
+
+    async def send(self, item: dict):
+        (frame,) = self.codec.encode([item])
+        await self.websocket.send(frame)
+
+    async def send_message(self, text: str, recipients: int):
+        if self.websocket is None:
+            return
+        cmid = uuid.uuid4().hex
+        self.stats.sent[cmid] = (time.perf_counter(), recipients)
+        try:
+            await self.send(
+                envelope("message", self.chat_id, {"message": text}, cmid=cmid)
+            )
+        except Exception:
+            del self.stats.sent[cmid]
+            self.stats.send_errors += 1
+
+
+async def seed(db, chats: int, users_per_chat: int):
+    suffix = uuid.uuid4().hex[:8]
+    users = [
+        Users(
+            username=f"load_{suffix}_{i}",
+            email=f"load_{suffix}_{i}@example.com",
+            phone=f"load_{suffix}_{i}",
+            hashed_password="-",
+        )
+        for i in range(chats * users_per_chat)
+    ]
+    db.add_all(users)
+    await db.flush()
+    rooms = []
+    for index in range(chats):
+        members = users[index * users_per_chat : (index + 1) * users_per_chat]
+        chat = Chat(is_group=True, title=f"load {index}", created_by=members[0].id)
+        db.add(chat)
+        rooms.append((chat, members))
+    await db.flush()
+    db.add_all(
+        ChatParticipant(chat_id=chat.id, user_id=member.id)
+        for chat, members in rooms
+        for member in members
+    )
+    await db.commit()
+    return [(chat.id, members) for chat, members in rooms], [user.id for user in users]
+
+
+async def cleanup(db, chat_ids: list[int], user_ids: list[uuid.UUID]):
+    await db.execute(delete(Message).where(Message.chat_id.in_(chat_ids)))
+    await db.execute(
+        delete(ChatParticipant).where(ChatParticipant.chat_id.in_(chat_ids))
+    )
+    await db.execute(delete(Chat).where(Chat.id.in_(chat_ids)))
+    await db.execute(delete(Users).where(Users.id.in_(user_ids)))
+    await db.commit()
+
+
+class ServerSampler:
+    """Снимает CPU и RSS процесса сервера с /metrics раз в interval секунд."""
+
+    def __init__(self, metrics_url: str, interval: float = 1.0):
+        self.metrics_url = metrics_url
+        self.interval = interval
+        self.samples: list[tuple[float, float, float]] = []
+
+    async def scrape(self, client: httpx.AsyncClient):
+        response = await client.get(self.metrics_url)
+        values = {}
+        for line in response.text.splitlines():
+            if line.startswith(
+                ("process_cpu_seconds_total ", "process_resident_memory_bytes ")
+            ):
+                name, value = line.split()
+                values[name] = float(value)
+        if len(values) == 2:
+            self.samples.append(
+                (
+                    time.perf_counter(),
+                    values["process_cpu_seconds_total"],
+                    values["process_resident_memory_bytes"],
+                )
+            )
+
+    async def run(self, stop: asyncio.Event):
+        async with httpx.AsyncClient(timeout=5) as client:
+            while not stop.is_set():
+                try:
+                    await self.scrape(client)
+                except Exception as e:
+                    logger.warning(f"Не удалось снять метрики сервера: {e}")
+                try:
+                    await asyncio.wait_for(stop.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.scrape(client)
+            except Exception:
+                pass
+
+    def report(self) -> dict:
+        if len(self.samples) < 2:
+            return {"cpu_percent": None, "rss_mb_peak": None}
+        (start, cpu_start, _), (end, cpu_end, _) = self.samples[0], self.samples[-1]
+        return {
+            "cpu_percent": round((cpu_end - cpu_start) / (end - start) * 100, 1),
+            "rss_mb_peak": round(max(rss for *_, rss in self.samples) / 2**20, 1),
+        }
+
+
+async def drive_chat(clients: list[Client], rate: float, stop: asyncio.Event):
+    """Пуассоновский поток сообщений в чат от случайных участников."""
+    while not stop.is_set():
+        await asyncio.sleep(random.expovariate(rate))
+        online = [client for client in clients if client.websocket is not None]
+        if online:
+            await random.choice(online).send_message("load test message", len(online))
+
+
+async def run(args) -> dict:
+    db_connection = PgSingleton()
+    security = Security()
+    codec = CODECS[args.format]
+    async with db_connection.session as db:
+        logger.info(f"Создание {args.chats} чатов по {args.users_per_chat} участников")
+        rooms, user_ids = await seed(db, args.chats, args.users_per_chat)
+    stats = Stats()
+    stop_clients, stop_traffic = asyncio.Event(), asyncio.Event()
+    sampler = ServerSampler(args.metrics_url)
+    sampler_task = asyncio.create_task(sampler.run(stop_clients))
+    chats, tasks = [], []
+    try:
+        # подключения равномерно растягиваются на ramp секунд
+        total = args.chats * args.users_per_chat
+        delay = args.ramp / total if total else 0
+        for chat_id, members in rooms:
+            clients = []
+            for member in members:
+                token = security.create_access_token({"sub": member.username})
+                client = Client(args.url, token, chat_id, codec, stats)
+                clients.append(client)
+                tasks.append(asyncio.create_task(client.run(stop_clients)))
+                await asyncio.sleep(delay)
+            chats.append(clients)
+        await asyncio.gather(
+            *(client.ready.wait() for clients in chats for client in clients)
+        )
+        logger.info(
+            f"Подключено {len(stats.connect_ms)} из {total}, "
+            f"нагрузка {args.rate} сообщ./с на чат, {args.duration} с"
+        )
+        started = time.perf_counter()
+        drivers = [
+            asyncio.create_task(drive_chat(clients, args.rate, stop_traffic))
+            for clients in chats
+        ]
+        await asyncio.sleep(args.duration)
+        stop_traffic.set()
+        await asyncio.gather(*drivers)
+        elapsed = time.perf_counter() - started
+        # время на доставку сообщений, отправленных в последний момент
+        await asyncio.sleep(args.grace)
+    finally:
+        stop_clients.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await sampler_task
+        if not args.keep:
+            async with db_connection.session as db:
+                await cleanup(db, [chat_id for chat_id, _ in rooms], user_ids)
+        await db_connection.close_connections()
+
+    expected = sum(recipients for _, recipients in stats.sent.values())
+    delivered = sum(stats.received.values())
+    return {
+        "config": {
+            "url": args.url,
+            "format": args.format,
+            "chats": args.chats,
+            "users_per_chat": args.users_per_chat,
+            "rate_per_chat": args.rate,
+            "duration": args.duration,
+        },
+        "connect_ms": {
+            **percentiles(stats.connect_ms),
+            "connected": len(stats.connect_ms),
+            "failed": stats.connect_failed,
+        },
+        "delivery_ms": percentiles(stats.delivery_ms),
+        "deliveries": {
+            "sent": len(stats.sent),
+            "expected": expected,
+            "delivered": delivered,
+            "dropped": expected - delivered,
+            "drop_rate": round((expected - delivered) / expected, 5) if expected else 0,
+            "send_errors": stats.send_errors,
+            "disconnects": stats.disconnects,
+        },
+        "throughput": {
+            "sent_per_sec": round(len(stats.sent) / elapsed, 1),
+            "delivered_per_sec": round(delivered / elapsed, 1),
+        },
+        "server": sampler.report(),
+    }
+
+
+def lookup(report: dict, path: str):
+    for key in path.split("."):
+        report = (report or {}).get(key)
+    return report
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as file:
+        before = json.load(file)
+    with open(after_path) as file:
+        after = json.load(file)
+    logger.info(f"{'metric':<30} {'before':>12} {'after':>12} {'change':>9}")
+    for path, lower_is_better in COMPARED:
+        old, new = lookup(before, path), lookup(after, path)
+        change = ""
+        if old not in (None, 0) and new is not None:
+            delta = (new - old) / old
+            better = delta < 0 if lower_is_better else delta > 0
+            change = f"{delta:+.1%}{'' if better or delta == 0 else ' !'}"
+        logger.info(f"{path:<30} {str(old):>12} {str(new):>12} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="ws://localhost:8000")
+    parser.add_argument("--metrics-url", default="http://localhost:9807/metrics")
+    parser.add_argument("--format", choices=sorted(CODECS), default="json")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--users-per-chat", type=int, default=4)
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="сообщений в секунду на чат"
+    )
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--ramp", type=float, default=5, help="разгон подключений, с")
+    parser.add_argument("--grace", type=float, default=3, help="ожидание доставки, с")
+    parser.add_argument("--output", help="сохранить отчёт в JSON")
+    parser.add_argument("--keep", action="store_true", help="не удалять данные")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="сравнить два отчёта"
+    )
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = asyncio.run(run(args))
+    logger.info(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, Date, Integer, Select, column, select, table, text
+
+from app.core.database import RedisSingleton
+
+ORDERS_DAILY = "mv_orders_daily"
+SIGNUPS_DAILY = "mv_signups_daily"
+
+# Материализованные представления аналитики: имя -> (запрос, уникальный ключ).
+# Уникальный индекс обязателен для REFRESH ... CONCURRENTLY.
+VIEWS = {
+    ORDERS_DAILY: (
+        """
+        SELECT created_at::date AS day,
+               status_id,
+               count(*) AS orders,
+               coalesce(sum(price), 0)::bigint AS gmv
+        FROM orders
+        GROUP BY 1, 2
+        """,
+        ("day", "status_id"),
+    ),
+    SIGNUPS_DAILY: (
+        """
+        SELECT created_at::date AS day, count(*) AS signups
+        FROM users
+        GROUP BY 1
+        """,
+        ("day",),
+    ),
+}
+
+orders_daily = table(
+    ORDERS_DAILY,
+    column("day", Date),
+    column("status_id", Integer),
+    column("orders", BigInteger),
+    column("gmv", BigInteger),
+)
+signups_daily = table(
+    SIGNUPS_DAILY,
+    column("day", Date),
+    column("signups", BigInteger),
+)
+
+
+def create_view_statements() -> list:
+    """
+    DDL представлений и их уникальных индексов. Идемпотентны, поэтому
+    выполняются перед каждым обновлением: схема ведётся автогенерацией
+    alembic, которая представления не видит.
+    """
+    statements = []
+    for name, (query, key) in VIEWS.items():
+        statements.append(
+            text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {query}")
+        )
+        columns = ", ".join(key)
+        statements.append(
+            text(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{name} ON {name} ({columns})")
+        )
+    return statements
+
+
+async def ensure_views(db):
+    """
+    Создаёт недостающие представления. Вызывается при запуске приложения,
+    чтобы отчёты не падали до первого обновления по расписанию, и перед
+    каждым обновлением.
+    """
+    for statement in create_view_statements():
+        await db.execute(statement)
+    await db.commit()
+
+
+def refresh_view_statement(name: str):
+    """Обновление без блокировки чтения: читатели видят прежние данные."""
+    return text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}")
+
+
+def orders_report_query(date_from: date, date_to: date) -> Select:
+    return (
+        select(orders_daily)
+        .where(orders_daily.c.day.between(date_from, date_to))
+        .order_by(orders_daily.c.day, orders_daily.c.status_id)
+    )
+
+
+def signups_report_query(date_from: date, date_to: date) -> Select:
+    return (
+        select(signups_daily)
+        .where(signups_daily.c.day.between(date_from, date_to))
+        .order_by(signups_daily.c.day)
+    )
+
+
+class AnalyticsCache:
+    """
+    Кэш ответов аналитики в Redis.
+
+    analytics:version      - номер версии данных, растёт при каждом обновлении
+                             представлений; старые ответы просто перестают
+                             читаться и истекают по TTL;
+    analytics:refreshed_at - время последнего обновления по представлениям;
+    analytics:{version}:{report}:{params} - готовый ответ.
+    """
+
+    TTL = int(os.getenv("ANALYTICS_CACHE_TTL", 15 * 60))
+    VERSION_KEY = "analytics:version"
+    REFRESHED_KEY = "analytics:refreshed_at"
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    async def key(self, report: str, params: str) -> str:
+        """
+        Ключ ответа в текущей версии. Берётся до расчёта ответа: если
+        представления обновятся во время расчёта, ответ ляжет в старую
+        версию и не будет прочитан.
+        """
+        client = await self.redis.redis_client
+        version = int(await client.get(self.VERSION_KEY) or 0)
+        return f"analytics:{version}:{report}:{params}"
+
+    async def get(self, key: str) -> Optional[dict]:
+        client = await self.redis.redis_client
+        cached = await client.get(key)
+        return json.loads(cached) if cached else None
+
+    async def set(self, key: str, payload: dict):
+        client = await self.redis.redis_client
+        await client.set(key, json.dumps(payload), ex=self.TTL)
+
+    async def refreshed_at(self, view: str) -> Optional[datetime]:
+        client = await self.redis.redis_client
+        value = await client.hget(self.REFRESHED_KEY, view)
+        return datetime.fromisoformat(value.decode()) if value else None
+
+    async def invalidate(self, refreshed: dict[str, datetime]):
+        """Отмечает обновлённые представления и сбрасывает кэш ответов."""
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=True) as pipe:
+            if refreshed:
+                pipe.hset(
+                    self.REFRESHED_KEY,
+                    mapping={
+                        view: moment.isoformat() for view, moment in refreshed.items()
+                    },
+                )
+            pipe.incr(self.VERSION_KEY)
+            await pipe.execute()
@@ -0,0 +1,205 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import (
+    Select,
+    exists,
+    func,
+    or_,
+    select,
+    tuple_,
+    union,
+    union_all,
+    update,
+)
+
+from app.api.base import BaseApi
+from app.models.chat import Chat, ChatParticipant, Message
+
+DECRYPT_ERROR = "Ошибка расшифровки"
+
+
+def decrypt_content(ciphertext: bytes | str) -> str:
+    """Расшифровывает текст сообщения, не прерывая выдачу при ошибке."""
+    try:
+        return BaseApi.security.message_cipher.decrypt(ciphertext)
+    except Exception:
+        return DECRYPT_ERROR
+
+
+def user_chats_clause(user_id: UUID):
+    """
+    Чаты пользователя: участник по chat_participants
+    либо заказчик/исполнитель личного чата, созданного до групповых чатов.
+    """
+    return or_(
+        Chat.customer_id == user_id,
+        Chat.performer_id == user_id,
+        Chat.id.in_(
+            select(ChatParticipant.chat_id).where(ChatParticipant.user_id == user_id)
+        ),
+    )
+
+
+def chat_access_clause(chat_id: int, user_id: UUID):
+    """
+    Условие доступа пользователя к чату.
+    Некоррелированные EXISTS выполняются один раз на запрос (InitPlan),
+    поэтому проверку можно встраивать прямо в выборку сообщений.
+    """
+    return or_(
+        exists(
+            select(ChatParticipant.chat_id).where(
+                ChatParticipant.chat_id == chat_id,
+                ChatParticipant.user_id == user_id,
+            )
+        ),
+        exists(
+            select(Chat.id).where(
+                Chat.id == chat_id,
+                or_(Chat.customer_id == user_id, Chat.performer_id == user_id),
+            )
+        ),
+    )
+
+
+def chat_members_query(chat_id: int):
+    """ID всех участников чата, включая заказчика и исполнителя."""
+    return union(
+        select(ChatParticipant.user_id).where(ChatParticipant.chat_id == chat_id),
+        select(Chat.customer_id).where(Chat.id == chat_id),
+        select(Chat.performer_id).where(Chat.id == chat_id),
+    )
+
+
+def contacts_query(user_id: UUID):
+    """ID пользователей, с которыми у пользователя есть общие чаты."""
+    chat_ids = select(Chat.id).where(user_chats_clause(user_id))
+    return union(
+        select(ChatParticipant.user_id).where(ChatParticipant.chat_id.in_(chat_ids)),
+        select(Chat.customer_id).where(Chat.id.in_(chat_ids)),
+        select(Chat.performer_id).where(Chat.id.in_(chat_ids)),
+    )
+
+
+def messages_page_query(
+    chat_id: int,
+    user_id: UUID,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = 50,
+) -> Select:
+    """
+    Keyset-выборка страницы сообщений по индексу (chat_id, created_at, id).
+
+    Без курсора и с before_id сообщения идут от новых к старым,
+    с after_id - в хронологическом порядке (для догрузки новых сообщений).
+    Стоимость запроса не зависит от глубины прокрутки, в отличие от OFFSET.
+    """
+    query = select(Message).where(
+        Message.chat_id == chat_id,
+        chat_access_clause(chat_id, user_id),
+    )
+    if after_id is not None:
+        cursor_created_at = (
+            select(Message.created_at)
+            .where(Message.id == after_id, Message.chat_id == chat_id)
+            .scalar_subquery()
+        )
+        return (
+            query.where(
+                tuple_(Message.created_at, Message.id)
+                > tuple_(cursor_created_at, after_id)
+            )
+            .order_by(Message.created_at, Message.id)
+            .limit(limit)
+        )
+    if before_id is not None:
+        cursor_created_at = (
+            select(Message.created_at)
+            .where(Message.id == before_id, Message.chat_id == chat_id)
+            .scalar_subquery()
+        )
+        query = query.where(
+            tuple_(Message.created_at, Message.id)
+            < tuple_(cursor_created_at, before_id)
+        )
+    return query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+
+
+def inbox_query(
+    user_id: UUID,
+    before_at: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = 20,
+) -> Select:
+    """
+    Чаты пользователя с последним сообщением, от недавно активных к старым.
+    Последнее сообщение берётся по денормализованному chats.last_message_id,
+    поэтому весь список собирается одним запросом без N+1.
+    Курсор - (last_message_at, id) последнего чата предыдущей страницы.
+
+    Вместо OR по ролям - UNION ALL трёх веток, каждая со своим LIMIT:
+    заказчик и исполнитель читаются по индексам ix_chats_*_activity
+    в порядке выдачи, участник групп - по ix_chat_participants_user_id.
+    Итоговая сортировка работает не больше чем с 3 * limit кандидатами.
+    """
+
+    def branch(query: Select) -> Select:
+        if before_at is not None and before_id is not None:
+            query = query.where(
+                tuple_(Chat.last_message_at, Chat.id) < tuple_(before_at, before_id)
+            )
+        return query.order_by(Chat.last_message_at.desc(), Chat.id.desc()).limit(limit)
+
+    candidates = union_all(
+        branch(select(Chat.id).where(Chat.customer_id == user_id)),
+        branch(select(Chat.id).where(Chat.performer_id == user_id)),
+        branch(
+            select(Chat.id)
+            .join(ChatParticipant, ChatParticipant.chat_id == Chat.id)
+            .where(ChatParticipant.user_id == user_id)
+        ),
+    ).subquery("candidates")
+    return (
+        select(Chat, Message)
+        .outerjoin(Message, Message.id == Chat.last_message_id)
+        # IN убирает повторы чата, найденного в нескольких ветках
+        .where(Chat.id.in_(select(candidates.c.id)))
+        .order_by(Chat.last_message_at.desc(), Chat.id.desc())
+        .limit(limit)
+    )
+
+
+def last_message_backfill_query(after_id: int, until_id: int):
+    """
+    Заполняет last_message_id/last_message_at чатов с ID в (after_id, until_id]
+    по их последнему сообщению (индекс (chat_id, created_at, id)).
+    Чаты без сообщений получают время создания. Чаты, в которые уже
+    написали после появления колонок, не трогаются.
+    """
+
+    def latest(column):
+        return (
+            select(column)
+            .where(Message.chat_id == Chat.id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    return (
+        update(Chat)
+        .where(
+            Chat.id > after_id,
+            Chat.id <= until_id,
+            Chat.last_message_id.is_(None),
+        )
+        .values(
+            last_message_id=latest(Message.id),
+            last_message_at=func.coalesce(
+                latest(Message.created_at), Chat.created_at, Chat.last_message_at
+            ),
+        )
+    )
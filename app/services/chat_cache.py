@@ -0,0 +1,317 @@
+import base64
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable
+from uuid import UUID
+
+from redis.exceptions import WatchError
+from sqlalchemy import select
+
+from app.core.database import RedisSingleton
+from app.models.chat import Message
+from app.services.chat import chat_members_query
+
+logger = logging.getLogger(__name__)
+
+
+class ChatCache:
+    """
+    Кэш последних сообщений чата в Redis.
+
+    chat:{id}:recent  - ограниченный список сообщений, новые в начале;
+    chat:{id}:members - участники чата для проверки доступа без БД;
+    chat:{id}:version - счётчик записей сообщений, защищает прогрев
+                        от гонки с push и invalidate;
+    chat:{id}:members_version - счётчик изменений состава, защищает запись
+                        участников от гонки с invalidate_members. Отдельный
+                        ключ: сообщения активного чата не срывают её.
+
+    Сообщения лежат в кэше в зашифрованном виде, как и в БД.
+    Если в список попала вся история чата, в его конец кладётся маркер
+    START_MARKER: так закэширован и пустой чат, а get_after знает,
+    что старше первого сообщения в кэше ничего нет.
+    Первая страница истории читается одним пайплайном из двух команд.
+
+    Состав участников дополнительно кэшируется в памяти процесса
+    на MEMBERS_LOCAL_TTL секунд - он нужен при рассылке каждого сообщения.
+    Сброс состава виден другим процессам только через Redis, поэтому
+    проверка права на отправку читает состав с local=False.
+    Этот кэш - LRU не больше MEMBERS_LOCAL_SIZE чатов, общий для всех
+    экземпляров.
+    """
+
+    SIZE = int(os.getenv("CHAT_CACHE_SIZE", 100))
+    TTL = int(os.getenv("CHAT_CACHE_TTL", 24 * 60 * 60))
+    MEMBERS_LOCAL_TTL = float(os.getenv("CHAT_MEMBERS_LOCAL_TTL", 5))
+    MEMBERS_LOCAL_SIZE = int(os.getenv("CHAT_MEMBERS_LOCAL_SIZE", 10000))
+    START_MARKER = "start"
+    _local_members: OrderedDict[int, tuple[float, set[UUID]]] = OrderedDict()
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    @staticmethod
+    def recent_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:recent"
+
+    @staticmethod
+    def members_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:members"
+
+    @staticmethod
+    def version_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:version"
+
+    @staticmethod
+    def members_version_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:members_version"
+
+    @staticmethod
+    def dump(message: Message) -> str:
+        return json.dumps(
+            {
+                "id": message.id,
+                "chat_id": message.chat_id,
+                "sender_id": str(message.sender_id),
+                "content": message.content,
+                "payload": (
+                    base64.b64encode(message.payload).decode()
+                    if message.payload is not None
+                    else None
+                ),
+                "file_url": message.file_url,
+                "created_at": message.created_at.isoformat(),
+            }
+        )
+
+    @staticmethod
+    def ciphertext(item: dict) -> bytes | str:
+        """Шифротекст закэшированного сообщения в формате MessageCipher.decrypt."""
+        if item.get("payload"):
+            return base64.b64decode(item["payload"])
+        return item["content"]
+
+    async def push(self, message: Message):
+        """
+        Добавляет сохранённое сообщение в начало списка.
+        LPUSHX не создаёт список: холодный кэш заполняется только warm().
+        """
+        client = await self.redis.redis_client
+        recent_key = self.recent_key(message.chat_id)
+        version_key = self.version_key(message.chat_id)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.incr(version_key)
+            pipe.expire(version_key, self.TTL)
+            pipe.lpushx(recent_key, self.dump(message))
+            pipe.ltrim(recent_key, 0, self.SIZE - 1)
+            pipe.expire(recent_key, self.TTL)
+            await pipe.execute()
+
+    async def get_recent(self, chat_id: int, user_id: UUID, limit: int):
+        """
+        Возвращает первую страницу сообщений (от новых к старым)
+        или None, если кэш холодный либо не подтверждает доступ.
+        """
+        if limit > self.SIZE:
+            return None
+        try:
+            client = await self.redis.redis_client
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.sismember(self.members_key(chat_id), str(user_id))
+                pipe.lrange(self.recent_key(chat_id), 0, limit - 1)
+                is_member, items = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша чата {chat_id}: {e}")
+            return None
+        if not is_member or not items:
+            return None
+        messages, seen = [], set()
+        for item in items:
+            if item.decode() == self.START_MARKER:
+                break
+            message = json.loads(item)
+            # прогрев и push могут разминуться и записать сообщение дважды
+            if message["id"] not in seen:
+                seen.add(message["id"])
+                messages.append(message)
+        return messages
+
+    async def get_after(self, chat_id: int, message_id: int):
+        """
+        Сообщения новее message_id в хронологическом порядке.
+        None - если в кэше нет сообщения не новее курсора и нет маркера
+        начала, то есть кэш не покрывает пропущенный интервал целиком.
+        """
+        try:
+            client = await self.redis.redis_client
+            items = await client.lrange(self.recent_key(chat_id), 0, -1)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша чата {chat_id}: {e}")
+            return None
+        if not items:
+            return None
+        # маркер начала: в кэше вся история, пропусков быть не может
+        complete = items[-1].decode() == self.START_MARKER
+        if complete:
+            items = items[:-1]
+        messages = [json.loads(item) for item in items]
+        if not complete and messages[-1]["id"] > message_id:
+            return None
+        missed = {
+            message["id"]: message for message in messages if message["id"] > message_id
+        }
+        return [missed[key] for key in sorted(missed)]
+
+    async def warm(self, db, chat_id: int):
+        """
+        Заполняет кэш чата из БД.
+        Если за время чтения в чат пришло сообщение, прогрев отменяется -
+        следующее чтение повторит его.
+        """
+        try:
+            client = await self.redis.redis_client
+            version_key = self.version_key(chat_id)
+            members_version_key = self.members_version_key(chat_id)
+            version, members_version = await client.mget(
+                version_key, members_version_key
+            )
+            members = await self.load_members(db, chat_id)
+            if not members:
+                return
+            messages = await db.execute(
+                select(Message)
+                .where(Message.chat_id == chat_id)
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .limit(self.SIZE)
+            )
+            items = [self.dump(message) for message in messages.scalars().all()]
+            if len(items) < self.SIZE:
+                # история чата целиком в списке, в том числе пустая
+                items.append(self.START_MARKER)
+
+            recent_key = self.recent_key(chat_id)
+            members_key = self.members_key(chat_id)
+            async with client.pipeline(transaction=True) as pipe:
+                await pipe.watch(version_key, members_version_key)
+                if await pipe.mget(version_key, members_version_key) != [
+                    version,
+                    members_version,
+                ]:
+                    return
+                pipe.multi()
+                pipe.delete(recent_key, members_key)
+                pipe.rpush(recent_key, *items)
+                pipe.expire(recent_key, self.TTL)
+                pipe.sadd(members_key, *(str(member) for member in members))
+                pipe.expire(members_key, self.TTL)
+                await pipe.execute()
+        except WatchError:
+            logger.info(f"Прогрев кэша чата {chat_id} отменён: чат изменился")
+        except Exception as e:
+            logger.error(f"Ошибка прогрева кэша чата {chat_id}: {e}")
+
+    async def invalidate(self, chat_ids: Iterable[int]):
+        """
+        Сбрасывает закэшированные сообщения чатов, например после перешифровки.
+        Рост версии отменяет прогрев, который читал из БД старые данные.
+        """
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            for chat_id in chat_ids:
+                version_key = self.version_key(chat_id)
+                pipe.incr(version_key)
+                pipe.expire(version_key, self.TTL)
+                pipe.delete(self.recent_key(chat_id))
+            await pipe.execute()
+
+    @staticmethod
+    async def load_members(db, chat_id: int) -> set[UUID]:
+        result = await db.execute(chat_members_query(chat_id))
+        return {member for member in result.scalars().all() if member}
+
+    async def get_members(self, db, chat_id: int, local: bool = True) -> set[UUID]:
+        """
+        Участники чата: память процесса (если local), затем Redis, затем БД.
+        Прочитанный из БД состав пишется в Redis под WATCH версии состава:
+        если за время чтения состав сменился (invalidate_members),
+        устаревший набор не попадёт в кэш.
+        """
+        if local:
+            cached = self._local_get(chat_id)
+            if cached is not None:
+                return cached
+        members = None
+        try:
+            client = await self.redis.redis_client
+            version = await client.get(self.members_version_key(chat_id))
+            raw_members = await client.smembers(self.members_key(chat_id))
+            if raw_members:
+                members = {UUID(member.decode()) for member in raw_members}
+        except Exception as e:
+            logger.error(f"Ошибка чтения участников чата {chat_id}: {e}")
+            client = None
+        if members is None:
+            members = await self.load_members(db, chat_id)
+            if members and client is not None:
+                await self._store_members(client, chat_id, version, members)
+        self._local_put(chat_id, members)
+        return members
+
+    def _local_get(self, chat_id: int) -> set[UUID] | None:
+        cached = self._local_members.get(chat_id)
+        if cached is None:
+            return None
+        if cached[0] <= time.monotonic():
+            del self._local_members[chat_id]
+            return None
+        self._local_members.move_to_end(chat_id)
+        return cached[1]
+
+    def _local_put(self, chat_id: int, members: set[UUID]):
+        self._local_members[chat_id] = (
+            time.monotonic() + self.MEMBERS_LOCAL_TTL,
+            members,
+        )
+        self._local_members.move_to_end(chat_id)
+        while len(self._local_members) > self.MEMBERS_LOCAL_SIZE:
+            self._local_members.popitem(last=False)
+
+    async def _store_members(self, client, chat_id: int, version, members: set):
+        version_key = self.members_version_key(chat_id)
+        members_key = self.members_key(chat_id)
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                await pipe.watch(version_key)
+                if await pipe.get(version_key) != version:
+                    return
+                pipe.multi()
+                pipe.sadd(members_key, *(str(member) for member in members))
+                pipe.expire(members_key, self.TTL)
+                await pipe.execute()
+        except WatchError:
+            logger.info(f"Кэш участников чата {chat_id} не записан: чат изменился")
+        except Exception as e:
+            logger.error(f"Ошибка записи участников чата {chat_id}: {e}")
+
+    async def is_member(
+        self, db, chat_id: int, user_id: UUID, local: bool = True
+    ) -> bool:
+        return user_id in await self.get_members(db, chat_id, local)
+
+    async def invalidate_members(self, chat_id: int):
+        """
+        Сбрасывает кэш участников после изменения состава чата.
+        Рост версии не даёт записать в кэш состав, прочитанный до изменения.
+        Копии в памяти других процессов живут до MEMBERS_LOCAL_TTL.
+        """
+        self._local_members.pop(chat_id, None)
+        client = await self.redis.redis_client
+        version_key = self.members_version_key(chat_id)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.incr(version_key)
+            pipe.expire(version_key, self.TTL)
+            pipe.delete(self.members_key(chat_id))
+            await pipe.execute()
@@ -0,0 +1,97 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+from app.core.metrics import CHAT_DECRYPT_MESSAGES, CHAT_DECRYPT_SECONDS
+from app.services.chat import DECRYPT_ERROR, decrypt_content
+
+
+class MessageDecryptor:
+    """
+    Пакетная расшифровка сообщений чата.
+
+    Расшифрованные тексты хранятся в ограниченном LRU по ID сообщения:
+    сообщения не редактируются, поэтому кэш не нужно инвалидировать.
+    Промахи расшифровываются прямо в event loop, если их мало,
+    иначе - пачками в пуле потоков, чтобы не блокировать другие корутины.
+    """
+
+    CACHE_SIZE = int(os.getenv("DECRYPT_CACHE_SIZE", 10000))
+    POOL_THRESHOLD = int(os.getenv("DECRYPT_POOL_THRESHOLD", 16))
+    POOL_SIZE = int(os.getenv("DECRYPT_POOL_SIZE", 4))
+
+    def __init__(self):
+        self._cache: OrderedDict[int, str] = OrderedDict()
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.POOL_SIZE, thread_name_prefix="decrypt"
+            )
+        return self._executor
+
+    @staticmethod
+    def _decrypt_chunk(contents: list[bytes | str]) -> list[str]:
+        return [decrypt_content(content) for content in contents]
+
+    async def decrypt_many(
+        self, messages: Iterable[tuple[int, bytes | str]]
+    ) -> list[str]:
+        """
+        Расшифровывает пары (id сообщения, шифротекст),
+        возвращает тексты в том же порядке.
+        """
+        started = time.perf_counter()
+        messages = list(messages)
+        texts: list[str | None] = [None] * len(messages)
+        misses = []
+        for index, (message_id, _) in enumerate(messages):
+            text = self._cache.get(message_id)
+            if text is None:
+                misses.append(index)
+            else:
+                self._cache.move_to_end(message_id)
+                texts[index] = text
+
+        contents = [messages[index][1] for index in misses]
+        if len(misses) >= self.POOL_THRESHOLD:
+            loop = asyncio.get_running_loop()
+            chunk_size = math.ceil(len(contents) / self.POOL_SIZE)
+            chunks = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        self.executor,
+                        self._decrypt_chunk,
+                        contents[start : start + chunk_size],
+                    )
+                    for start in range(0, len(contents), chunk_size)
+                )
+            )
+            decrypted = [text for chunk in chunks for text in chunk]
+        else:
+            decrypted = self._decrypt_chunk(contents)
+
+        for index, text in zip(misses, decrypted):
+            texts[index] = text
+            if text != DECRYPT_ERROR:
+                self._remember(messages[index][0], text)
+
+        CHAT_DECRYPT_MESSAGES.labels(source="cache").inc(len(messages) - len(misses))
+        CHAT_DECRYPT_MESSAGES.labels(source="cipher").inc(len(misses))
+        CHAT_DECRYPT_SECONDS.observe(time.perf_counter() - started)
+        return texts
+
+    def _remember(self, message_id: int, text: str):
+        self._cache[message_id] = text
+        self._cache.move_to_end(message_id)
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+
+message_decryptor = MessageDecryptor()
@@ -0,0 +1,88 @@
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Iterable
+from uuid import UUID
+
+from app.core.database import RedisSingleton
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryQueue:
+    """
+    Очередь доставки сообщений пользователям, которые сейчас не подключены.
+    Хранится в Redis Stream user:{id}:inbox и вычитывается при подключении.
+    """
+
+    MAXLEN = int(os.getenv("DELIVERY_QUEUE_MAXLEN", 1000))
+    TTL = int(os.getenv("DELIVERY_QUEUE_TTL", 7 * 24 * 60 * 60))
+    BATCH_SIZE = 100
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    @staticmethod
+    def key(user_id: UUID) -> str:
+        return f"user:{user_id}:inbox"
+
+    async def enqueue(self, user_id: UUID, message: str):
+        client = await self.redis.redis_client
+        key = self.key(user_id)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.xadd(key, {"data": message}, maxlen=self.MAXLEN, approximate=True)
+            pipe.expire(key, self.TTL)
+            await pipe.execute()
+
+    async def enqueue_many(self, user_ids: Iterable[UUID], message: str):
+        """Кладёт одно сообщение в очереди нескольких пользователей за один запрос."""
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                key = self.key(user_id)
+                pipe.xadd(key, {"data": message}, maxlen=self.MAXLEN, approximate=True)
+                pipe.expire(key, self.TTL)
+            await pipe.execute()
+
+    async def drain(self, user_id: UUID, send: Callable[[list[str]], Awaitable[None]]):
+        """
+        Отправляет накопленные сообщения пачками и удаляет доставленные.
+        Если отправка оборвалась, недоставленная пачка остаётся в очереди.
+        """
+        client = await self.redis.redis_client
+        key = self.key(user_id)
+        while True:
+            entries = await client.xrange(key, count=self.BATCH_SIZE)
+            if not entries:
+                return
+            await send([fields[b"data"].decode() for _, fields in entries])
+            await client.xdel(key, *(entry_id for entry_id, _ in entries))
+
+
+class UnreadCounters:
+    """
+    Счётчики непрочитанных сообщений: хэш user:{id}:unread вида chat_id -> count.
+    Увеличиваются при сохранении сообщения, сбрасываются при прочтении чата.
+    """
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    @staticmethod
+    def key(user_id: UUID) -> str:
+        return f"user:{user_id}:unread"
+
+    async def increment(self, chat_id: int, user_ids: Iterable[UUID]):
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hincrby(self.key(user_id), str(chat_id), 1)
+            await pipe.execute()
+
+    async def reset(self, user_id: UUID, chat_id: int):
+        client = await self.redis.redis_client
+        await client.hdel(self.key(user_id), str(chat_id))
+
+    async def get_all(self, user_id: UUID) -> Dict[int, int]:
+        client = await self.redis.redis_client
+        counters = await client.hgetall(self.key(user_id))
+        return {int(chat_id): int(count) for chat_id, count in counters.items()}
@@ -0,0 +1,413 @@
+"""
+Отправка почты.
+
+Письма не отправляются из запроса: EmailOutbox кладёт их в Redis
+(список email:outbox), задача app.tasks.email_tasks.dispatch_emails
+забирает их пачками и отправляет через EmailSender - пул SMTP соединений
+процесса воркера. Письмо в очереди:
+    {"to": "user@example.com", "template": "chat_digest",
+     "context": {...}, "attempts": 0}
+Шаблоны лежат в app/templates/email/<name>.txt: первая строка -
+"Subject: ...", дальше пустая строка и текст; подстановки ${name}.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import ssl
+import string
+import time
+import uuid
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+from pathlib import Path
+
+from redis.exceptions import WatchError
+
+from app.core.celery import celery_app
+from app.core.database import RedisSingleton
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+DISPATCH_TASK = "app.tasks.email_tasks.dispatch_emails"
+
+
+class TemplateNotFound(LookupError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def load_template(name: str) -> tuple[string.Template, string.Template]:
+    """Шаблоны темы и текста письма, читаются с диска один раз на процесс."""
+    path = TEMPLATES_DIR / f"{Path(name).name}.txt"
+    if not path.is_file():
+        raise TemplateNotFound(name)
+    header, _, body = path.read_text(encoding="utf-8").partition("\n\n")
+    subject = header.removeprefix("Subject:").strip()
+    return string.Template(subject), string.Template(body)
+
+
+def render(template: str, context: dict, sender: str) -> bytes:
+    """
+    Письмо без заголовков получателя (To, Message-ID) в виде байтов
+    для SMTP. Одинаковое для всех получателей пачки с тем же контекстом.
+    """
+    subject, body = load_template(template)
+    message = EmailMessage(policy=SMTP)
+    message["From"] = sender
+    message["Subject"] = subject.safe_substitute(context)
+    message["Date"] = formatdate(localtime=False)
+    message.set_content(body.safe_substitute(context))
+    return message.as_bytes()
+
+
+def recipient_headers(to: str) -> bytes:
+    return f"To: {to}\r\nMessage-ID: {make_msgid()}\r\n".encode()
+
+
+def is_permanent(error: Exception) -> bool:
+    """Ошибка 5xx - повторная отправка не поможет."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return isinstance(error, (TemplateNotFound, ValueError))
+
+
+# после этих ошибок соединение остаётся рабочим и возвращается в пул
+REUSABLE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+class SmtpPool:
+    """
+    Пул SMTP соединений процесса. smtplib блокирующий, поэтому команды
+    выполняются в потоках, а число одновременных отправок ограничено SIZE.
+    Соединения не закрываются между пачками и переиспользуются.
+    """
+
+    # docker-compose передаёт незаданные переменные пустыми строками
+    HOST = os.getenv("SMTP_HOST") or "localhost"
+    PORT = int(os.getenv("SMTP_PORT") or 25)
+    USERNAME = os.getenv("SMTP_USERNAME", "")
+    PASSWORD = os.getenv("SMTP_PASSWORD", "")
+    STARTTLS = (os.getenv("SMTP_STARTTLS") or "false").lower() == "true"
+    SSL = os.getenv("SMTP_SSL", "false").lower() == "true"
+    TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+    SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+
+    def __init__(self, host: str = None, port: int = None, size: int = None):
+        self.host = host or self.HOST
+        self.port = port or self.PORT
+        self.size = size or self.SIZE
+        self.connects = 0
+        self._idle: list[smtplib.SMTP] = []
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop = None
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.SSL:
+            client = smtplib.SMTP_SSL(
+                self.host,
+                self.port,
+                timeout=self.TIMEOUT,
+                context=ssl.create_default_context(),
+            )
+        else:
+            client = smtplib.SMTP(self.host, self.port, timeout=self.TIMEOUT)
+            if self.STARTTLS:
+                client.starttls(context=ssl.create_default_context())
+        if self.USERNAME:
+            client.login(self.USERNAME, self.PASSWORD)
+        self.connects += 1
+        return client
+
+    @staticmethod
+    def _discard(client: smtplib.SMTP):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Соединение из пула или новое. Соединение, оборвавшееся
+        во время отправки, закрывается и в пул не возвращается.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.size)
+            self._loop = loop
+        async with self._semaphore:
+            if self._idle:
+                client = self._idle.pop()
+            else:
+                client = await asyncio.to_thread(self._connect)
+            try:
+                yield client
+            except REUSABLE_ERRORS:
+                self._idle.append(client)
+                raise
+            except BaseException:
+                self._discard(client)
+                raise
+            self._idle.append(client)
+
+    def close(self):
+        while self._idle:
+            client = self._idle.pop()
+            try:
+                client.quit()
+            except Exception:
+                self._discard(client)
+
+
+class EmailSender:
+    SENDER = os.getenv("EMAIL_FROM") or "iPlance <noreply@iplance.ru>"
+
+    def __init__(self, pool: SmtpPool | None = None):
+        self.pool = pool or SmtpPool()
+
+    async def _send(self, item: dict, body: bytes):
+        data = recipient_headers(item["to"]) + body
+        # соединение из пула могло закрыться сервером по таймауту
+        for attempt in range(2):
+            try:
+                async with self.pool.connection() as client:
+                    await asyncio.to_thread(
+                        client.sendmail, self.SENDER, [item["to"]], data
+                    )
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    async def send_batch(self, items: list[dict]) -> list[Exception | None]:
+        """
+        Отправляет пачку писем параллельно через пул.
+        Шаблон рендерится один раз на пару (шаблон, контекст).
+        Возвращает ошибку или None для каждого письма по порядку.
+        """
+        rendered: dict[tuple, bytes | Exception] = {}
+        bodies = []
+        for item in items:
+            key = (
+                item["template"],
+                json.dumps(item["context"], sort_keys=True, default=str),
+            )
+            if key not in rendered:
+                try:
+                    rendered[key] = render(
+                        item["template"], item["context"], self.SENDER
+                    )
+                except Exception as e:
+                    rendered[key] = e
+            bodies.append(rendered[key])
+
+        async def send(item: dict, body: bytes | Exception):
+            if isinstance(body, Exception):
+                return body
+            await self._send(item, body)
+
+        return await asyncio.gather(
+            *(send(item, body) for item, body in zip(items, bodies)),
+            return_exceptions=True,
+        )
+
+
+class EmailOutbox:
+    """
+    Очередь писем в Redis.
+    email:outbox        - список писем к отправке;
+    email:processing    - письма в обработке воркером: id письма -> письмо;
+    email:processing:deadlines - их сроки, score - время, после которого
+                          письмо считается брошенным и возвращается в очередь;
+    email:retry         - отложенные письма, score - время следующей попытки;
+    email:dead          - письма, которые не удалось отправить;
+    email:rate:{domain} - счётчик писем домену за текущую минуту.
+    Первое письмо после запуска рассылки ставит задачу dispatch_emails
+    с задержкой BATCH_DELAY, чтобы письма успели накопиться в пачку.
+    Доставка - не менее одного раза: письмо, взятое упавшим воркером,
+    будет отправлено снова.
+    """
+
+    KEY = "email:outbox"
+    PROCESSING_KEY = "email:processing"
+    DEADLINES_KEY = "email:processing:deadlines"
+    RETRY_KEY = "email:retry"
+    DEAD_KEY = "email:dead"
+    SCHEDULED_KEY = "email:dispatch:scheduled"
+    DEAD_MAXLEN = 10000
+    BATCH_DELAY = float(os.getenv("EMAIL_BATCH_DELAY", 2))
+    DOMAIN_RATE_LIMIT = int(os.getenv("EMAIL_DOMAIN_RATE_LIMIT", 100))
+    VISIBILITY_TIMEOUT = float(os.getenv("EMAIL_VISIBILITY_TIMEOUT", 900))
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    @staticmethod
+    def rate_key(domain: str, minute: int) -> str:
+        return f"email:rate:{domain}:{minute}"
+
+    async def add(self, items: list[dict]):
+        if not items:
+            return
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.rpush(
+                self.KEY,
+                *(
+                    json.dumps(
+                        {"id": uuid.uuid4().hex, "attempts": 0, **item}, default=str
+                    )
+                    for item in items
+                ),
+            )
+            pipe.set(self.SCHEDULED_KEY, 1, nx=True, ex=int(self.BATCH_DELAY) + 60)
+            _, scheduled = await pipe.execute()
+        if scheduled:
+            await asyncio.to_thread(
+                celery_app.send_task, DISPATCH_TASK, countdown=self.BATCH_DELAY
+            )
+
+    async def release(self):
+        """Письма, добавленные после этого вызова, запланируют новую рассылку."""
+        client = await self.redis.redis_client
+        await client.delete(self.SCHEDULED_KEY)
+
+    async def pop(self, count: int) -> list[dict]:
+        """
+        Забирает пачку писем в обработку: одной транзакцией они переносятся
+        из очереди в email:processing и лежат там до ack(). Письма воркера,
+        упавшего посреди пачки, requeue_due вернёт после VISIBILITY_TIMEOUT.
+        """
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(self.KEY)
+                    values = await pipe.lrange(self.KEY, 0, count - 1)
+                    if not values:
+                        return []
+                    items = [json.loads(value) for value in values]
+                    for item in items:
+                        # письма, поставленные до появления id
+                        item.setdefault("id", uuid.uuid4().hex)
+                    deadline = time.time() + self.VISIBILITY_TIMEOUT
+                    pipe.multi()
+                    pipe.ltrim(self.KEY, len(values), -1)
+                    pipe.hset(
+                        self.PROCESSING_KEY,
+                        mapping={item["id"]: json.dumps(item) for item in items},
+                    )
+                    pipe.zadd(
+                        self.DEADLINES_KEY, {item["id"]: deadline for item in items}
+                    )
+                    await pipe.execute()
+                    return items
+                except WatchError:
+                    # очередь изменилась между чтением и переносом
+                    continue
+
+    async def ack(self, items: list[dict]):
+        """Снимает обработанные письма: отправленные, отложенные и мёртвые."""
+        if not items:
+            return
+        ids = [item["id"] for item in items]
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.DEADLINES_KEY, *ids)
+            pipe.hdel(self.PROCESSING_KEY, *ids)
+            await pipe.execute()
+
+    async def requeue_due(self, limit: int = 1000) -> int:
+        """
+        Возвращает в очередь брошенные упавшими воркерами письма и
+        отложенные письма, время которых пришло.
+        """
+        return await self._requeue_abandoned(limit) + await self._requeue_retries(limit)
+
+    async def _requeue_abandoned(self, limit: int) -> int:
+        client = await self.redis.redis_client
+        ids = await client.zrangebyscore(
+            self.DEADLINES_KEY, 0, time.time(), start=0, num=limit
+        )
+        if not ids:
+            return 0
+        async with client.pipeline(transaction=False) as pipe:
+            for item_id in ids:
+                pipe.zrem(self.DEADLINES_KEY, item_id)
+            removed = await pipe.execute()
+        # письмо забирает тот, кто успел удалить его срок
+        ids = [item_id for item_id, ok in zip(ids, removed) if ok]
+        if not ids:
+            return 0
+        values = [
+            value
+            for value in await client.hmget(self.PROCESSING_KEY, ids)
+            if value is not None
+        ]
+        async with client.pipeline(transaction=True) as pipe:
+            if values:
+                pipe.rpush(self.KEY, *values)
+            pipe.hdel(self.PROCESSING_KEY, *ids)
+            await pipe.execute()
+        if values:
+            logger.warning(f"Возвращено в очередь брошенных писем: {len(values)}")
+        return len(values)
+
+    async def _requeue_retries(self, limit: int) -> int:
+        client = await self.redis.redis_client
+        values = await client.zrangebyscore(
+            self.RETRY_KEY, 0, time.time(), start=0, num=limit
+        )
+        if not values:
+            return 0
+        async with client.pipeline(transaction=False) as pipe:
+            for value in values:
+                pipe.zrem(self.RETRY_KEY, value)
+            removed = await pipe.execute()
+        # письмо забирает тот, кто успел удалить его из отложенных
+        due = [value for value, ok in zip(values, removed) if ok]
+        if due:
+            await client.rpush(self.KEY, *due)
+        return len(due)
+
+    async def retry(self, item: dict, delay: float):
+        client = await self.redis.redis_client
+        await client.zadd(self.RETRY_KEY, {json.dumps(item): time.time() + delay})
+
+    async def dead(self, item: dict, error: Exception):
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.lpush(self.DEAD_KEY, json.dumps({**item, "error": str(error)}))
+            pipe.ltrim(self.DEAD_KEY, 0, self.DEAD_MAXLEN - 1)
+            await pipe.execute()
+
+    async def reserve(self, counts: dict[str, int]) -> dict[str, int]:
+        """
+        Резервирует отправку писем доменам в текущей минуте.
+        Принимает {domain: писем в пачке}, возвращает сколько из них можно
+        отправить, не превысив DOMAIN_RATE_LIMIT.
+        """
+        client = await self.redis.redis_client
+        minute = int(time.time() // 60)
+        async with client.pipeline(transaction=False) as pipe:
+            for domain, count in counts.items():
+                pipe.incrby(self.rate_key(domain, minute), count)
+                pipe.expire(self.rate_key(domain, minute), 120)
+            used = (await pipe.execute())[::2]
+        return {
+            domain: max(0, count - max(0, total - self.DOMAIN_RATE_LIMIT))
+            for (domain, count), total in zip(counts.items(), used)
+        }
@@ -0,0 +1,169 @@
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.database import RedisSingleton
+from app.models.users import PerformerStats
+
+
+def increment_stats_query(
+    user_id: UUID, completed_orders: int = 0, reviews_count: int = 0, score_sum: int = 0
+):
+    """
+    Атомарно прибавляет к агрегатам исполнителя и возвращает новые значения.
+    Строка создаётся при первой записи.
+    """
+    query = insert(PerformerStats).values(
+        user_id=user_id,
+        completed_orders=completed_orders,
+        reviews_count=reviews_count,
+        score_sum=score_sum,
+    )
+    table = PerformerStats.__table__.c
+    return (
+        query.on_conflict_do_update(
+            index_elements=[PerformerStats.user_id],
+            set_={
+                "completed_orders": table.completed_orders
+                + query.excluded.completed_orders,
+                "reviews_count": table.reviews_count + query.excluded.reviews_count,
+                "score_sum": table.score_sum + query.excluded.score_sum,
+                "updated_at": func.now(),
+            },
+        ).returning(PerformerStats)
+        # строка могла быть загружена в сессию раньше - берём значения из ответа
+        .execution_options(populate_existing=True)
+    )
+
+
+def average(score_sum: int, reviews_count: int) -> Optional[float]:
+    if not reviews_count:
+        return None
+    return round(score_sum / reviews_count, 2)
+
+
+class Leaderboard:
+    """
+    Рейтинги исполнителей в sorted set'ах Redis:
+
+    leaderboard:completed - число завершённых заказов;
+    leaderboard:reviews   - число отзывов;
+    leaderboard:rating    - средняя оценка;
+    leaderboard:touched   - исполнители, записанные с начала пересборки.
+
+    Источник истины - performer_stats: после записи в него сюда пишутся
+    абсолютные значения, поэтому повторная запись безопасна, а редкие
+    расхождения из-за гонок исправляет reconcile_leaderboard.
+    Страница рейтинга и место исполнителя читаются за O(log n).
+    """
+
+    COMPLETED_KEY = "leaderboard:completed"
+    REVIEWS_KEY = "leaderboard:reviews"
+    RATING_KEY = "leaderboard:rating"
+    TOUCHED_KEY = "leaderboard:touched"
+    BOARDS = {"completed": COMPLETED_KEY, "rating": RATING_KEY}
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    @classmethod
+    def _write(cls, pipe, stats: Iterable[PerformerStats], prefix: str = ""):
+        # нулевые значения не хранятся: в рейтинге только исполнители с ними
+        for row in stats:
+            member = str(row.user_id)
+            for key, score in (
+                (cls.COMPLETED_KEY, row.completed_orders),
+                (cls.REVIEWS_KEY, row.reviews_count),
+                (cls.RATING_KEY, average(row.score_sum, row.reviews_count)),
+            ):
+                if score:
+                    pipe.zadd(prefix + key, {member: score})
+                else:
+                    pipe.zrem(prefix + key, member)
+
+    async def update(self, *stats: PerformerStats):
+        """Записывает текущие агрегаты исполнителей."""
+        if not stats:
+            return
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=True) as pipe:
+            self._write(pipe, stats)
+            pipe.sadd(self.TOUCHED_KEY, *(str(row.user_id) for row in stats))
+            await pipe.execute()
+
+    async def page(
+        self, board: str, offset: int, limit: int
+    ) -> list[tuple[str, float]]:
+        """Исполнители от лучших к худшим: [(user_id, score), ...]."""
+        client = await self.redis.redis_client
+        rows = await client.zrevrange(
+            self.BOARDS[board], offset, offset + limit - 1, withscores=True
+        )
+        return [(member.decode(), score) for member, score in rows]
+
+    async def get_many(self, user_ids: list[str]) -> dict[str, dict]:
+        """Агрегаты нескольких исполнителей тремя ZMSCORE."""
+        if not user_ids:
+            return {}
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zmscore(self.COMPLETED_KEY, user_ids)
+            pipe.zmscore(self.REVIEWS_KEY, user_ids)
+            pipe.zmscore(self.RATING_KEY, user_ids)
+            completed, reviews, ratings = await pipe.execute()
+        return {
+            user_id: {
+                "completed_orders": int(completed[index] or 0),
+                "reviews_count": int(reviews[index] or 0),
+                "rating": ratings[index],
+            }
+            for index, user_id in enumerate(user_ids)
+        }
+
+    async def profile(self, user_id: UUID) -> dict:
+        """Агрегаты и места исполнителя в обоих рейтингах."""
+        member = str(user_id)
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(self.COMPLETED_KEY, member)
+            pipe.zrevrank(self.RATING_KEY, member)
+            completed_rank, rating_rank = await pipe.execute()
+        stats = (await self.get_many([member]))[member]
+        return {
+            **stats,
+            "completed_rank": None if completed_rank is None else completed_rank + 1,
+            "rating_rank": None if rating_rank is None else rating_rank + 1,
+        }
+
+    async def replace(self, batches) -> list[str]:
+        """
+        Пересобирает рейтинги из пачек строк performer_stats во временных
+        ключах и атомарно подменяет ими текущие: читатели не видят
+        частично заполненный рейтинг.
+
+        Пачки могли быть прочитаны раньше, чем update() записал более
+        свежие значения, и подмена их затёрла бы. Поэтому возвращаются
+        исполнители, записанные за время пересборки: их агрегаты нужно
+        перечитать из performer_stats и записать снова.
+        """
+        prefix = "rebuild:"
+        keys = [self.COMPLETED_KEY, self.REVIEWS_KEY, self.RATING_KEY]
+        client = await self.redis.redis_client
+        await client.delete(*(prefix + key for key in keys), self.TOUCHED_KEY)
+        async for stats in batches:
+            async with client.pipeline(transaction=False) as pipe:
+                self._write(pipe, stats, prefix)
+                await pipe.execute()
+        existing = [key for key in keys if await client.exists(prefix + key)]
+        async with client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                if key in existing:
+                    pipe.rename(prefix + key, key)
+                else:
+                    pipe.delete(key)
+            pipe.smembers(self.TOUCHED_KEY)
+            pipe.delete(self.TOUCHED_KEY)
+            *_, touched, _ = await pipe.execute()
+        return sorted(member.decode() for member in touched)
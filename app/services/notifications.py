@@ -0,0 +1,69 @@
+import os
+from uuid import UUID
+
+from app.core.database import RedisSingleton
+
+
+class NotificationBatcher:
+    """
+    Склейка уведомлений о новых сообщениях.
+    Сообщения чата за окно WINDOW секунд копятся в хэше
+    chat:{id}:notify вида sender_id -> count. Первое сообщение окна
+    ставит ключ chat:{id}:notify:scheduled, и ретранслятор outbox
+    ставит отложенную задачу дайджеста; остальные только увеличивают
+    счётчик. Задача забирает хэш целиком и отправляет каждому
+    получателю одно уведомление на окно; если отправка не удалась,
+    restore возвращает счётчики в окно.
+    """
+
+    WINDOW = int(os.getenv("NOTIFICATION_DIGEST_WINDOW", 60))
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+
+    @staticmethod
+    def key(chat_id: int) -> str:
+        return f"chat:{chat_id}:notify"
+
+    @staticmethod
+    def scheduled_key(chat_id: int) -> str:
+        return f"chat:{chat_id}:notify:scheduled"
+
+    async def add(self, chat_id: int, sender_id: UUID) -> bool:
+        """Учитывает сообщение. True - это первое сообщение окна."""
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(self.key(chat_id), str(sender_id), 1)
+            # страховка на случай, если задача так и не выполнится
+            pipe.expire(self.key(chat_id), self.WINDOW * 10)
+            pipe.set(self.scheduled_key(chat_id), 1, nx=True, ex=self.WINDOW * 2)
+            _, _, scheduled = await pipe.execute()
+        return bool(scheduled)
+
+    async def pop(self, chat_id: int) -> dict[str, int]:
+        """
+        Забирает накопленные счётчики и открывает новое окно.
+        Returns:
+            {sender_id: количество сообщений}
+        """
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.key(chat_id))
+            pipe.delete(self.key(chat_id), self.scheduled_key(chat_id))
+            counts, _ = await pipe.execute()
+        return {sender.decode(): int(count) for sender, count in counts.items()}
+
+    async def restore(self, chat_id: int, counts: dict[str, int]) -> bool:
+        """
+        Возвращает в окно счётчики дайджеста, который не удалось отправить.
+        True - окно не запланировано, задачу дайджеста нужно поставить заново;
+        иначе счётчики уйдут с дайджестом уже открытого окна.
+        """
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=True) as pipe:
+            for sender, count in counts.items():
+                pipe.hincrby(self.key(chat_id), sender, count)
+            pipe.expire(self.key(chat_id), self.WINDOW * 10)
+            pipe.set(self.scheduled_key(chat_id), 1, nx=True, ex=self.WINDOW * 2)
+            *_, scheduled = await pipe.execute()
+        return bool(scheduled)
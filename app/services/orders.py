@@ -0,0 +1,162 @@
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import Select, select, true, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.orders import Order, OrderSkill, UserOrderCounter
+from app.models.users import Users, user_skills_connector
+
+OPEN_STATUS_ID = 1
+COMPLETED_STATUS_ID = 3
+CREATED_ROLE = "created"
+ASSIGNED_ROLE = "assigned"
+
+
+def is_open(status_id: int, assign_to: Optional[UUID]) -> bool:
+    """Заказ ждёт исполнителя: новый и никому не назначен."""
+    return status_id == OPEN_STATUS_ID and assign_to is None
+
+
+def completed_by(status_id: int, assign_to: Optional[UUID]) -> Optional[UUID]:
+    """Исполнитель, которому засчитан завершённый заказ."""
+    return assign_to if status_id == COMPLETED_STATUS_ID else None
+
+
+def feed_query(
+    user_id: UUID,
+    before_at: Optional[datetime] = None,
+    before_id: Optional[UUID] = None,
+    limit: int = 20,
+) -> Select:
+    """
+    Лента исполнителя: открытые заказы с его навыками, от новых к старым.
+
+    Для каждого навыка пользователя LATERAL-подзапрос берёт не больше
+    limit записей из частичного индекса ix_order_skills_feed, дальше
+    сортируются только эти кандидаты. Стоимость страницы зависит от числа
+    навыков и limit, а не от количества заказов.
+    Курсор - (created_at, id) последнего заказа предыдущей страницы.
+    """
+    skills = (
+        select(user_skills_connector.c.skill_id)
+        .where(user_skills_connector.c.user_id == user_id)
+        .subquery("skills")
+    )
+    per_skill = select(OrderSkill.order_id, OrderSkill.created_at).where(
+        OrderSkill.skill_id == skills.c.skill_id,
+        # условие совпадает с предикатом индекса дословно
+        OrderSkill.is_open,
+    )
+    if before_at is not None and before_id is not None:
+        per_skill = per_skill.where(
+            tuple_(OrderSkill.created_at, OrderSkill.order_id)
+            < tuple_(before_at, before_id)
+        )
+    per_skill = (
+        per_skill.order_by(OrderSkill.created_at.desc(), OrderSkill.order_id.desc())
+        .limit(limit)
+        .lateral("per_skill")
+    )
+    # заказ с несколькими навыками пользователя попадает в ленту один раз
+    matched = (
+        select(per_skill.c.order_id, per_skill.c.created_at)
+        .select_from(skills.join(per_skill, true()))
+        .distinct()
+        .subquery("matched")
+    )
+    return (
+        select(Order)
+        .join(matched, Order.id == matched.c.order_id)
+        .order_by(matched.c.created_at.desc(), matched.c.order_id.desc())
+        .limit(limit)
+    )
+
+
+def matching_performers_query(
+    skill_ids: list[int],
+    exclude_user_id: UUID,
+    after_id: Optional[UUID] = None,
+    limit: int = 500,
+) -> Select:
+    """
+    Пачка исполнителей, у которых есть хотя бы один из навыков заказа,
+    по индексу ix_user_skills_connector_skill_id. Курсор - ID пользователя.
+    """
+    connector = user_skills_connector.c
+    user_ids = select(connector.user_id).where(
+        connector.skill_id.in_(skill_ids), connector.user_id != exclude_user_id
+    )
+    if after_id is not None:
+        user_ids = user_ids.where(connector.user_id > after_id)
+    user_ids = user_ids.distinct().order_by(connector.user_id).limit(limit).subquery()
+    return (
+        select(Users.id, Users.email)
+        .join(user_ids, Users.id == user_ids.c.user_id)
+        .order_by(Users.id)
+    )
+
+
+def counter_key(order: Order) -> tuple:
+    """Поля заказа, от которых зависят счётчики дашборда."""
+    return order.created_by, order.assign_to, order.status_id
+
+
+def counter_deltas(before: Optional[tuple], after: Optional[tuple]) -> dict:
+    """
+    Изменения счётчиков дашборда при создании (before=None), обновлении
+    и удалении (after=None) заказа: {(user_id, role, status_id): delta}.
+    before и after - значения counter_key до и после изменения.
+    """
+    deltas = Counter()
+    for key, sign in ((before, -1), (after, 1)):
+        if key is None:
+            continue
+        created_by, assign_to, status_id = key
+        deltas[(created_by, CREATED_ROLE, status_id)] += sign
+        if assign_to is not None:
+            deltas[(assign_to, ASSIGNED_ROLE, status_id)] += sign
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def counters_upsert_query(deltas: dict):
+    """Все изменения счётчиков одним INSERT ... ON CONFLICT DO UPDATE."""
+    query = insert(UserOrderCounter).values(
+        [
+            {"user_id": user_id, "role": role, "status_id": status_id, "count": delta}
+            # постоянный порядок строк - постоянный порядок блокировок
+            for (user_id, role, status_id), delta in sorted(
+                deltas.items(), key=lambda item: (str(item[0][0]), *item[0][1:])
+            )
+        ]
+    )
+    return query.on_conflict_do_update(
+        index_elements=[
+            UserOrderCounter.user_id,
+            UserOrderCounter.role,
+            UserOrderCounter.status_id,
+        ],
+        set_={"count": UserOrderCounter.__table__.c.count + query.excluded.count},
+    )
+
+
+def user_orders_query(
+    user_id: UUID,
+    role: str,
+    before_at: Optional[datetime] = None,
+    before_id: Optional[UUID] = None,
+    limit: int = 20,
+) -> Select:
+    """
+    Заказы, созданные пользователем или назначенные ему, от новых к старым.
+    Keyset-выборка по индексам (created_by|assign_to, created_at, id).
+    """
+    column = Order.created_by if role == CREATED_ROLE else Order.assign_to
+    query = select(Order).where(column == user_id)
+    if before_at is not None and before_id is not None:
+        query = query.where(
+            tuple_(Order.created_at, Order.id) < tuple_(before_at, before_id)
+        )
+    return query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit)
@@ -0,0 +1,103 @@
+import json
+import os
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Select, func, or_, select
+
+from app.core.database import RedisSingleton
+from app.models.outbox import OutboxEvent
+
+ORDER_CREATED = "order.created"
+ORDER_UPDATED = "order.updated"
+ORDER_DELETED = "order.deleted"
+ORDER_DEADLINE_APPROACHING = "order.deadline_approaching"
+MESSAGE_CREATED = "chat.message.created"
+
+STREAM_MAXLEN = int(os.getenv("OUTBOX_STREAM_MAXLEN", 100000))
+# сколько хранится отметка о выполненном шаге события, сек.
+DEDUP_TTL = int(os.getenv("OUTBOX_DEDUP_TTL", 24 * 60 * 60))
+
+
+def add_event(db, topic: str, payload: dict[str, Any], aggregate_id=None):
+    """
+    Добавляет событие в текущую транзакцию: оно будет опубликовано,
+    только если транзакция зафиксируется. Коммит - за вызывающим.
+    """
+    db.add(
+        OutboxEvent(
+            topic=topic,
+            aggregate_id=str(aggregate_id) if aggregate_id is not None else None,
+            payload=jsonable_encoder(payload),
+        )
+    )
+
+
+def pending_events_query(limit: int, after_id: Optional[int] = None) -> Select:
+    """
+    Самые старые неотправленные события: не мёртвые и не отложенные после
+    ошибки. Строки блокируются до конца транзакции, занятые другим
+    ретранслятором пропускаются. after_id - курсор внутри одного запуска,
+    чтобы упавшие события не выбирались повторно сразу же.
+    """
+    query = select(OutboxEvent).where(
+        OutboxEvent.dead_at.is_(None),
+        or_(OutboxEvent.retry_at.is_(None), OutboxEvent.retry_at <= func.now()),
+    )
+    if after_id is not None:
+        query = query.where(OutboxEvent.id > after_id)
+    return query.order_by(OutboxEvent.id).limit(limit).with_for_update(skip_locked=True)
+
+
+def stream_key(topic: str) -> str:
+    return f"events:{topic}"
+
+
+def done_key(event_id: int, step: str) -> str:
+    return f"outbox:done:{event_id}:{step}"
+
+
+async def claim(client, keys: list[str]) -> list[bool]:
+    """
+    Отмечает шаги событий как выполняемые (SET NX). False - шаг уже
+    выполнен раньше: событие доставляется повторно после падения
+    ретранслятора до удаления строки.
+    """
+    async with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.set(key, 1, nx=True, ex=DEDUP_TTL)
+        return [bool(claimed) for claimed in await pipe.execute()]
+
+
+async def publish_to_streams(events: list[OutboxEvent]):
+    """
+    Публикует пачку событий в Redis Streams events:{topic} одним запросом.
+    Уже опубликованные события пропускаются, при ошибке отметки снимаются.
+    """
+    client = await RedisSingleton().redis_client
+    keys = [done_key(event.id, "stream") for event in events]
+    claimed = await claim(client, keys)
+    events = [event for event, fresh in zip(events, claimed) if fresh]
+    if not events:
+        return
+    try:
+        await _xadd(client, events)
+    except Exception:
+        await client.delete(*(key for key, fresh in zip(keys, claimed) if fresh))
+        raise
+
+
+async def _xadd(client, events: list[OutboxEvent]):
+    async with client.pipeline(transaction=False) as pipe:
+        for event in events:
+            pipe.xadd(
+                stream_key(event.topic),
+                {
+                    "id": event.id,
+                    "aggregate_id": event.aggregate_id or "",
+                    "payload": json.dumps(event.payload),
+                },
+                maxlen=STREAM_MAXLEN,
+                approximate=True,
+            )
+        await pipe.execute()
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable
+from uuid import UUID
+
+from app.core.database import RedisSingleton
+
+logger = logging.getLogger(__name__)
+
+
+class Presence:
+    """
+    Присутствие пользователей и индикаторы набора текста.
+
+    presence:{user}       - пользователь в сети, живёт ONLINE_TTL секунд
+                            и продлевается heartbeat'ами;
+    last_seen:{user}      - время последней активности (unix time);
+    typing:{chat}:{user}  - пользователь печатает, живёт TYPING_TTL секунд.
+
+    Повторные записи того же состояния отбрасываются, пока ключ
+    не прожил половину своего TTL, поэтому частые heartbeat'ы
+    и события набора почти не нагружают Redis.
+    """
+
+    ONLINE_TTL = int(os.getenv("PRESENCE_ONLINE_TTL", 60))
+    TYPING_TTL = int(os.getenv("PRESENCE_TYPING_TTL", 6))
+    LAST_SEEN_TTL = 30 * 24 * 60 * 60
+
+    def __init__(self):
+        self.redis = RedisSingleton()
+        self._written: Dict[str, float] = {}
+
+    @staticmethod
+    def online_key(user_id: UUID) -> str:
+        return f"presence:{user_id}"
+
+    @staticmethod
+    def last_seen_key(user_id: UUID) -> str:
+        return f"last_seen:{user_id}"
+
+    @staticmethod
+    def typing_key(chat_id: int, user_id: UUID) -> str:
+        return f"typing:{chat_id}:{user_id}"
+
+    def _is_fresh(self, key: str, ttl: int) -> bool:
+        """Ключ записан недавно, и его можно не продлевать."""
+        written_at = self._written.get(key)
+        return written_at is not None and time.monotonic() - written_at < ttl / 2
+
+    async def heartbeat(self, user_id: UUID):
+        """Отмечает пользователя в сети и обновляет время последней активности."""
+        key = self.online_key(user_id)
+        if self._is_fresh(key, self.ONLINE_TTL):
+            return
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(key, 1, ex=self.ONLINE_TTL)
+            pipe.set(
+                self.last_seen_key(user_id), int(time.time()), ex=self.LAST_SEEN_TTL
+            )
+            await pipe.execute()
+        self._written[key] = time.monotonic()
+
+    async def go_offline(self, user_id: UUID):
+        """Вызывается при закрытии последнего подключения пользователя."""
+        key = self.online_key(user_id)
+        suffix = f":{user_id}"
+        self._written = {
+            written: written_at
+            for written, written_at in self._written.items()
+            if not written.endswith(suffix)
+        }
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.delete(key)
+            pipe.set(
+                self.last_seen_key(user_id), int(time.time()), ex=self.LAST_SEEN_TTL
+            )
+            await pipe.execute()
+
+    async def set_typing(self, chat_id: int, user_id: UUID, is_typing: bool) -> bool:
+        """
+        Сохраняет состояние набора текста.
+        Возвращает True, если состояние изменилось и о нём нужно сообщить чату.
+        """
+        key = self.typing_key(chat_id, user_id)
+        written_at = self._written.get(key)
+        now = time.monotonic()
+        client = await self.redis.redis_client
+        if is_typing:
+            if self._is_fresh(key, self.TYPING_TTL):
+                return False
+            await client.set(key, 1, ex=self.TYPING_TTL)
+            self._written[key] = now
+            return written_at is None or now - written_at >= self.TYPING_TTL
+        if written_at is None:
+            return False
+        await client.delete(key)
+        self._written.pop(key, None)
+        return True
+
+    async def get_typing(self, chat_id: int, user_ids: Iterable[UUID]) -> list[UUID]:
+        """Кто из перечисленных пользователей сейчас печатает в чате."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        client = await self.redis.redis_client
+        values = await client.mget(
+            [self.typing_key(chat_id, user_id) for user_id in user_ids]
+        )
+        return [user_id for user_id, value in zip(user_ids, values) if value]
+
+    async def get_many(self, user_ids: Iterable[UUID]) -> Dict[UUID, dict]:
+        """
+        Присутствие списка пользователей за один запрос к Redis.
+        Returns:
+            {user_id: {"online": bool, "last_seen": datetime | None}}
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        client = await self.redis.redis_client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.mget([self.online_key(user_id) for user_id in user_ids])
+            pipe.mget([self.last_seen_key(user_id) for user_id in user_ids])
+            online, last_seen = await pipe.execute()
+        return {
+            user_id: {
+                "online": bool(is_online),
+                "last_seen": (
+                    datetime.utcfromtimestamp(int(seen_at)) if seen_at else None
+                ),
+            }
+            for user_id, is_online, seen_at in zip(user_ids, online, last_seen)
+        }
+
+
+class PresenceCoalescer:
+    """
+    Склеивает события присутствия и набора текста по чатам.
+
+    Первое событие чата откладывает отправку на INTERVAL секунд,
+    все события за это время объединяются в одно, где по каждому
+    пользователю остаётся последнее состояние. Так чат получает
+    не больше 1 / INTERVAL событий в секунду, сколько бы в нём ни печатали.
+    """
+
+    INTERVAL = float(os.getenv("PRESENCE_COALESCE_INTERVAL", 0.25))
+
+    def __init__(self, publish: Callable[[int, dict], Awaitable[None]]):
+        self.publish = publish
+        self._pending: Dict[int, Dict[str, dict]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def add(self, chat_id: int, kind: str, user_id: UUID, state):
+        """
+        Ставит событие в очередь чата.
+        Args:
+            kind: "typing" или "presence"
+            state: Последнее состояние пользователя
+        """
+        events = self._pending.setdefault(chat_id, {})
+        events.setdefault(kind, {})[str(user_id)] = state
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+
+    async def _flush_later(self, chat_id: int):
+        try:
+            await asyncio.sleep(self.INTERVAL)
+        finally:
+            self._tasks.pop(chat_id, None)
+            events = self._pending.pop(chat_id, None)
+        if not events:
+            return
+        try:
+            await self.publish(chat_id, events)
+        except Exception as e:
+            logger.error(f"Ошибка отправки событий присутствия в чат {chat_id}: {e}")
+
+    async def flush(self):
+        """Немедленно отправляет все накопленные события, например при остановке."""
+        pending, self._pending = self._pending, {}
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = {}
+        await asyncio.gather(
+            *(self.publish(chat_id, events) for chat_id, events in pending.items()),
+            return_exceptions=True,
+        )
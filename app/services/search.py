@@ -0,0 +1,76 @@
+import os
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import Select, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.api.base import BaseApi
+from app.models.chat import Message, MessageSearchToken
+from app.services.chat import chat_access_clause
+
+SEARCH_ENABLED = os.getenv("MESSAGE_SEARCH_ENABLED", "true").lower() == "true"
+MAX_QUERY_TOKENS = 8
+
+
+def search_token_rows(chat_id: int, message_id: int, text: str) -> list[dict]:
+    """Строки слепого индекса для одного сообщения."""
+    return [
+        {"chat_id": chat_id, "token_hash": token_hash, "message_id": message_id}
+        for token_hash in BaseApi.security.blind_index.tokens(chat_id, text)
+    ]
+
+
+async def index_message(db, chat_id: int, message_id: int, text: str):
+    """
+    Записывает токены сообщения в текущей транзакции,
+    чтобы сообщение и его индекс появлялись атомарно.
+    """
+    if not SEARCH_ENABLED:
+        return
+    rows = search_token_rows(chat_id, message_id, text)
+    if rows:
+        await db.execute(insert(MessageSearchToken), rows)
+
+
+def upsert_search_tokens(rows: list[dict]):
+    """INSERT ... ON CONFLICT DO NOTHING для повторной индексации."""
+    return pg_insert(MessageSearchToken).values(rows).on_conflict_do_nothing()
+
+
+def search_query(
+    chat_id: int,
+    user_id: UUID,
+    text: str,
+    before_id: Optional[int] = None,
+    limit: int = 20,
+) -> Select | None:
+    """
+    ID сообщений чата, содержащих все слова запроса, от новых к старым.
+    Каждое слово - диапазон по первичному ключу
+    (chat_id, token_hash, message_id), история не расшифровывается.
+    None, если в запросе нет ни одного слова для поиска.
+    """
+    words = BaseApi.security.blind_index.normalize(text)[:MAX_QUERY_TOKENS]
+    if not words:
+        return None
+    hashes = [BaseApi.security.blind_index.hash(chat_id, word) for word in words]
+    query = select(MessageSearchToken.message_id).where(
+        MessageSearchToken.chat_id == chat_id,
+        MessageSearchToken.token_hash.in_(hashes),
+        chat_access_clause(chat_id, user_id),
+    )
+    if before_id is not None:
+        query = query.where(MessageSearchToken.message_id < before_id)
+    return (
+        query.group_by(MessageSearchToken.message_id)
+        .having(func.count() == len(hashes))
+        .order_by(MessageSearchToken.message_id.desc())
+        .limit(limit)
+    )
+
+
+def messages_by_ids_query(message_ids: list[int]) -> Select:
+    return (
+        select(Message).where(Message.id.in_(message_ids)).order_by(Message.id.desc())
+    )
@@ -0,0 +1,58 @@
+import logging
+import time
+from datetime import datetime
+
+from app.core.database import PgSingleton
+from app.services.analytics import (
+    VIEWS,
+    AnalyticsCache,
+    ensure_views,
+    refresh_view_statement,
+)
+from app.tasks.heartbeats import heartbeat, keep_alive
+from app.tasks.metrics import (
+    ANALYTICS_LAST_REFRESH,
+    ANALYTICS_REFRESH_FAILURES,
+    ANALYTICS_REFRESH_SECONDS,
+)
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+cache = AnalyticsCache()
+
+
+async def async_refresh_analytics_views() -> dict[str, datetime]:
+    """
+    Создаёт недостающие представления и обновляет их CONCURRENTLY:
+    отчёты продолжают читать прежние данные, пока идёт пересчёт.
+    Каждое представление обновляется в своей транзакции, ошибка одного
+    не мешает остальным. Пока идёт REFRESH, пульс задачи шлёт keep_alive:
+    обновление может идти дольше порога зависших задач.
+    После обновления кэш ответов сбрасывается.
+    Возвращает время обновления по представлениям.
+    """
+    async with PgSingleton().session as db, keep_alive():
+        await ensure_views(db)
+    refreshed = {}
+    for view in VIEWS:
+        started = time.perf_counter()
+        try:
+            async with PgSingleton().session as db, keep_alive():
+                await db.execute(refresh_view_statement(view))
+                await db.commit()
+        except Exception as e:
+            ANALYTICS_REFRESH_FAILURES.labels(view).inc()
+            logger.error(f"Ошибка обновления {view}: {e}")
+            continue
+        ANALYTICS_REFRESH_SECONDS.labels(view).observe(time.perf_counter() - started)
+        ANALYTICS_LAST_REFRESH.labels(view).set(time.time())
+        refreshed[view] = datetime.utcnow()
+        heartbeat()
+    await cache.invalidate(refreshed)
+    return refreshed
+
+
+@async_task(heartbeats=True)
+async def refresh_analytics_views():
+    return await async_refresh_analytics_views()
@@ -1,47 +1,40 @@
-from datetime import datetime
 from app.core.celery import celery_app
 from app.main import logger
-from app.tasks.config import STALE_TASK_THRESHOLD
-from celery.exceptions import SoftTimeLimitExceeded
+from app.tasks.config import STALE_TASK_MAX_ATTEMPTS, STALE_TASK_THRESHOLD
+from app.tasks.heartbeats import ATTEMPTS_HEADER, claim_stale
 
 
-@celery_app.task(bind=True, max_retries=3)
-def restart_stuck_tasks(self):
+@celery_app.task
+def restart_stuck_tasks():
     """
     Периодическая задача,
-    которая проверяет статусы задач, и закрывает зависшие.
-    При этом задача будет перезапущена не более 3 раз.
+    которая находит задачи без пульса дольше STALE_TASK_THRESHOLD,
+    останавливает их и запускает заново.
+    Каждая задача перезапускается не более STALE_TASK_MAX_ATTEMPTS раз,
+    номер попытки передаётся в заголовке новой задачи.
     """
-    inspect = celery_app.control.inspect()
-    active_tasks = inspect.active() or {}
-    now = datetime.utcnow()
+    restarted = 0
+    for task_id, task in claim_stale(STALE_TASK_THRESHOLD.total_seconds()):
+        celery_app.control.revoke(task_id, terminate=True)
+        attempt = task["attempts"] + 1
+        if attempt > STALE_TASK_MAX_ATTEMPTS:
+            logger.error(
+                f"Task {task_id} ({task['name']}) failed after "
+                f"{STALE_TASK_MAX_ATTEMPTS} restarts."
+            )
+            continue
+        new_task = celery_app.send_task(
+            task["name"],
+            args=task["args"],
+            kwargs=task["kwargs"],
+            headers={ATTEMPTS_HEADER: attempt},
+        )
+        restarted += 1
+        logger.info(
+            f"restart_stuck_tasks: "
+            f"Revoked and rescheduled task "
+            f"{task_id} ({task['name']}) as {new_task.id}, "
+            f"attempt {attempt}"
+        )
 
-    for worker, tasks in active_tasks.items():
-        for task in tasks:
-            task_id = task["id"]
-            task_name = task["name"]
-            received_time = datetime.utcfromtimestamp(task["time_start"])
-            if now - received_time > STALE_TASK_THRESHOLD:
-                current_retries = task.get("retries", 0)
-                if current_retries < 3:
-                    try:
-                        celery_app.control.revoke(task_id, terminate=True)
-                        celery_app.send_task(
-                            task_name,
-                            args=task.get("args", []),
-                            kwargs=task.get("kwargs", {}),
-                            retries=current_retries + 1,
-                        )
-                        logger.info(
-                            f"restart_stuck_tasks: "
-                            f"Revoked and rescheduled task "
-                            f"{task_id} ({task_name}), "
-                            f"attempt {current_retries + 1}"
-                        )
-                    except SoftTimeLimitExceeded:
-                        logger.error(f"Task {task_id} exceeded time limit and failed.")
-                        self.retry(countdown=60)
-                else:
-                    logger.error(f"Task {task_id} failed after 3 attempts.")
-
-    return "Revision finished"
+    return f"Revision finished, restarted: {restarted}"
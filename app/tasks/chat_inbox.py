@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import func, select
+
+from app.core.database import PgSingleton, RedisSingleton
+from app.models.chat import Chat
+from app.services.chat import last_message_backfill_query
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CURSOR_KEY = "chats:last_message:backfill:cursor"
+BACKFILL_UNTIL_KEY = "chats:last_message:backfill:until"
+BACKFILL_DONE_KEY = "chats:last_message:backfill:done"
+BACKFILL_BATCH_SIZE = int(os.getenv("CHAT_LAST_MESSAGE_BACKFILL_BATCH_SIZE", 1000))
+BACKFILL_MAX_BATCHES = int(os.getenv("CHAT_LAST_MESSAGE_BACKFILL_MAX_BATCHES", 20))
+BACKFILL_PAUSE = float(os.getenv("CHAT_LAST_MESSAGE_BACKFILL_PAUSE", 0.5))
+
+
+async def async_backfill_last_message(
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    max_batches: int = BACKFILL_MAX_BATCHES,
+    pause: float = BACKFILL_PAUSE,
+) -> int:
+    """
+    Заполняет chats.last_message_at и last_message_id для чатов,
+    созданных до появления этих колонок: server_default проставил им
+    время развёртывания, и список чатов сортировался бы неверно.
+    Идёт по диапазонам chats.id до максимального ID на момент первого
+    запуска, позиция хранится в Redis. Дойдя до конца, ставит отметку
+    и дальше ничего не делает: новые чаты заполняет save_message.
+    """
+    redis_client = await RedisSingleton().redis_client
+    if await redis_client.exists(BACKFILL_DONE_KEY):
+        return 0
+    last_id = int(await redis_client.get(BACKFILL_CURSOR_KEY) or 0)
+    updated = 0
+    async with PgSingleton().session as db:
+        until_id = await redis_client.get(BACKFILL_UNTIL_KEY)
+        if until_id is None:
+            result = await db.execute(select(func.max(Chat.id)))
+            until_id = result.scalar() or 0
+            await redis_client.set(BACKFILL_UNTIL_KEY, until_id)
+        until_id = int(until_id)
+        for _ in range(max_batches):
+            if last_id >= until_id:
+                await redis_client.set(BACKFILL_DONE_KEY, 1)
+                logger.info("Заполнение последних сообщений чатов завершено")
+                break
+            upper_id = min(last_id + batch_size, until_id)
+            result = await db.execute(last_message_backfill_query(last_id, upper_id))
+            await db.commit()
+            updated += result.rowcount
+            last_id = upper_id
+            await redis_client.set(BACKFILL_CURSOR_KEY, last_id)
+            heartbeat()
+            await asyncio.sleep(pause)
+    logger.info(f"Заполнено последних сообщений чатов: {updated}, курсор: {last_id}")
+    return updated
+
+
+@async_task(heartbeats=True)
+async def backfill_last_message():
+    return await async_backfill_last_message()
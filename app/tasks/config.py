@@ -1,13 +1,69 @@
+import os
 from datetime import timedelta
 
 from app.core.celery import celery_app
 
+# задача без пульса дольше порога считается зависшей
 STALE_TASK_THRESHOLD = timedelta(minutes=10)
+STALE_TASK_MAX_ATTEMPTS = 3
+DEADLINE_REMINDER_INTERVAL = timedelta(
+    minutes=float(os.getenv("DEADLINE_REMINDER_INTERVAL_MINUTES", 15))
+)
+LEADERBOARD_RECONCILE_INTERVAL = timedelta(
+    minutes=float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL_MINUTES", 60))
+)
+ANALYTICS_REFRESH_INTERVAL = timedelta(
+    minutes=float(os.getenv("ANALYTICS_REFRESH_INTERVAL_MINUTES", 15))
+)
+OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", 2))
 
 # Периодические задачи
 celery_app.conf.beat_schedule = {
     "restart-stuck-tasks": {
         "task": "app.tasks.celery_period_tasks.restart_stuck_tasks",
-        "schedule": timedelta(minutes=20),
+        "schedule": timedelta(minutes=1),
+    },
+    "reencrypt-messages": {
+        "task": "app.tasks.message_encryption.reencrypt_messages",
+        "schedule": timedelta(minutes=10),
+    },
+    "backfill-search-index": {
+        "task": "app.tasks.message_search.backfill_search_index",
+        "schedule": timedelta(minutes=10),
+    },
+    # после завершения запуск сводится к одной проверке отметки в Redis
+    "backfill-chat-last-message": {
+        "task": "app.tasks.chat_inbox.backfill_last_message",
+        "schedule": timedelta(minutes=10),
+    },
+    # события outbox; устаревшие запуски не копятся в очереди
+    "relay-outbox": {
+        "task": "app.tasks.outbox.relay_outbox",
+        "schedule": timedelta(seconds=OUTBOX_RELAY_INTERVAL),
+        "options": {"expires": OUTBOX_RELAY_INTERVAL},
+    },
+    "send-deadline-reminders": {
+        "task": "app.tasks.deadlines.send_deadline_reminders",
+        "schedule": DEADLINE_REMINDER_INTERVAL,
+    },
+    # исправление расхождений агрегатов исполнителей и рейтингов в Redis
+    "reconcile-leaderboard": {
+        "task": "app.tasks.leaderboard.reconcile_leaderboard",
+        "schedule": LEADERBOARD_RECONCILE_INTERVAL,
+    },
+    "rebuild-order-counters": {
+        "task": "app.tasks.order_counters.rebuild_order_counters",
+        "schedule": timedelta(days=1),
+    },
+    # пропущенный запуск не выполняется: следующий всё равно пересчитает всё
+    "refresh-analytics-views": {
+        "task": "app.tasks.analytics.refresh_analytics_views",
+        "schedule": ANALYTICS_REFRESH_INTERVAL,
+        "options": {"expires": ANALYTICS_REFRESH_INTERVAL.total_seconds()},
+    },
+    # отложенные и не отправленные вовремя письма
+    "dispatch-emails": {
+        "task": "app.tasks.email_tasks.dispatch_emails",
+        "schedule": timedelta(minutes=1),
     },
 }
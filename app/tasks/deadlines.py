@@ -0,0 +1,139 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, literal, select, tuple_, update
+
+from app.core.database import PgSingleton
+from app.models.orders import Order
+from app.models.users import Users
+from app.services.orders import COMPLETED_STATUS_ID
+from app.services.outbox import ORDER_DEADLINE_APPROACHING, add_event
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_REMINDER_WINDOW = timedelta(
+    hours=float(os.getenv("DEADLINE_REMINDER_HOURS", 24))
+)
+DEADLINE_REMINDER_BATCH_SIZE = int(os.getenv("DEADLINE_REMINDER_BATCH_SIZE", 500))
+DEADLINE_REMINDER_MAX_BATCHES = int(os.getenv("DEADLINE_REMINDER_MAX_BATCHES", 100))
+
+
+def due_orders_query(
+    now: datetime,
+    until: datetime,
+    after: tuple[datetime, object] | None,
+    limit: int,
+):
+    """
+    Отмечает напоминание для следующей пачки заказов с дедлайном
+    в (now, until] и возвращает их. Условия совпадают с предикатом
+    частичного индекса ix_orders_deadline_reminder_pending, поэтому
+    выборка - диапазон по индексу от курсора (deadline, id), а не скан
+    таблицы; занятые другим запуском строки пропускаются.
+    """
+    pending = and_(
+        Order.deadline.is_not(None),
+        Order.deadline_reminder_sent_at.is_(None),
+        # значение подставляется в текст запроса, иначе при общем плане
+        # подготовленного запроса планировщик не сопоставит его с индексом
+        Order.status_id != literal(COMPLETED_STATUS_ID, literal_execute=True),
+    )
+    batch = (
+        select(Order.id)
+        .where(pending, Order.deadline > now, Order.deadline <= until)
+        .order_by(Order.deadline, Order.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    if after is not None:
+        batch = batch.where(tuple_(Order.deadline, Order.id) > after)
+    return (
+        update(Order)
+        .where(Order.id.in_(batch.scalar_subquery()))
+        .values(deadline_reminder_sent_at=now)
+        .returning(
+            Order.id, Order.name, Order.deadline, Order.created_by, Order.assign_to
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def group_by_user(rows) -> dict:
+    """Заказы пачки по получателям: заказчику и исполнителю."""
+    grouped = defaultdict(list)
+    for row in rows:
+        for user_id in {row.created_by, row.assign_to} - {None}:
+            grouped[user_id].append(row)
+    return grouped
+
+
+async def async_send_deadline_reminders(
+    batch_size: int = DEADLINE_REMINDER_BATCH_SIZE,
+    max_batches: int = DEADLINE_REMINDER_MAX_BATCHES,
+) -> int:
+    """
+    Находит заказы, дедлайн которых наступит в ближайшие
+    DEADLINE_REMINDER_WINDOW, и ставит по одному событию outbox
+    на пользователя и пачку. Отметка о напоминании и событие пишутся
+    в одной транзакции. Возвращает количество заказов.
+    """
+    now = datetime.utcnow()
+    until = now + DEADLINE_REMINDER_WINDOW
+    cursor = None
+    reminded = 0
+    for _ in range(max_batches):
+        async with PgSingleton().session as db:
+            rows = (
+                await db.execute(due_orders_query(now, until, cursor, batch_size))
+            ).all()
+            if not rows:
+                break
+            grouped = group_by_user(rows)
+            emails = dict(
+                (
+                    await db.execute(
+                        select(Users.id, Users.email).where(Users.id.in_(list(grouped)))
+                    )
+                ).all()
+            )
+            for user_id, orders in grouped.items():
+                if not emails.get(user_id):
+                    continue
+                add_event(
+                    db,
+                    ORDER_DEADLINE_APPROACHING,
+                    {
+                        "user_id": user_id,
+                        "email": emails[user_id],
+                        "orders": [
+                            {
+                                "id": order.id,
+                                "name": order.name,
+                                "deadline": order.deadline,
+                            }
+                            for order in sorted(
+                                orders, key=lambda order: order.deadline
+                            )
+                        ],
+                    },
+                    aggregate_id=user_id,
+                )
+            await db.commit()
+        last = max(rows, key=lambda row: (row.deadline, row.id))
+        cursor = (last.deadline, last.id)
+        reminded += len(rows)
+        heartbeat()
+        if len(rows) < batch_size:
+            break
+    if reminded:
+        logger.info(f"Напоминания о дедлайне: {reminded} заказов")
+    return reminded
+
+
+@async_task(heartbeats=True)
+async def send_deadline_reminders():
+    return await async_send_deadline_reminders()
@@ -0,0 +1,94 @@
+import logging
+import os
+import random
+import time
+from collections import Counter
+
+from celery.signals import worker_process_shutdown
+
+from app.services.email import EmailOutbox, EmailSender, is_permanent
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 100))
+EMAIL_MAX_BATCHES = int(os.getenv("EMAIL_MAX_BATCHES", 50))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", 30))
+
+outbox = EmailOutbox()
+sender = EmailSender()
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка с разбросом, чтобы повторы не шли волной."""
+    return EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+
+
+def domain(address: str) -> str:
+    return address.rpartition("@")[2].lower()
+
+
+async def apply_rate_limits(items: list[dict]) -> list[dict]:
+    """
+    Оставляет письма, укладывающиеся в лимит доменов на эту минуту,
+    остальные откладывает на следующую минуту без учёта попытки.
+    """
+    allowed = await outbox.reserve(Counter(domain(item["to"]) for item in items))
+    ready = []
+    next_minute = 60 - time.time() % 60
+    for item in items:
+        item_domain = domain(item["to"])
+        if allowed[item_domain] > 0:
+            allowed[item_domain] -= 1
+            ready.append(item)
+        else:
+            await outbox.retry(item, next_minute + random.uniform(0, 5))
+    return ready
+
+
+async def async_dispatch_emails(max_batches: int = EMAIL_MAX_BATCHES) -> int:
+    """
+    Отправляет накопленные письма пачками по EMAIL_BATCH_SIZE.
+    Временные ошибки откладываются с экспоненциальной задержкой,
+    после EMAIL_MAX_ATTEMPTS попыток и при ошибках 5xx письмо
+    попадает в email:dead. Пачка снимается из email:processing только
+    после обработки, письма упавшего воркера вернёт requeue_due.
+    Возвращает количество отправленных писем.
+    """
+    await outbox.release()
+    await outbox.requeue_due()
+    sent = 0
+    for _ in range(max_batches):
+        popped = await outbox.pop(EMAIL_BATCH_SIZE)
+        if not popped:
+            break
+        items = await apply_rate_limits(popped)
+        errors = await sender.send_batch(items)
+        heartbeat()
+        for item, error in zip(items, errors):
+            if error is None:
+                sent += 1
+                continue
+            item["attempts"] += 1
+            if is_permanent(error) or item["attempts"] >= EMAIL_MAX_ATTEMPTS:
+                logger.error(f"Письмо для {item['to']} не отправлено: {error}")
+                await outbox.dead(item, error)
+            else:
+                await outbox.retry(item, retry_delay(item["attempts"]))
+        # до этого места письма пачки остаются в email:processing
+        await outbox.ack(popped)
+    if sent:
+        logger.info(f"Отправлено писем: {sent}")
+    return sent
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(**kwargs):
+    sender.pool.close()
+
+
+@async_task(heartbeats=True)
+async def dispatch_emails():
+    return await async_dispatch_emails()
@@ -0,0 +1,149 @@
+"""
+Пульс выполняемых задач Celery.
+
+Учитываются только задачи, объявленные с heartbeats=True:
+    @async_task(heartbeats=True)
+Такая задача обязана вызывать heartbeat() между шагами не реже порога
+STALE_TASK_THRESHOLD - иначе её остановят и запустят заново. Остальные
+задачи не учитываются и не перезапускаются, сколько бы они ни шли.
+
+Перед запуском задачи воркер записывает её в Redis:
+    celery:task_heartbeats - sorted set task_id -> время последнего пульса;
+    celery:tasks:running   - хэш task_id -> JSON с именем, аргументами
+                             и номером попытки перезапуска.
+После завершения задачи записи удаляются. Зависшие задачи - те, чей пульс
+старше порога, - находятся одним запросом ZRANGEBYSCORE без опроса воркеров.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+import redis
+from celery import current_task
+from celery.signals import task_postrun, task_prerun
+
+logger = logging.getLogger(__name__)
+
+HEARTBEATS_KEY = "celery:task_heartbeats"
+RUNNING_KEY = "celery:tasks:running"
+# заголовок задачи с номером перезапуска, доступен как request.stuck_attempts
+ATTEMPTS_HEADER = "stuck_attempts"
+# период пульса keep_alive, сек.; должен быть заметно меньше порога зависания
+KEEP_ALIVE_INTERVAL = float(os.getenv("TASK_KEEP_ALIVE_INTERVAL", 60))
+
+_client: redis.Redis | None = None
+
+
+def get_client() -> redis.Redis:
+    """
+    Синхронный клиент: сигналы Celery вызываются вне event loop.
+    Пул соединений redis-py сам пересоздаётся после fork.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            password=os.getenv("REDIS_PASSWORD", ""),
+            username=os.getenv("REDIS_USERNAME", ""),
+            db=int(os.getenv("REDIS_DB", 0)),
+            ssl=os.getenv("REDIS_SSL", "false").lower() == "true",
+        )
+    return _client
+
+
+def heartbeat(task_id: str | None = None):
+    """Отмечает, что задача жива. По умолчанию - текущая задача."""
+    task_id = task_id or (current_task and current_task.request.id)
+    if task_id:
+        # XX: не воскрешаем задачу, которую уже забрал restart_stuck_tasks
+        try:
+            get_client().zadd(HEARTBEATS_KEY, {task_id: time.time()}, xx=True)
+        except redis.RedisError as e:
+            logger.error(f"Не удалось обновить пульс задачи {task_id}: {e}")
+
+
+def uses_heartbeats(task) -> bool:
+    return bool(getattr(task, "heartbeats", False))
+
+
+@asynccontextmanager
+async def keep_alive(interval: float = KEEP_ALIVE_INTERVAL):
+    """
+    Шлёт пульс текущей задачи каждые interval секунд, пока выполняется
+    блок: для одного долгого запроса, между шагами которого heartbeat()
+    не вызвать.
+    """
+    task_id = current_task and current_task.request.id
+
+    async def tick():
+        while True:
+            await asyncio.sleep(interval)
+            heartbeat(task_id)
+
+    ticker = asyncio.create_task(tick())
+    try:
+        yield
+    finally:
+        ticker.cancel()
+
+
+@task_prerun.connect
+def register_task(task_id, task, args=None, kwargs=None, **extra):
+    if not uses_heartbeats(task):
+        return
+    info = {
+        "name": task.name,
+        "args": list(args or ()),
+        "kwargs": kwargs or {},
+        "attempts": getattr(task.request, ATTEMPTS_HEADER, None) or 0,
+        "started_at": time.time(),
+    }
+    # недоступный Redis не должен мешать выполнению самой задачи
+    try:
+        with get_client().pipeline(transaction=False) as pipe:
+            pipe.zadd(HEARTBEATS_KEY, {task_id: info["started_at"]})
+            pipe.hset(RUNNING_KEY, task_id, json.dumps(info, default=str))
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Не удалось зарегистрировать задачу {task_id}: {e}")
+
+
+@task_postrun.connect
+def unregister_task(task_id, task=None, **extra):
+    if task is not None and not uses_heartbeats(task):
+        return
+    try:
+        with get_client().pipeline(transaction=False) as pipe:
+            pipe.zrem(HEARTBEATS_KEY, task_id)
+            pipe.hdel(RUNNING_KEY, task_id)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Не удалось снять задачу {task_id} с учёта: {e}")
+
+
+def claim_stale(threshold: float, limit: int = 100) -> list[tuple[str, dict]]:
+    """
+    Забирает задачи без пульса дольше threshold секунд.
+    Задачу получает тот, чей ZREM её удалил, поэтому несколько
+    экземпляров проверки не перезапустят одну задачу дважды.
+    """
+    client = get_client()
+    task_ids = client.zrangebyscore(
+        HEARTBEATS_KEY, 0, time.time() - threshold, start=0, num=limit
+    )
+    claimed = []
+    for task_id in task_ids:
+        if not client.zrem(HEARTBEATS_KEY, task_id):
+            continue
+        with client.pipeline(transaction=True) as pipe:
+            pipe.hget(RUNNING_KEY, task_id)
+            pipe.hdel(RUNNING_KEY, task_id)
+            info, _ = pipe.execute()
+        if info:
+            claimed.append((task_id.decode(), json.loads(info)))
+    return claimed
@@ -0,0 +1,199 @@
+import logging
+import os
+from uuid import UUID
+
+from sqlalchemy import Integer, cast, func, literal, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.database import PgSingleton
+from app.models.orders import Order
+from app.models.users import PerformerStats, Review, user_review_connector
+from app.services.leaderboard import Leaderboard
+from app.services.orders import COMPLETED_STATUS_ID
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_BATCH_SIZE = int(os.getenv("LEADERBOARD_BATCH_SIZE", 1000))
+
+leaderboard = Leaderboard()
+
+
+def source_totals(user_ids: list | None = None):
+    """
+    Агрегаты исполнителей, посчитанные заново по заказам и отзывам:
+    всех или только переданных.
+    """
+    completed = (
+        select(
+            Order.assign_to.label("user_id"),
+            func.count().label("completed_orders"),
+            literal(0).label("reviews_count"),
+            literal(0).label("score_sum"),
+        )
+        .where(Order.status_id == COMPLETED_STATUS_ID, Order.assign_to.is_not(None))
+        .group_by(Order.assign_to)
+    )
+    reviews = (
+        select(
+            user_review_connector.c.user_id,
+            literal(0),
+            func.count(),
+            func.sum(Review.score),
+        )
+        .join(Review, Review.id == user_review_connector.c.review_id)
+        # отзывы без оценки в рейтинг не входят
+        .where(Review.score.is_not(None))
+        .group_by(user_review_connector.c.user_id)
+    )
+    if user_ids is not None:
+        completed = completed.where(Order.assign_to.in_(user_ids))
+        reviews = reviews.where(user_review_connector.c.user_id.in_(user_ids))
+    totals = union_all(completed, reviews).subquery("totals")
+    return select(
+        totals.c.user_id,
+        cast(func.sum(totals.c.completed_orders), Integer),
+        cast(func.sum(totals.c.reviews_count), Integer),
+        cast(func.sum(totals.c.score_sum), Integer),
+    ).group_by(totals.c.user_id)
+
+
+def lock_stats_query(after_id, limit: int):
+    """
+    Следующая пачка строк performer_stats по курсору user_id. Строки
+    блокируются в порядке user_id до конца транзакции: приращения
+    increment_stats_query ждут её, а пересчёт следующим запросом видит
+    все зафиксированные до блокировки изменения.
+    """
+    query = select(PerformerStats.user_id).order_by(PerformerStats.user_id)
+    if after_id is not None:
+        query = query.where(PerformerStats.user_id > after_id)
+    return query.limit(limit).with_for_update()
+
+
+def reconcile_stats_queries(user_ids: list):
+    """
+    Запросы, переписывающие заблокированные строки performer_stats по
+    источнику: upsert посчитанных агрегатов и обнуление исполнителей
+    без заказов и отзывов.
+    """
+    totals = source_totals(user_ids).subquery("source")
+    upsert = insert(PerformerStats).from_select(
+        ["user_id", "completed_orders", "reviews_count", "score_sum"],
+        select(totals),
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[PerformerStats.user_id],
+        set_={
+            "completed_orders": upsert.excluded.completed_orders,
+            "reviews_count": upsert.excluded.reviews_count,
+            "score_sum": upsert.excluded.score_sum,
+            "updated_at": func.now(),
+        },
+        # строки без расхождений не переписываются
+        where=(PerformerStats.completed_orders != upsert.excluded.completed_orders)
+        | (PerformerStats.reviews_count != upsert.excluded.reviews_count)
+        | (PerformerStats.score_sum != upsert.excluded.score_sum),
+    )
+    reset = (
+        update(PerformerStats)
+        .where(
+            PerformerStats.user_id.in_(user_ids),
+            PerformerStats.user_id.not_in(select(totals.c.user_id)),
+            (PerformerStats.completed_orders != 0)
+            | (PerformerStats.reviews_count != 0),
+        )
+        .values(completed_orders=0, reviews_count=0, score_sum=0)
+    )
+    return upsert, reset
+
+
+def missing_stats_query():
+    """
+    Строки performer_stats для исполнителей с заказами или отзывами, у
+    которых строки нет. Существующие строки не трогаются: если её успело
+    вставить приращение, оно и остаётся.
+    """
+    return (
+        insert(PerformerStats)
+        .from_select(
+            ["user_id", "completed_orders", "reviews_count", "score_sum"],
+            source_totals(),
+        )
+        .on_conflict_do_nothing(index_elements=[PerformerStats.user_id])
+    )
+
+
+async def async_reconcile_stats(batch_size: int = LEADERBOARD_BATCH_SIZE) -> int:
+    """
+    Пересчитывает performer_stats по источнику пачками: каждая пачка
+    строк заблокирована только на время своего пересчёта.
+    Возвращает количество исправленных строк.
+    """
+    fixed = 0
+    cursor = None
+    while True:
+        async with PgSingleton().session as db:
+            user_ids = (
+                (await db.execute(lock_stats_query(cursor, batch_size))).scalars().all()
+            )
+            if not user_ids:
+                break
+            upsert, reset = reconcile_stats_queries(user_ids)
+            fixed += (await db.execute(upsert)).rowcount
+            fixed += (await db.execute(reset)).rowcount
+            await db.commit()
+        heartbeat()
+        cursor = user_ids[-1]
+        if len(user_ids) < batch_size:
+            break
+    async with PgSingleton().session as db:
+        fixed += (await db.execute(missing_stats_query())).rowcount
+        await db.commit()
+    return fixed
+
+
+async def stats_batches(batch_size: int):
+    """performer_stats пачками по курсору user_id."""
+    cursor = None
+    while True:
+        query = select(PerformerStats).order_by(PerformerStats.user_id)
+        if cursor is not None:
+            query = query.where(PerformerStats.user_id > cursor)
+        async with PgSingleton().session as db:
+            rows = (await db.execute(query.limit(batch_size))).scalars().all()
+        if not rows:
+            return
+        yield rows
+        heartbeat()
+        cursor = rows[-1].user_id
+        if len(rows) < batch_size:
+            return
+
+
+async def async_reconcile_leaderboard(
+    batch_size: int = LEADERBOARD_BATCH_SIZE,
+) -> int:
+    """
+    Исправляет расхождения агрегатов: пересчитывает performer_stats
+    по заказам и отзывам, затем пересобирает рейтинги в Redis и заново
+    записывает исполнителей, обновлённых за время пересборки.
+    Возвращает количество исправленных строк performer_stats.
+    """
+    fixed = await async_reconcile_stats(batch_size)
+    touched = await leaderboard.replace(stats_batches(batch_size))
+    for start in range(0, len(touched), batch_size):
+        user_ids = [UUID(member) for member in touched[start : start + batch_size]]
+        query = select(PerformerStats).where(PerformerStats.user_id.in_(user_ids))
+        async with PgSingleton().session as db:
+            rows = (await db.execute(query)).scalars().all()
+        await leaderboard.update(*rows)
+    if fixed:
+        logger.warning(f"Рейтинг исполнителей: исправлено строк {fixed}")
+    return fixed
+
+
+@async_task(heartbeats=True)
+async def reconcile_leaderboard():
+    return await async_reconcile_leaderboard()
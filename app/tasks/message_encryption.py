@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import func, or_, select, update
+
+from app.core.database import PgSingleton, RedisSingleton
+from app.core.security import Security
+from app.models.chat import Message
+from app.services.chat_cache import ChatCache
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+REENCRYPT_CURSOR_KEY = "messages:reencrypt:cursor"
+REENCRYPT_BATCH_SIZE = int(os.getenv("MESSAGE_REENCRYPT_BATCH_SIZE", 500))
+REENCRYPT_MAX_BATCHES = int(os.getenv("MESSAGE_REENCRYPT_MAX_BATCHES", 20))
+REENCRYPT_PAUSE = float(os.getenv("MESSAGE_REENCRYPT_PAUSE", 0.5))
+
+
+async def async_reencrypt_messages(
+    batch_size: int = REENCRYPT_BATCH_SIZE,
+    max_batches: int = REENCRYPT_MAX_BATCHES,
+    pause: float = REENCRYPT_PAUSE,
+) -> int:
+    """
+    Переводит сообщения в актуальный формат и на активный ключ.
+    Идёт по messages.id пачками с паузой между ними, позиция сохраняется
+    в Redis, поэтому каждый запуск продолжает с места предыдущего.
+    Кэш последних сообщений затронутых чатов сбрасывается: в нём
+    остались бы конверты старого ключа, который потом выведут из MESSAGE_KEYS.
+    """
+    cipher = Security().message_cipher
+    chat_cache = ChatCache()
+    redis_client = await RedisSingleton().redis_client
+    last_id = int(await redis_client.get(REENCRYPT_CURSOR_KEY) or 0)
+    migrated = 0
+    async with PgSingleton().session as db:
+        for _ in range(max_batches):
+            result = await db.execute(
+                select(Message.id, Message.chat_id, Message.content, Message.payload)
+                .where(
+                    Message.id > last_id,
+                    or_(
+                        Message.payload.is_(None),
+                        func.get_byte(Message.payload, 1) != cipher.active_key_id,
+                    ),
+                )
+                .order_by(Message.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.all()
+            if not rows:
+                # дошли до конца таблицы - следующая ротация начнёт сначала
+                await redis_client.delete(REENCRYPT_CURSOR_KEY)
+                break
+            values, chat_ids = [], set()
+            for row in rows:
+                ciphertext = row.payload if row.payload is not None else row.content
+                try:
+                    text = cipher.decrypt(ciphertext)
+                except Exception as e:
+                    logger.error(f"Не удалось расшифровать сообщение {row.id}: {e}")
+                    continue
+                values.append(
+                    {"id": row.id, "content": None, "payload": cipher.encrypt(text)}
+                )
+                chat_ids.add(row.chat_id)
+            if values:
+                await db.execute(update(Message), values)
+            await db.commit()
+            if chat_ids:
+                await chat_cache.invalidate(chat_ids)
+            last_id = rows[-1].id
+            migrated += len(values)
+            await redis_client.set(REENCRYPT_CURSOR_KEY, last_id)
+            heartbeat()
+            await asyncio.sleep(pause)
+    logger.info(f"Перешифровано сообщений: {migrated}, курсор: {last_id}")
+    return migrated
+
+
+@async_task(heartbeats=True)
+async def reencrypt_messages():
+    return await async_reencrypt_messages()
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import func, select
+
+from app.core.database import PgSingleton, RedisSingleton
+from app.core.security import Security
+from app.models.chat import Message
+from app.services.search import (
+    SEARCH_ENABLED,
+    search_token_rows,
+    upsert_search_tokens,
+)
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CURSOR_KEY = "messages:search:backfill:cursor"
+BACKFILL_UNTIL_KEY = "messages:search:backfill:until"
+BACKFILL_DONE_KEY = "messages:search:backfill:done"
+BACKFILL_BATCH_SIZE = int(os.getenv("MESSAGE_SEARCH_BACKFILL_BATCH_SIZE", 500))
+BACKFILL_MAX_BATCHES = int(os.getenv("MESSAGE_SEARCH_BACKFILL_MAX_BATCHES", 20))
+BACKFILL_PAUSE = float(os.getenv("MESSAGE_SEARCH_BACKFILL_PAUSE", 0.5))
+# сколько строк индекса вставлять одним INSERT
+INSERT_CHUNK = 5000
+
+
+async def async_backfill_search_index(
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    max_batches: int = BACKFILL_MAX_BATCHES,
+    pause: float = BACKFILL_PAUSE,
+) -> int:
+    """
+    Строит слепой индекс для сообщений, сохранённых до его появления.
+    Идёт по messages.id пачками до максимального ID на момент первого
+    запуска, позиция хранится в Redis: новые сообщения индексирует
+    save_message. Дойдя до конца, ставит отметку, и следующие запуски
+    ничего не делают. Повторная вставка токенов ничего не меняет
+    (ON CONFLICT DO NOTHING).
+    """
+    if not SEARCH_ENABLED:
+        return 0
+    cipher = Security().message_cipher
+    redis_client = await RedisSingleton().redis_client
+    if await redis_client.exists(BACKFILL_DONE_KEY):
+        return 0
+    last_id = int(await redis_client.get(BACKFILL_CURSOR_KEY) or 0)
+    indexed = 0
+    async with PgSingleton().session as db:
+        until_id = await redis_client.get(BACKFILL_UNTIL_KEY)
+        if until_id is None:
+            result = await db.execute(select(func.max(Message.id)))
+            until_id = result.scalar() or 0
+            await redis_client.set(BACKFILL_UNTIL_KEY, until_id)
+        until_id = int(until_id)
+        for _ in range(max_batches):
+            result = await db.execute(
+                select(Message.id, Message.chat_id, Message.content, Message.payload)
+                .where(Message.id > last_id, Message.id <= until_id)
+                .order_by(Message.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                await redis_client.set(BACKFILL_DONE_KEY, 1)
+                logger.info("Индексация сообщений для поиска завершена")
+                break
+            token_rows = []
+            for row in rows:
+                ciphertext = row.payload if row.payload is not None else row.content
+                try:
+                    text = cipher.decrypt(ciphertext)
+                except Exception as e:
+                    logger.error(f"Не удалось расшифровать сообщение {row.id}: {e}")
+                    continue
+                token_rows.extend(search_token_rows(row.chat_id, row.id, text))
+            for start in range(0, len(token_rows), INSERT_CHUNK):
+                await db.execute(
+                    upsert_search_tokens(token_rows[start : start + INSERT_CHUNK])
+                )
+            await db.commit()
+            last_id = rows[-1].id
+            indexed += len(rows)
+            await redis_client.set(BACKFILL_CURSOR_KEY, last_id)
+            heartbeat()
+            await asyncio.sleep(pause)
+    logger.info(f"Проиндексировано сообщений: {indexed}, курсор: {last_id}")
+    return indexed
+
+
+@async_task(heartbeats=True)
+async def backfill_search_index():
+    return await async_backfill_search_index()
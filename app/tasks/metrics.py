@@ -0,0 +1,212 @@
+"""
+Метрики Prometheus для Celery.
+
+Воркер отдаёт метрики выполнения задач на порту CELERY_METRICS_PORT.
+Пул prefork - несколько процессов, поэтому в контейнере воркера задаётся
+PROMETHEUS_MULTIPROC_DIR: процессы пишут значения в файлы каталога,
+а HTTP сервер главного процесса собирает их MultiProcessCollector'ом.
+
+Задача обновления аналитики пишет длительность обновления представлений
+и время последнего успешного обновления - по нему считается
+устаревание: time() - analytics_view_last_refresh_timestamp_seconds.
+
+Beat раз в CELERY_QUEUE_METRICS_INTERVAL секунд замеряет длину очередей
+брокера и отдаёт её на порту CELERY_BEAT_METRICS_PORT - по ней
+масштабируются воркеры.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from celery.signals import (
+    beat_init,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_init,
+    worker_process_shutdown,
+)
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+
+from app.core.celery import celery_app
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", 9808))
+BEAT_METRICS_PORT = int(os.getenv("CELERY_BEAT_METRICS_PORT", 9809))
+QUEUE_METRICS_INTERVAL = float(os.getenv("CELERY_QUEUE_METRICS_INTERVAL", 15))
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Время от публикации (или ETA) задачи до начала выполнения",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+TASK_RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Время выполнения задачи",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+TASK_RETRIES = Counter(
+    "celery_task_retries_total",
+    "Повторные запуски задач через retry()",
+    ["task"],
+)
+TASK_FAILURES = Counter(
+    "celery_task_failures_total",
+    "Задачи, завершившиеся исключением",
+    ["task"],
+)
+TASKS_IN_FLIGHT = Gauge(
+    "celery_tasks_in_flight",
+    "Задачи, выполняемые сейчас",
+    ["task"],
+    multiprocess_mode="livesum",
+)
+ANALYTICS_REFRESH_SECONDS = Histogram(
+    "analytics_view_refresh_seconds",
+    "Время REFRESH MATERIALIZED VIEW CONCURRENTLY",
+    ["view"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+ANALYTICS_REFRESH_FAILURES = Counter(
+    "analytics_view_refresh_failures_total",
+    "Неудачные обновления аналитических представлений",
+    ["view"],
+)
+ANALYTICS_LAST_REFRESH = Gauge(
+    "analytics_view_last_refresh_timestamp_seconds",
+    "Время последнего успешного обновления представления (unix time)",
+    ["view"],
+    multiprocess_mode="max",
+)
+QUEUE_LENGTH = Gauge(
+    "celery_queue_length",
+    "Сообщения, ожидающие в очереди брокера",
+    ["queue"],
+    multiprocess_mode="mostrecent",
+)
+
+# время начала выполняемых задач процесса: task_id -> perf_counter
+_started: dict[str, float] = {}
+
+
+def queue_wait(request) -> float | None:
+    """
+    Ожидание в очереди по заголовку sent_at (ставится при публикации).
+    Для отложенных задач отсчёт идёт от ETA, а не от публикации.
+    """
+    sent_at = getattr(request, "sent_at", None)
+    if sent_at is None:
+        return None
+    ready_at = float(sent_at)
+    eta = getattr(request, "eta", None)
+    if eta:
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        if eta.tzinfo is None:
+            eta = eta.replace(tzinfo=timezone.utc)
+        ready_at = max(ready_at, eta.timestamp())
+    return max(0.0, time.time() - ready_at)
+
+
+@task_prerun.connect
+def on_task_prerun(task_id, task, **kwargs):
+    _started[task_id] = time.perf_counter()
+    TASKS_IN_FLIGHT.labels(task.name).inc()
+    wait = queue_wait(task.request)
+    if wait is not None:
+        TASK_QUEUE_WAIT.labels(task.name).observe(wait)
+
+
+@task_postrun.connect
+def on_task_postrun(task_id, task, **kwargs):
+    TASKS_IN_FLIGHT.labels(task.name).dec()
+    started = _started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name).observe(time.perf_counter() - started)
+
+
+@task_retry.connect
+def on_task_retry(sender=None, **kwargs):
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+@task_failure.connect
+def on_task_failure(sender=None, **kwargs):
+    TASK_FAILURES.labels(sender.name).inc()
+
+
+def serve(port: int):
+    if not port:
+        return
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+    else:
+        start_http_server(port)
+    logger.info(f"Метрики Celery доступны на порту {port}")
+
+
+@worker_init.connect
+def start_worker_metrics(**kwargs):
+    if MULTIPROC_DIR:
+        # файлы прошлого запуска исказили бы счётчики
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        for name in os.listdir(MULTIPROC_DIR):
+            if name.endswith(".db"):
+                os.remove(os.path.join(MULTIPROC_DIR, name))
+    serve(METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_process_dead(pid=None, **kwargs):
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def queue_names() -> list[str]:
+    return sorted({*celery_app.amqp.queues, celery_app.conf.task_default_queue})
+
+
+def collect_queue_lengths():
+    """Длина очередей через passive declare - работает для Redis и AMQP."""
+    with celery_app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for name in queue_names():
+            try:
+                result = channel.queue_declare(name, passive=True)
+                QUEUE_LENGTH.labels(name).set(result.message_count)
+            except connection.channel_errors:
+                # пустой очереди в Redis нет, AMQP при этом закрывает канал
+                QUEUE_LENGTH.labels(name).set(0)
+                channel = connection.channel()
+
+
+def _collect_forever():
+    while True:
+        try:
+            collect_queue_lengths()
+        except Exception as e:
+            logger.error(f"Ошибка сбора длины очередей: {e}")
+        time.sleep(QUEUE_METRICS_INTERVAL)
+
+
+@beat_init.connect
+def start_beat_metrics(**kwargs):
+    serve(BEAT_METRICS_PORT)
+    threading.Thread(target=_collect_forever, name="queue-metrics", daemon=True).start()
@@ -1,45 +1,81 @@
-import asyncio
-from celery import shared_task
+from sqlalchemy import select
+
 from app.core.database import PgSingleton
-from app.models.chat import Chat
 from app.models.users import Users
-from sqlalchemy import select
+from app.services.chat import chat_members_query
+from app.services.email import EmailOutbox
+from app.services.notifications import NotificationBatcher
+from app.services.presence import Presence
+from app.tasks.runtime import async_task
 
+batcher = NotificationBatcher()
+outbox = EmailOutbox()
+presence = Presence()
 
-async def async_send_notification(chat_id: str, message_content: str):
-    async with PgSingleton().session as db:
-        chat = (
-            (await db.execute(select(Chat).where(Chat.id == chat_id))).scalars().first()
-        )
-        if not chat:
-            print(f"Chat {chat_id} not found")
-            return
-
-        customer = (
-            (await db.execute(select(Users).where(Users.id == chat.customer_id)))
-            .scalars()
-            .first()
-        )
-        performer = (
-            (await db.execute(select(Users).where(Users.id == chat.performer_id)))
-            .scalars()
-            .first()
-        )
 
-        if not customer or not performer:
-            print("Customer or performer not found")
-            return
+def digest_text(chat_id: int, count: int) -> str:
+    if count == 1:
+        return f"New message in chat {chat_id}"
+    return f"{count} new messages in chat {chat_id}"
 
-        print(
-            f"Notification to {customer.email}:"
-            f" New message in chat {chat_id}: {message_content}"
-        )
-        print(
-            f"Notification to {performer.email}:"
-            f" New message in chat {chat_id}: {message_content}"
+
+async def async_send_notification(chat_id: int) -> int:
+    """
+    Дайджест новых сообщений чата за окно NotificationBatcher.WINDOW.
+    Каждый участник получает одно уведомление с числом чужих сообщений;
+    пользователи в сети видят сообщения в сокете и пропускаются.
+    Письма ставятся в очередь EmailOutbox. Возвращает количество писем.
+    Если дайджест не удалось поставить в очередь, счётчики возвращаются
+    в окно и не теряются.
+    """
+    counts = await batcher.pop(chat_id)
+    total = sum(counts.values())
+    if not total:
+        return 0
+    try:
+        return await send_digest(chat_id, counts, total)
+    except Exception:
+        if await batcher.restore(chat_id, counts):
+            send_notification.apply_async(args=(chat_id,), countdown=batcher.WINDOW)
+        raise
+
+
+async def send_digest(chat_id: int, counts: dict[str, int], total: int) -> int:
+    async with PgSingleton().session as db:
+        # участники и их адреса одним запросом
+        recipients = (
+            await db.execute(
+                select(Users.id, Users.email).where(
+                    Users.id.in_(chat_members_query(chat_id))
+                )
+            )
+        ).all()
+    pending = {
+        user_id: (email, total - counts.get(str(user_id), 0))
+        for user_id, email in recipients
+    }
+    states = await presence.get_many(
+        user_id for user_id, (_, count) in pending.items() if count
+    )
+    emails = []
+    for user_id, state in states.items():
+        email, count = pending[user_id]
+        if state["online"] or not email:
+            continue
+        emails.append(
+            {
+                "to": email,
+                "template": "chat_digest",
+                "context": {"chat": chat_id, "text": digest_text(chat_id, count)},
+            }
         )
+    await outbox.add(emails)
+    return len(emails)
 
 
-@shared_task
-def send_notification(chat_id: str, message_content: str):
-    asyncio.run(async_send_notification(chat_id, message_content))
+@async_task()
+async def send_notification(chat_id: int, message_content: str | None = None):
+    # message_content - аргумент прежней версии задачи: такие задачи могут
+    # ещё лежать в брокере после выкладки. Не используется, удалить
+    # в следующем релизе.
+    return await async_send_notification(chat_id)
@@ -0,0 +1,95 @@
+import logging
+import os
+
+from sqlalchemy import and_, func, literal, select, union_all
+
+from app.core.database import PgSingleton
+from app.models.orders import Order, UserOrderCounter
+from app.services.orders import ASSIGNED_ROLE, CREATED_ROLE, counters_upsert_query
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+ORDER_COUNTERS_BATCH_SIZE = int(os.getenv("ORDER_COUNTERS_BATCH_SIZE", 1000))
+
+
+def counter_drift_query():
+    """
+    Расхождения счётчиков дашборда с таблицей заказов: строки
+    (user_id, role, status_id, drift), где drift - сколько не хватает
+    в user_order_counters.count.
+    """
+    created = select(
+        Order.created_by.label("user_id"),
+        literal(CREATED_ROLE).label("role"),
+        Order.status_id,
+        func.count().label("count"),
+    ).group_by(Order.created_by, Order.status_id)
+    assigned = (
+        select(Order.assign_to, literal(ASSIGNED_ROLE), Order.status_id, func.count())
+        .where(Order.assign_to.is_not(None))
+        .group_by(Order.assign_to, Order.status_id)
+    )
+    source = union_all(created, assigned).subquery("source")
+    counters = UserOrderCounter.__table__
+    expected = func.coalesce(source.c.count, 0)
+    actual = func.coalesce(counters.c.count, 0)
+    return (
+        select(
+            func.coalesce(source.c.user_id, counters.c.user_id).label("user_id"),
+            func.coalesce(source.c.role, counters.c.role).label("role"),
+            func.coalesce(source.c.status_id, counters.c.status_id).label("status_id"),
+            (expected - actual).label("drift"),
+        )
+        .select_from(
+            source.join(
+                counters,
+                and_(
+                    counters.c.user_id == source.c.user_id,
+                    counters.c.role == source.c.role,
+                    counters.c.status_id == source.c.status_id,
+                ),
+                full=True,
+            )
+        )
+        .where(expected != actual)
+    )
+
+
+async def async_rebuild_order_counters(
+    batch_size: int = ORDER_COUNTERS_BATCH_SIZE,
+) -> int:
+    """
+    Исправляет user_order_counters: для заполнения после выкладки и
+    исправления расхождений. Без блокировки таблицы:
+
+    - расхождения читаются из одного снимка REPEATABLE READ, в котором
+      заказы и счётчики согласованы - они меняются в одной транзакции;
+    - к счётчикам прибавляется разница пачками тем же upsert, что и при
+      изменении заказа, поэтому изменения, зафиксированные после снимка,
+      не затираются, а строки блокируются только на время пачки.
+
+    Возвращает количество исправленных строк счётчиков.
+    """
+    fixed = 0
+    async with PgSingleton().session as snapshot:
+        await snapshot.connection(
+            execution_options={"isolation_level": "REPEATABLE READ"}
+        )
+        result = await snapshot.stream(counter_drift_query())
+        async for rows in result.partitions(batch_size):
+            deltas = {(row.user_id, row.role, row.status_id): row.drift for row in rows}
+            async with PgSingleton().session as db:
+                await db.execute(counters_upsert_query(deltas))
+                await db.commit()
+            fixed += len(deltas)
+            heartbeat()
+    if fixed:
+        logger.warning(f"Счётчики заказов: исправлено строк {fixed}")
+    return fixed
+
+
+@async_task(heartbeats=True)
+async def rebuild_order_counters():
+    return await async_rebuild_order_counters()
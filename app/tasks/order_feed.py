@@ -0,0 +1,86 @@
+import logging
+import os
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.core.database import PgSingleton
+from app.models.orders import Order, OrderSkill
+from app.services.email import EmailOutbox
+from app.services.orders import is_open, matching_performers_query
+from app.tasks.heartbeats import heartbeat
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = int(os.getenv("ORDER_FANOUT_BATCH_SIZE", 500))
+
+outbox = EmailOutbox()
+
+
+async def async_notify_matching_performers(
+    order_id: str, batch_size: int = FANOUT_BATCH_SIZE
+) -> int:
+    """
+    Рассылает исполнителям с навыками заказа письмо о новом заказе.
+    Исполнители читаются пачками по курсору ID, каждая пачка - одна
+    вставка в EmailOutbox. Заказ, который уже назначен или закрыт,
+    не рассылается. Возвращает количество писем.
+    """
+    order_id = UUID(order_id)
+    async with PgSingleton().session as db:
+        order = (
+            await db.execute(
+                select(
+                    Order.name, Order.created_by, Order.status_id, Order.assign_to
+                ).where(Order.id == order_id)
+            )
+        ).one_or_none()
+        if order is None or not is_open(order.status_id, order.assign_to):
+            return 0
+        skill_ids = (
+            (
+                await db.execute(
+                    select(OrderSkill.skill_id).where(OrderSkill.order_id == order_id)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        if not skill_ids:
+            return 0
+        cursor = None
+        sent = 0
+        while True:
+            performers = (
+                await db.execute(
+                    matching_performers_query(
+                        skill_ids, order.created_by, cursor, batch_size
+                    )
+                )
+            ).all()
+            if not performers:
+                break
+            await outbox.add(
+                [
+                    {
+                        "to": email,
+                        "template": "order_matched",
+                        "context": {"name": order.name, "order": str(order_id)},
+                    }
+                    for _, email in performers
+                    if email
+                ]
+            )
+            cursor = performers[-1].id
+            sent += len(performers)
+            heartbeat()
+            if len(performers) < batch_size:
+                break
+    logger.info(f"Заказ {order_id}: уведомлено исполнителей {sent}")
+    return sent
+
+
+@async_task(heartbeats=True)
+async def notify_matching_performers(order_id: str):
+    return await async_notify_matching_performers(order_id)
@@ -0,0 +1,173 @@
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from app.core.database import PgSingleton, RedisSingleton
+from app.models.outbox import OutboxEvent
+from app.services.email import EmailOutbox
+from app.services.notifications import NotificationBatcher
+from app.services.orders import is_open
+from app.services.outbox import (
+    MESSAGE_CREATED,
+    ORDER_CREATED,
+    ORDER_DEADLINE_APPROACHING,
+    claim,
+    done_key,
+    pending_events_query,
+    publish_to_streams,
+)
+from app.tasks.heartbeats import heartbeat
+from app.tasks.notifications import send_notification
+from app.tasks.order_feed import notify_matching_performers
+from app.tasks.runtime import async_task
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 500))
+OUTBOX_MAX_BATCHES = int(os.getenv("OUTBOX_MAX_BATCHES", 20))
+# после стольких неудачных попыток событие откладывается в dead letter
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+# задержка перед повтором, сек.; удваивается с каждой попыткой
+OUTBOX_RETRY_DELAY = int(os.getenv("OUTBOX_RETRY_DELAY", 10))
+
+batcher = NotificationBatcher()
+email_outbox = EmailOutbox()
+
+
+async def schedule_chat_digest(payload: dict):
+    """Учитывает сообщение в окне дайджеста и ставит задачу на первое."""
+    if await batcher.add(payload["chat_id"], payload["sender_id"]):
+        send_notification.apply_async(
+            args=(payload["chat_id"],), countdown=batcher.WINDOW
+        )
+
+
+async def queue_deadline_reminder(payload: dict):
+    """Одно письмо пользователю со всеми заказами пачки."""
+    orders = payload["orders"]
+    lines = "\n".join(
+        f"- {order['name']}: {order['deadline'][:16].replace('T', ' ')} UTC"
+        for order in orders
+    )
+    await email_outbox.add(
+        [
+            {
+                "to": payload["email"],
+                "template": "order_deadlines",
+                "context": {"count": len(orders), "orders": lines},
+            }
+        ]
+    )
+
+
+async def schedule_skill_fanout(payload: dict):
+    """Рассылка исполнителям с навыками заказа - отдельной задачей."""
+    if payload.get("skills") and is_open(payload["status_id"], payload["assign_to"]):
+        notify_matching_performers.delay(payload["order_id"])
+
+
+# обработчики событий помимо публикации в Redis Streams
+HANDLERS = {
+    MESSAGE_CREATED: [schedule_chat_digest],
+    ORDER_CREATED: [schedule_skill_fanout],
+    ORDER_DEADLINE_APPROACHING: [queue_deadline_reminder],
+}
+
+
+async def run_handlers(event: OutboxEvent):
+    """
+    Выполняет обработчики события. Каждый отмечается по id события перед
+    запуском, поэтому при повторной доставке выполненные не повторяются;
+    при ошибке отметка снимается и обработчик будет вызван снова.
+    """
+    client = await RedisSingleton().redis_client
+    for handler in HANDLERS.get(event.topic, ()):
+        key = done_key(event.id, handler.__name__)
+        if not (await claim(client, [key]))[0]:
+            continue
+        try:
+            await handler(event.payload)
+        except Exception:
+            await client.delete(key)
+            raise
+
+
+async def publish(events: list[OutboxEvent]) -> dict[int, str]:
+    """
+    Публикует пачку в Redis Streams и выполняет обработчики. Ошибка
+    обработчика не мешает остальным событиям пачки: возвращаются ошибки
+    по id события. Ошибка Redis Streams пробрасывается - пачка останется
+    в outbox целиком.
+    """
+    await publish_to_streams(events)
+    failed = {}
+    for event in events:
+        try:
+            await run_handlers(event)
+        except Exception as error:
+            logger.exception(f"Ошибка обработки события outbox {event.id}")
+            failed[event.id] = repr(error)
+    return failed
+
+
+def postpone(event: OutboxEvent, error: str):
+    """Откладывает упавшее событие или переводит его в dead letter."""
+    event.attempts += 1
+    event.last_error = error
+    if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+        event.dead_at = datetime.utcnow()
+        logger.error(
+            f"Событие outbox {event.id} ({event.topic}) не доставлено "
+            f"за {event.attempts} попыток: {error}"
+        )
+    else:
+        delay = OUTBOX_RETRY_DELAY * 2 ** (event.attempts - 1)
+        event.retry_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+async def async_relay_outbox(
+    batch_size: int = OUTBOX_BATCH_SIZE, max_batches: int = OUTBOX_MAX_BATCHES
+) -> int:
+    """
+    Публикует события outbox пачками. Пачка блокируется FOR UPDATE
+    SKIP LOCKED; доставленные события удаляются, упавшие откладываются
+    (postpone) в той же транзакции. При падении до коммита пачка будет
+    доставлена повторно: шаги, выполненные в первый раз, пропускаются
+    по отметкам outbox:done:{id}:{шаг}.
+    """
+    relayed = 0
+    last_id = None
+    for _ in range(max_batches):
+        async with PgSingleton().session as db:
+            events = (
+                (await db.execute(pending_events_query(batch_size, last_id)))
+                .scalars()
+                .all()
+            )
+            if not events:
+                break
+            failed = await publish(events)
+            delivered = [event.id for event in events if event.id not in failed]
+            if delivered:
+                await db.execute(
+                    delete(OutboxEvent).where(OutboxEvent.id.in_(delivered))
+                )
+            for event in events:
+                if event.id in failed:
+                    postpone(event, failed[event.id])
+            await db.commit()
+        relayed += len(delivered)
+        last_id = events[-1].id
+        heartbeat()
+        if len(events) < batch_size:
+            break
+    if relayed:
+        logger.info(f"Опубликовано событий outbox: {relayed}")
+    return relayed
+
+
+@async_task(heartbeats=True)
+async def relay_outbox():
+    return await async_relay_outbox()
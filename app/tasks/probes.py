@@ -0,0 +1,20 @@
+"""
+Задачи-зонды для app.scripts.bench_celery_queues.
+probe_latency - лёгкая задача, возвращает задержку от публикации
+до выполнения; probe_load - имитация тяжёлой пакетной задачи.
+"""
+
+import time
+
+from app.core.celery import celery_app
+
+
+@celery_app.task
+def probe_latency(sent_at: float) -> float:
+    return time.time() - sent_at
+
+
+@celery_app.task
+def probe_load(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
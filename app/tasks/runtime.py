@@ -0,0 +1,92 @@
+"""
+Асинхронные задачи Celery.
+
+asyncio.run на каждую задачу создаёт новый event loop, а соединения asyncpg
+и redis.asyncio привязаны к loop, в котором открыты: пул движка
+PgSingleton переживал loop и ломался на следующей задаче. Здесь у каждого
+процесса воркера один долгоживущий loop, движок и клиент Redis создаются
+в процессе лениво и закрываются при его остановке.
+
+    @async_task()
+    async def send_notification(chat_id: int, message_content: str):
+        async with PgSingleton().session as db:
+            ...
+"""
+
+import asyncio
+import functools
+import logging
+
+from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+
+from app.core.database import PgSingleton, RedisSingleton
+
+logger = logging.getLogger(__name__)
+
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Event loop текущего процесса, создаётся при первом обращении."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def run(coro):
+    """Выполняет корутину в loop процесса и возвращает её результат."""
+    return get_loop().run_until_complete(coro)
+
+
+async def _close_connections():
+    await RedisSingleton().close_redis()
+    await PgSingleton().close_connections()
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """
+    Дочерний процесс prefork наследует объекты родителя:
+    забываем их, соединения откроются заново уже в loop этого процесса.
+    """
+    global _loop
+    PgSingleton().reset()
+    RedisSingleton().reset()
+    _loop = None
+    get_loop()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        _loop.run_until_complete(_close_connections())
+        _loop.run_until_complete(_loop.shutdown_asyncgens())
+    except Exception as e:
+        logger.error(f"Ошибка при закрытии соединений воркера: {e}")
+    finally:
+        _loop.close()
+        _loop = None
+
+
+def async_task(*task_args, **task_kwargs):
+    """
+    Регистрирует корутину как задачу Celery (shared_task с теми же
+    параметрами). Имя задачи - имя модуля и функции, как у обычной задачи.
+    С bind=True первым аргументом корутина получает задачу.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return run(func(*args, **kwargs))
+
+        return shared_task(*task_args, **task_kwargs)(wrapper)
+
+    return decorator
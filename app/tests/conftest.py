@@ -1,7 +1,8 @@
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import delete, select
-from app.core.database import PgSingleton
+from app.core.database import PgSingleton, RedisSingleton
 from app.main import app
 from app.models.files import Files
 from app.models.orders import Order
@@ -15,6 +16,88 @@ def client():
         yield client
 
 
+@pytest.fixture
+def redis_client(monkeypatch):
+    """
+    Подменяет клиент RedisSingleton на fakeredis для тестов сервисов.
+    """
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(RedisSingleton(), "_redis_client", client)
+    return client
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.rowcount = len(self.rows)
+
+    def all(self):
+        return self.rows
+
+    def scalars(self):
+        return self
+
+    def scalar(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar_one_or_none(self):
+        return self.scalar()
+
+
+class FakeSession:
+    """
+    Сессия БД без базы: запоминает выполненные запросы и отдаёт
+    заранее заданные результаты по очереди (пустой, когда они кончились).
+    Запросы, содержащие строку из failing, падают.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.executed = []
+        self.added = []
+        self.failing = set()
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, *args):
+        sql = str(statement)
+        if any(part in sql for part in self.failing):
+            raise RuntimeError("query failed")
+        self.executed.append(sql)
+        return FakeResult(self.results.pop(0) if self.results else [])
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+@pytest.fixture
+def db_session():
+    return FakeSession()
+
+
+@pytest.fixture
+def fake_pg(db_session):
+    """Замена PgSingleton, все сессии которой - db_session."""
+
+    class FakePg:
+        @property
+        def session(self):
+            return db_session
+
+    return FakePg
+
+
 async def delete_user(username):
     """
     Удаление данных, оставшихся при тестировании эндпоинтов.
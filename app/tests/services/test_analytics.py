@@ -0,0 +1,116 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import ProgrammingError
+
+from app.api.analytics import AnalyticsApi
+
+from app.services.analytics import (
+    ORDERS_DAILY,
+    SIGNUPS_DAILY,
+    AnalyticsCache,
+    create_view_statements,
+    orders_report_query,
+)
+from app.tasks import analytics
+
+
+def refresh_failures(view: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "analytics_view_refresh_failures_total", {"view": view}
+        )
+        or 0
+    )
+
+
+@pytest.fixture
+def cache(redis_client):
+    return AnalyticsCache()
+
+
+def test_views_are_created_idempotently_with_unique_keys():
+    statements = [str(statement) for statement in create_view_statements()]
+
+    assert statements[0].startswith(
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {ORDERS_DAILY}"
+    )
+    assert (
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{ORDERS_DAILY} "
+        f"ON {ORDERS_DAILY} (day, status_id)"
+    ) in statements
+    assert (
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{SIGNUPS_DAILY} ON {SIGNUPS_DAILY} (day)"
+    ) in statements
+
+
+def test_reports_read_views_not_tables():
+    sql = str(
+        orders_report_query(date(2025, 1, 1), date(2025, 1, 31)).compile(
+            dialect=postgresql.dialect()
+        )
+    )
+
+    assert f"FROM {ORDERS_DAILY}" in sql
+    assert "FROM orders" not in sql
+
+
+@pytest.mark.asyncio
+async def test_refresh_invalidates_cached_reports(cache):
+    key = await cache.key("orders", "2025-01-01:2025-01-31")
+    await cache.set(key, {"orders": 1})
+    assert await cache.get(key) == {"orders": 1}
+
+    moment = datetime(2025, 2, 1, 12, 0)
+    await cache.invalidate({ORDERS_DAILY: moment})
+
+    new_key = await cache.key("orders", "2025-01-01:2025-01-31")
+    assert new_key != key
+    assert await cache.get(new_key) is None
+    assert await cache.refreshed_at(ORDERS_DAILY) == moment
+    assert await cache.refreshed_at(SIGNUPS_DAILY) is None
+
+
+@pytest.mark.asyncio
+async def test_views_refresh_concurrently_and_independently(
+    cache, db_session, fake_pg, monkeypatch
+):
+    monkeypatch.setattr(analytics, "PgSingleton", fake_pg)
+    monkeypatch.setattr(analytics, "cache", cache)
+    db_session.failing.add(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {ORDERS_DAILY}")
+    failures = refresh_failures(ORDERS_DAILY)
+
+    refreshed = await analytics.async_refresh_analytics_views()
+
+    assert list(refreshed) == [SIGNUPS_DAILY]
+    assert (
+        f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SIGNUPS_DAILY}" in db_session.executed
+    )
+    assert refresh_failures(ORDERS_DAILY) == failures + 1
+    assert await cache.refreshed_at(SIGNUPS_DAILY) == refreshed[SIGNUPS_DAILY]
+
+
+@pytest.mark.asyncio
+async def test_report_is_empty_until_views_exist(
+    redis_client, db_session, fake_pg, monkeypatch
+):
+    async def missing_view(statement, *args):
+        raise ProgrammingError(str(statement), {}, Exception("UndefinedTable"))
+
+    monkeypatch.setattr(AnalyticsApi, "db_connection", fake_pg())
+    monkeypatch.setattr(db_session, "execute", missing_view)
+    api = AnalyticsApi()
+
+    report = await api.get_orders_analytics(
+        date(2025, 1, 1),
+        date(2025, 1, 31),
+        current_user=SimpleNamespace(is_superuser=True),
+    )
+
+    assert report.refreshed_at is None
+    assert report.orders == 0 and report.rows == []
+    # пустой ответ не кэшируется: после создания представлений придут данные
+    assert await redis_client.keys("analytics:*") == []
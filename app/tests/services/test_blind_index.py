@@ -0,0 +1,45 @@
+import os
+from types import SimpleNamespace
+import pytest
+from app.api.base import BaseApi
+from app.core.encryption import BlindIndex
+from app.tasks import message_search
+
+
+def test_normalize():
+    words = BlindIndex.normalize("Ёлка, ЁЛКА и ｆｕｌｌwidth! a x_y 42")
+    assert words == ["елка", "fullwidth", "x_y", "42"]
+
+
+def test_tokens_are_per_chat_and_keyed():
+    index = BlindIndex(os.urandom(32))
+    assert index.tokens(1, "привет мир") == index.tokens(1, "Мир, привет!")[::-1]
+    assert index.tokens(1, "привет") != index.tokens(2, "привет")
+    assert index.tokens(1, "привет") != BlindIndex(os.urandom(32)).tokens(1, "привет")
+    assert len(index.hash(1, "привет")) == BlindIndex.HASH_SIZE
+
+
+def test_token_limit():
+    text = " ".join(f"w{i}" for i in range(1000))
+    assert len(BlindIndex.normalize(text)) == BlindIndex.MAX_TOKENS
+
+
+@pytest.mark.asyncio
+async def test_backfill_stops_at_max_message_id_of_first_run(
+    redis_client, db_session, fake_pg, monkeypatch
+):
+    monkeypatch.setattr(message_search, "PgSingleton", fake_pg)
+    payload = BaseApi.security.message_cipher.encrypt("старое сообщение")
+    row = SimpleNamespace(id=5, chat_id=1, content=None, payload=payload)
+    # max(messages.id), пачка, вставка токенов, пустая пачка
+    db_session.results = [[5], [row], [], []]
+
+    indexed = await message_search.async_backfill_search_index(pause=0)
+
+    assert indexed == 1
+    assert "messages.id <= " in db_session.executed[1]
+    assert await redis_client.get(message_search.BACKFILL_DONE_KEY) == b"1"
+
+    executed = len(db_session.executed)
+    assert await message_search.async_backfill_search_index(pause=0) == 0
+    assert len(db_session.executed) == executed
@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.celery import celery_app
+from app.tasks import metrics
+
+
+@celery_app.task
+def metrics_ok():
+    return 1
+
+
+@celery_app.task
+def metrics_fail():
+    raise RuntimeError("boom")
+
+
+def sample(name: str, task) -> float:
+    return REGISTRY.get_sample_value(name, {"task": task.name}) or 0
+
+
+def test_runtime_and_failures_are_recorded():
+    runs = sample("celery_task_runtime_seconds_count", metrics_ok)
+    failures = sample("celery_task_failures_total", metrics_fail)
+
+    metrics_ok.apply()
+    with pytest.raises(RuntimeError):
+        metrics_fail.apply().get()
+
+    assert sample("celery_task_runtime_seconds_count", metrics_ok) == runs + 1
+    assert sample("celery_task_failures_total", metrics_fail) == failures + 1
+    assert sample("celery_tasks_in_flight", metrics_ok) == 0
+
+
+class Request:
+    def __init__(self, sent_at=None, eta=None):
+        self.sent_at = sent_at
+        self.eta = eta
+
+
+def test_queue_wait_counts_from_eta_for_delayed_tasks():
+    now = time.time()
+    eta = datetime.fromtimestamp(now - 2, tz=timezone.utc).isoformat()
+
+    assert metrics.queue_wait(Request()) is None
+    assert metrics.queue_wait(Request(sent_at=now - 5)) == pytest.approx(5, abs=0.5)
+    assert metrics.queue_wait(Request(sent_at=now - 60, eta=eta)) == pytest.approx(
+        2, abs=0.5
+    )
+    future = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert metrics.queue_wait(Request(sent_at=now, eta=future)) == 0
@@ -0,0 +1,36 @@
+import pytest
+
+from app.core.celery import PRIORITY_HIGH, PRIORITY_LOW, celery_app
+
+
+def route(name: str) -> dict:
+    return celery_app.amqp.router.route({}, name)
+
+
+@pytest.mark.parametrize(
+    "task, queue",
+    [
+        ("app.tasks.notifications.send_notification", "notifications"),
+        ("app.tasks.email_tasks.dispatch_emails", "email"),
+        ("app.tasks.celery_period_tasks.restart_stuck_tasks", "maintenance"),
+        ("app.tasks.leaderboard.reconcile_leaderboard", "maintenance"),
+        ("app.tasks.order_counters.rebuild_order_counters", "maintenance"),
+        ("app.tasks.message_encryption.reencrypt_messages", "bulk"),
+        ("app.tasks.message_search.backfill_search_index", "bulk"),
+        ("app.tasks.chat_inbox.backfill_last_message", "bulk"),
+        ("app.tasks.analytics.refresh_analytics_views", "bulk"),
+        ("app.tasks.order_feed.notify_matching_performers", "bulk"),
+        ("app.tasks.default_tasks.celery_task", "default"),
+    ],
+)
+def test_task_families_have_own_queues(task, queue):
+    assert route(task)["queue"].name == queue
+
+
+def test_routes_carry_priorities():
+    assert route("app.tasks.notifications.send_notification")["priority"] == (
+        PRIORITY_HIGH
+    )
+    assert route("app.tasks.message_search.backfill_search_index")["priority"] == (
+        PRIORITY_LOW
+    )
@@ -0,0 +1,37 @@
+import asyncio
+
+from app.core.celery import celery_app
+from app.tasks import runtime
+from app.tasks.runtime import async_task
+
+
+@async_task()
+async def current_loop_id():
+    await asyncio.sleep(0)
+    return id(asyncio.get_running_loop())
+
+
+@async_task(bind=True)
+async def task_name(self, suffix: str):
+    return f"{self.name}:{suffix}"
+
+
+def test_tasks_share_process_loop():
+    first = current_loop_id.apply().get()
+    second = current_loop_id.apply().get()
+
+    assert first == second == id(runtime.get_loop())
+
+
+def test_task_keeps_name_and_binding():
+    assert current_loop_id.name == f"{__name__}.current_loop_id"
+    assert current_loop_id.name in celery_app.tasks
+    assert task_name.apply(args=("x",)).get() == f"{__name__}.task_name:x"
+
+
+def test_shutdown_closes_loop_and_next_task_opens_new_one():
+    loop = runtime.get_loop()
+    runtime.shutdown_worker_process()
+
+    assert loop.is_closed()
+    assert current_loop_id.apply().get() != id(loop)
@@ -0,0 +1,19 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.chat import ChatApi
+
+
+@pytest.mark.asyncio
+async def test_chat_with_oneself_is_rejected():
+    user_id = uuid.uuid4()
+
+    with pytest.raises(HTTPException) as error:
+        await ChatApi().create_chat(
+            user_id, user_id, current_user=SimpleNamespace(id=user_id)
+        )
+
+    assert error.value.status_code == 400
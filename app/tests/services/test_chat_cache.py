@@ -0,0 +1,173 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.models.chat import Message
+from app.services.chat_cache import ChatCache
+
+CHAT_ID = 1
+ALICE, BOB, MALLORY = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+def message(message_id: int) -> Message:
+    return Message(
+        id=message_id,
+        chat_id=CHAT_ID,
+        sender_id=ALICE,
+        payload=b"cipher",
+        created_at=datetime(2025, 1, 1),
+    )
+
+
+@pytest.fixture
+def cache(redis_client):
+    ChatCache._local_members.clear()
+    return ChatCache()
+
+
+async def warm(cache, db_session, messages):
+    # участники, затем сообщения от новых к старым
+    db_session.results = [[ALICE, BOB], messages]
+    await cache.warm(db_session, CHAT_ID)
+
+
+@pytest.mark.asyncio
+async def test_empty_chat_is_cached(cache, db_session):
+    await warm(cache, db_session, [])
+
+    assert await cache.get_recent(CHAT_ID, ALICE, 50) == []
+    assert await cache.get_after(CHAT_ID, 0) == []
+
+    await cache.push(message(1))
+
+    assert [item["id"] for item in await cache.get_recent(CHAT_ID, BOB, 50)] == [1]
+    assert [item["id"] for item in await cache.get_after(CHAT_ID, 0)] == [1]
+
+
+@pytest.mark.asyncio
+async def test_cold_cache_and_strangers_fall_back_to_db(cache, db_session):
+    assert await cache.get_recent(CHAT_ID, ALICE, 50) is None
+
+    await warm(cache, db_session, [message(2), message(1)])
+
+    assert await cache.get_recent(CHAT_ID, MALLORY, 50) is None
+    assert await cache.get_recent(CHAT_ID, ALICE, cache.SIZE + 1) is None
+
+
+@pytest.mark.asyncio
+async def test_pushes_are_kept_newest_first_and_trimmed(cache, db_session, monkeypatch):
+    monkeypatch.setattr(ChatCache, "SIZE", 3)
+    await warm(cache, db_session, [message(1)])
+
+    for message_id in (2, 3, 4):
+        await cache.push(message(message_id))
+
+    recent = await cache.get_recent(CHAT_ID, ALICE, 3)
+    assert [item["id"] for item in recent] == [4, 3, 2]
+    # маркер начала вытеснен: интервал до сообщения 2 кэш не покрывает
+    assert await cache.get_after(CHAT_ID, 0) is None
+    assert [item["id"] for item in await cache.get_after(CHAT_ID, 2)] == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_push_does_not_create_cold_list(cache, redis_client):
+    await cache.push(message(1))
+
+    assert not await redis_client.exists(cache.recent_key(CHAT_ID))
+    assert await redis_client.get(cache.version_key(CHAT_ID)) == b"1"
+
+
+@pytest.mark.asyncio
+async def test_warm_is_cancelled_when_chat_changes_meanwhile(
+    cache, db_session, redis_client
+):
+    class RacingSession:
+        # сообщение приходит, пока прогрев читает историю из БД
+        async def execute(self, query):
+            await cache.push(message(2))
+            return await db_session.execute(query)
+
+    db_session.results = [[ALICE, BOB], [message(1)]]
+    await cache.warm(RacingSession(), CHAT_ID)
+
+    assert not await redis_client.exists(cache.recent_key(CHAT_ID))
+    assert await cache.get_recent(CHAT_ID, ALICE, 50) is None
+
+
+@pytest.mark.asyncio
+async def test_members_are_loaded_once_and_reloaded_after_change(
+    cache, db_session, redis_client
+):
+    db_session.results = [[ALICE, BOB]]
+    assert await cache.get_members(db_session, CHAT_ID) == {ALICE, BOB}
+    ChatCache._local_members.clear()
+    assert await cache.get_members(db_session, CHAT_ID) == {ALICE, BOB}
+    assert len(db_session.executed) == 1
+
+    await cache.invalidate_members(CHAT_ID)
+    db_session.results = [[ALICE]]
+
+    assert not await cache.is_member(db_session, CHAT_ID, BOB)
+    assert len(db_session.executed) == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_members_are_not_cached_after_concurrent_removal(
+    cache, db_session, redis_client
+):
+    class RacingSession:
+        # участника удаляют, пока состав читается из БД
+        async def execute(self, query):
+            result = await db_session.execute(query)
+            await cache.invalidate_members(CHAT_ID)
+            return result
+
+    db_session.results = [[ALICE, BOB]]
+    assert await cache.get_members(RacingSession(), CHAT_ID) == {ALICE, BOB}
+
+    assert not await redis_client.exists(cache.members_key(CHAT_ID))
+
+
+@pytest.mark.asyncio
+async def test_local_members_are_bounded_and_expired(cache, db_session, monkeypatch):
+    monkeypatch.setattr(ChatCache, "MEMBERS_LOCAL_SIZE", 2)
+    for chat_id in (1, 2, 3):
+        cache._local_put(chat_id, {ALICE})
+
+    assert list(ChatCache._local_members) == [2, 3]
+
+    monkeypatch.setattr(ChatCache, "MEMBERS_LOCAL_TTL", -1)
+    cache._local_put(4, {BOB})
+
+    assert cache._local_get(4) is None
+    assert 4 not in ChatCache._local_members
+
+
+@pytest.mark.asyncio
+async def test_new_messages_do_not_abort_members_store(cache, db_session, redis_client):
+    class BusySession:
+        # в активный чат пишут, пока состав читается из БД
+        async def execute(self, query):
+            result = await db_session.execute(query)
+            await cache.push(message(1))
+            return result
+
+    db_session.results = [[ALICE, BOB]]
+    await cache.get_members(BusySession(), CHAT_ID)
+
+    assert await redis_client.scard(cache.members_key(CHAT_ID)) == 2
+
+
+@pytest.mark.asyncio
+async def test_send_check_sees_removal_from_other_process(cache, db_session):
+    db_session.results = [[ALICE, BOB]]
+    assert await cache.is_member(db_session, CHAT_ID, BOB)
+
+    # другой процесс удалил BOB: его копия в памяти этого процесса не сброшена
+    await ChatCache().invalidate_members(CHAT_ID)
+    cache._local_put(CHAT_ID, {ALICE, BOB})
+    db_session.results = [[ALICE]]
+
+    assert await cache.is_member(db_session, CHAT_ID, BOB)
+    assert not await cache.is_member(db_session, CHAT_ID, BOB, local=False)
@@ -0,0 +1,278 @@
+import json
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.base import BaseApi
+from app.models.chat import Message
+from app.services.chat_cache import ChatCache
+from app.services.delivery import DeliveryQueue, UnreadCounters
+from app.tests.services.test_websocket_manager import FakeWebSocket, add_connection
+from app.utils.websocket.chat import services, websocket_router
+from app.utils.websocket.protocol import CODECS, dumps, envelope
+from app.utils.websocket.websocket_manager import ConnectionManager
+
+CHAT_ID = 7
+ALICE, BOB, CAROL = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+class FakeChatCache:
+    def __init__(self, members):
+        self.members = set(members)
+
+    async def get_members(self, db, chat_id, local=True):
+        return set(self.members)
+
+
+@pytest.fixture
+def chat(redis_client, fake_pg, monkeypatch):
+    """Роутер чата с участниками ALICE, BOB и CAROL без БД."""
+    manager = ConnectionManager()
+    saved = []
+
+    async def save_message(db, chat_id, sender_id, content):
+        saved.append(content)
+        return SimpleNamespace(id=len(saved))
+
+    monkeypatch.setattr(websocket_router, "PgSingleton", fake_pg)
+    monkeypatch.setattr(websocket_router, "manager", manager)
+    monkeypatch.setattr(websocket_router, "save_message", save_message)
+    monkeypatch.setattr(
+        websocket_router, "chat_cache", FakeChatCache({ALICE, BOB, CAROL})
+    )
+    return manager
+
+
+def json_client() -> FakeWebSocket:
+    websocket = FakeWebSocket()
+    websocket.query_params = {"format": "json"}
+    return websocket
+
+
+def json_connection(manager, user_id, chat_id) -> FakeWebSocket:
+    websocket = add_connection(manager, user_id, chat_id=chat_id)
+    manager.codecs[websocket] = CODECS["json"]
+    return websocket
+
+
+def message_item(text: str) -> dict:
+    return {"type": "message", "payload": {"message": text}, "cmid": "c1"}
+
+
+def stored(message_id: int) -> Message:
+    # ID из отдельного диапазона: расшифровки кэшируются по ID сообщения
+    return Message(
+        id=message_id,
+        chat_id=CHAT_ID,
+        sender_id=BOB,
+        payload=BaseApi.security.message_cipher.encrypt(f"text {message_id}"),
+        created_at=datetime(2025, 1, 1),
+    )
+
+
+@pytest.fixture
+def history(redis_client, db_session):
+    """Кэш чата с сообщениями 9001..9003."""
+
+    async def warm():
+        ChatCache._local_members.clear()
+        db_session.results = [[ALICE, BOB], [stored(9003), stored(9002), stored(9001)]]
+        await services.chat_cache.warm(db_session, CHAT_ID)
+        db_session.executed.clear()
+
+    return warm
+
+
+@pytest.mark.asyncio
+async def test_queue_is_drained_in_order_and_emptied(redis_client):
+    queue = DeliveryQueue()
+    for index in range(3):
+        await queue.enqueue(ALICE, f"m{index}")
+    delivered = []
+
+    async def send(batch):
+        delivered.extend(batch)
+
+    await queue.drain(ALICE, send)
+
+    assert delivered == ["m0", "m1", "m2"]
+    assert await redis_client.xlen(queue.key(ALICE)) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_send_keeps_batch_queued(redis_client):
+    queue = DeliveryQueue()
+    await queue.enqueue_many([ALICE, BOB], "hello")
+
+    async def send(batch):
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        await queue.drain(ALICE, send)
+
+    assert await redis_client.xlen(queue.key(ALICE)) == 1
+    assert await redis_client.xlen(queue.key(BOB)) == 1
+
+
+@pytest.mark.asyncio
+async def test_unread_counters_increment_and_reset(redis_client):
+    counters = UnreadCounters()
+    await counters.increment(CHAT_ID, [ALICE, BOB])
+    await counters.increment(CHAT_ID, [ALICE])
+    await counters.increment(CHAT_ID + 1, [ALICE])
+
+    await counters.reset(ALICE, CHAT_ID + 1)
+
+    assert await counters.get_all(ALICE) == {CHAT_ID: 2}
+    assert await counters.get_all(BOB) == {CHAT_ID: 1}
+
+
+@pytest.mark.asyncio
+async def test_first_connection_receives_queued_envelopes(redis_client):
+    manager = ConnectionManager()
+    queued = [envelope("message", CHAT_ID, {"message_id": 1})]
+    await manager.delivery_queue.enqueue(ALICE, dumps(queued))
+    await manager.delivery_queue.enqueue(ALICE, "legacy text")
+    websocket = json_client()
+
+    assert await manager.connect(websocket, ALICE, CHAT_ID)
+
+    assert websocket.sent[0] == "legacy text"
+    assert json.loads(websocket.sent[1])["payload"] == {"message_id": 1}
+    assert manager.chats[websocket] == CHAT_ID
+
+
+@pytest.mark.asyncio
+async def test_message_is_counted_unread_only_for_members_not_viewing(
+    chat, redis_client
+):
+    viewer = json_connection(chat, BOB, CHAT_ID)
+    elsewhere = json_connection(chat, CAROL, CHAT_ID + 1)
+    sender = json_connection(chat, ALICE, CHAT_ID)
+
+    await websocket_router.handle_message(
+        message_item("hi"), CHAT_ID, SimpleNamespace(id=ALICE, username="alice")
+    )
+
+    counters = UnreadCounters()
+    assert await counters.get_all(BOB) == {}
+    assert await counters.get_all(CAROL) == {CHAT_ID: 1}
+    assert await counters.get_all(ALICE) == {}
+    for websocket in (viewer, elsewhere, sender):
+        assert json.loads(websocket.sent[0])["payload"]["message"] == "hi"
+
+
+@pytest.mark.asyncio
+async def test_offline_member_gets_message_queued(chat, redis_client):
+    json_connection(chat, ALICE, CHAT_ID)
+
+    await websocket_router.handle_message(
+        message_item("hi"), CHAT_ID, SimpleNamespace(id=ALICE, username="alice")
+    )
+
+    for member in (BOB, CAROL):
+        [(_, fields)] = await redis_client.xrange(DeliveryQueue.key(member))
+        [queued] = json.loads(fields[b"data"])
+        assert queued["type"] == "message"
+        assert queued["payload"]["message_id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_missed_messages_are_replayed_from_cache(history, db_session):
+    await history()
+
+    missed, truncated = await services.get_missed_messages(
+        db_session, CHAT_ID, ALICE, 9001
+    )
+
+    assert [item["message_id"] for item in missed] == [9002, 9003]
+    assert missed[0]["message"] == "text 9002"
+    assert not truncated
+    assert db_session.executed == []
+
+
+@pytest.mark.asyncio
+async def test_replay_falls_back_to_db_and_reports_truncation(
+    redis_client, db_session, monkeypatch
+):
+    monkeypatch.setattr(services, "REPLAY_LIMIT", 1)
+    db_session.results = [[stored(9012), stored(9013)]]
+
+    missed, truncated = await services.get_missed_messages(
+        db_session, CHAT_ID, ALICE, 9011
+    )
+
+    assert [item["message_id"] for item in missed] == [9012]
+    assert truncated
+    assert "FROM messages" in db_session.executed[0]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_delivers_missed_message_once(
+    chat, history, db_session, redis_client
+):
+    await history()
+    queued = [
+        envelope("message", CHAT_ID, {"message_id": 9003}),
+        envelope("message", CHAT_ID + 1, {"message_id": 1}),
+        envelope("presence", CHAT_ID, {"presence": {}}),
+    ]
+    await chat.delivery_queue.enqueue(ALICE, dumps(queued))
+    websocket = json_client()
+
+    assert await chat.connect(websocket, ALICE, CHAT_ID, replaying=True)
+    await websocket_router.replay_missed(websocket, db_session, CHAT_ID, ALICE, 9002)
+
+    frames = [json.loads(frame) for frame in websocket.sent]
+    sent = [
+        item
+        for frame in frames
+        for item in (frame if isinstance(frame, list) else [frame])
+    ]
+    assert [
+        (item["type"], item["chat"], item["payload"].get("message_id")) for item in sent
+    ] == [
+        ("message", CHAT_ID + 1, 1),
+        ("presence", CHAT_ID, None),
+        ("message", CHAT_ID, 9003),
+    ]
+    assert await redis_client.xlen(DeliveryQueue.key(ALICE)) == 0
+
+
+@pytest.mark.asyncio
+async def test_removed_member_cannot_post(chat, redis_client, monkeypatch):
+    monkeypatch.setattr(websocket_router, "chat_cache", FakeChatCache({ALICE, BOB}))
+    member = json_connection(chat, ALICE, CHAT_ID)
+
+    accepted = await websocket_router.handle_message(
+        message_item("still here?"),
+        CHAT_ID,
+        SimpleNamespace(id=CAROL, username="carol"),
+    )
+
+    assert not accepted
+    assert member.sent == []
+    assert await UnreadCounters().get_all(ALICE) == {}
+    assert not await redis_client.exists(DeliveryQueue.key(BOB))
+
+
+@pytest.mark.asyncio
+async def test_group_message_reaches_every_connection_of_every_member(
+    chat, redis_client
+):
+    sockets = [
+        json_connection(chat, ALICE, CHAT_ID),
+        json_connection(chat, BOB, CHAT_ID),
+        json_connection(chat, BOB, CHAT_ID + 1),
+    ]
+
+    assert await websocket_router.handle_message(
+        message_item("hi all"), CHAT_ID, SimpleNamespace(id=ALICE, username="alice")
+    )
+
+    for websocket in sockets:
+        [frame] = websocket.sent
+        assert json.loads(frame)["cmid"] == "c1"
+    assert await redis_client.xlen(DeliveryQueue.key(CAROL)) == 1
@@ -0,0 +1,61 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.chat import inbox_query, last_message_backfill_query
+from app.tasks import chat_inbox
+
+USER = uuid.uuid4()
+
+
+def compile_sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_inbox_is_union_of_index_ordered_branches():
+    sql = compile_sql(inbox_query(USER, limit=20))
+
+    assert sql.count("UNION ALL") == 2
+    assert "WHERE chats.customer_id = " in sql
+    assert "WHERE chats.performer_id = " in sql
+    assert "WHERE chat_participants.user_id = " in sql
+    # каждая ветка и итог упорядочены по индексу и ограничены
+    assert sql.count("ORDER BY chats.last_message_at DESC, chats.id DESC") == 4
+    assert sql.count("LIMIT") == 4
+    assert " OR " not in sql
+
+
+def test_inbox_cursor_applies_to_every_branch():
+    sql = compile_sql(inbox_query(USER, datetime(2025, 1, 1), 42, limit=20))
+
+    assert sql.count("(chats.last_message_at, chats.id) < ") == 3
+
+
+def test_backfill_skips_chats_with_fresh_last_message():
+    sql = compile_sql(last_message_backfill_query(0, 1000))
+
+    assert "chats.last_message_id IS NULL" in sql
+    assert "WHERE messages.chat_id = chats.id ORDER BY messages.created_at DESC" in sql
+    assert "coalesce((SELECT messages.created_at" in sql
+
+
+@pytest.mark.asyncio
+async def test_backfill_stops_at_max_chat_id_of_first_run(
+    redis_client, db_session, fake_pg, monkeypatch
+):
+    monkeypatch.setattr(chat_inbox, "PgSingleton", fake_pg)
+    # max(chats.id), затем обновлённые строки каждой пачки
+    db_session.results = [[250], [1] * 100, [1] * 100, [1] * 50]
+
+    updated = await chat_inbox.async_backfill_last_message(
+        batch_size=100, max_batches=10, pause=0
+    )
+
+    assert updated == 250
+    assert len(db_session.executed) == 4
+    assert await redis_client.get(chat_inbox.BACKFILL_DONE_KEY) == b"1"
+
+    assert await chat_inbox.async_backfill_last_message() == 0
+    assert len(db_session.executed) == 4
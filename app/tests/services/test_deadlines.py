@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.tasks import outbox
+from app.tasks.deadlines import due_orders_query, group_by_user
+
+CUSTOMER, PERFORMER = uuid.uuid4(), uuid.uuid4()
+
+
+def test_due_orders_query_is_keyset_batch_matching_partial_index():
+    query = due_orders_query(
+        datetime(2025, 1, 1),
+        datetime(2025, 1, 2),
+        (datetime(2025, 1, 1), uuid.uuid4()),
+        500,
+    )
+    sql = str(
+        query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True}
+        )
+    )
+
+    assert "orders.status_id != 3" in sql
+    assert "(orders.deadline, orders.id) >" in sql
+    assert "ORDER BY orders.deadline, orders.id" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert sql.startswith("UPDATE orders SET deadline_reminder_sent_at")
+
+
+def test_orders_are_grouped_per_recipient():
+    rows = [
+        SimpleNamespace(id=1, created_by=CUSTOMER, assign_to=PERFORMER),
+        SimpleNamespace(id=2, created_by=CUSTOMER, assign_to=None),
+        SimpleNamespace(id=3, created_by=PERFORMER, assign_to=PERFORMER),
+    ]
+
+    grouped = group_by_user(rows)
+
+    assert [row.id for row in grouped[CUSTOMER]] == [1, 2]
+    assert [row.id for row in grouped[PERFORMER]] == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_reminder_event_becomes_one_email(monkeypatch):
+    queued = []
+
+    class FakeOutbox:
+        async def add(self, items):
+            queued.extend(items)
+
+    monkeypatch.setattr(outbox, "email_outbox", FakeOutbox())
+
+    await outbox.queue_deadline_reminder(
+        {
+            "email": "user@example.com",
+            "orders": [
+                {"id": "a", "name": "Logo", "deadline": "2025-01-01T10:30:00"},
+                {"id": "b", "name": "Site", "deadline": "2025-01-01T18:00:00.5"},
+            ],
+        }
+    )
+
+    assert queued == [
+        {
+            "to": "user@example.com",
+            "template": "order_deadlines",
+            "context": {
+                "count": 2,
+                "orders": "- Logo: 2025-01-01 10:30 UTC\n- Site: 2025-01-01 18:00 UTC",
+            },
+        }
+    ]
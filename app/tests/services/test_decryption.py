@@ -0,0 +1,37 @@
+import pytest
+from app.api.base import BaseApi
+from app.services.chat import DECRYPT_ERROR
+from app.services.decryption import MessageDecryptor
+
+
+def encrypt(text: str) -> str:
+    return BaseApi.security.cipher.encrypt(text.encode()).decode()
+
+
+@pytest.mark.asyncio
+async def test_decrypt_many_keeps_order():
+    decryptor = MessageDecryptor()
+    decryptor.POOL_THRESHOLD = 4
+    messages = [(i, encrypt(f"message {i}")) for i in range(10)]
+    texts = await decryptor.decrypt_many(messages)
+    assert texts == [f"message {i}" for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_decrypt_many_uses_cache():
+    decryptor = MessageDecryptor()
+    await decryptor.decrypt_many([(1, encrypt("cached"))])
+    # повторный запрос не трогает шифротекст
+    texts = await decryptor.decrypt_many([(1, "broken token")])
+    assert texts == ["cached"]
+
+
+@pytest.mark.asyncio
+async def test_decrypt_many_lru_and_errors():
+    decryptor = MessageDecryptor()
+    decryptor.CACHE_SIZE = 2
+    await decryptor.decrypt_many([(i, encrypt(str(i))) for i in range(3)])
+    assert list(decryptor._cache) == [1, 2]
+    texts = await decryptor.decrypt_many([(5, "broken token")])
+    assert texts == [DECRYPT_ERROR]
+    assert 5 not in decryptor._cache
@@ -0,0 +1,153 @@
+import smtplib
+import socket
+from email import message_from_bytes
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.services import email
+from app.services.email import EmailOutbox, EmailSender, SmtpPool, is_permanent
+from app.tasks import email_tasks
+
+
+class Sink:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("blocked@"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, message_from_bytes(envelope.content)))
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    sink = Sink()
+    controller = Controller(sink, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield sink, controller.hostname, controller.port
+    controller.stop()
+
+
+def digest(to: str, count: int = 5) -> dict:
+    text = f"{count} new messages in chat 7"
+    return {"to": to, "template": "chat_digest", "context": {"text": text}}
+
+
+@pytest.mark.asyncio
+async def test_batch_reuses_connections_and_renders_once(smtp_sink, monkeypatch):
+    sink, host, port = smtp_sink
+    renders = []
+    render = email.render
+    monkeypatch.setattr(
+        email, "render", lambda *args: renders.append(args) or render(*args)
+    )
+    pool = SmtpPool(host, port, size=2)
+    sender = EmailSender(pool)
+
+    items = [digest(f"user{i}@example.com") for i in range(10)]
+    assert await sender.send_batch(items) == [None] * 10
+    assert await sender.send_batch([digest("late@example.com", 1)]) == [None]
+    pool.close()
+
+    assert pool.connects == 2
+    assert len(renders) == 2
+    assert len(sink.messages) == 11
+    rcpt_tos, message = sink.messages[0]
+    assert message["To"] == rcpt_tos[0]
+    assert message["Subject"] == "5 new messages in chat 7"
+    assert len({message["Message-ID"] for _, message in sink.messages}) == 11
+
+
+@pytest.mark.asyncio
+async def test_refused_recipient_is_permanent_and_keeps_connection(smtp_sink):
+    sink, host, port = smtp_sink
+    pool = SmtpPool(host, port, size=1)
+    sender = EmailSender(pool)
+
+    errors = await sender.send_batch(
+        [digest("blocked@example.com"), digest("ok@example.com")]
+    )
+    pool.close()
+
+    assert isinstance(errors[0], smtplib.SMTPRecipientsRefused)
+    assert is_permanent(errors[0])
+    assert errors[1] is None
+    assert pool.connects == 1
+    assert [rcpt_tos for rcpt_tos, _ in sink.messages] == [["ok@example.com"]]
+
+
+@pytest.mark.asyncio
+async def test_unknown_template_fails_without_sending(smtp_sink):
+    sink, host, port = smtp_sink
+    sender = EmailSender(SmtpPool(host, port))
+
+    [error] = await sender.send_batch(
+        [{"to": "a@example.com", "template": "missing", "context": {}}]
+    )
+
+    assert is_permanent(error)
+    assert sink.messages == []
+
+
+def test_transient_errors_are_retried():
+    assert not is_permanent(smtplib.SMTPServerDisconnected())
+    assert not is_permanent(smtplib.SMTPResponseException(421, b"try later"))
+    assert is_permanent(smtplib.SMTPResponseException(554, b"rejected"))
+
+
+@pytest.fixture
+def outbox(redis_client, monkeypatch):
+    monkeypatch.setattr(email.celery_app, "send_task", lambda *args, **kwargs: None)
+    queue = EmailOutbox()
+    monkeypatch.setattr(email_tasks, "outbox", queue)
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_popped_emails_survive_until_ack(outbox, redis_client):
+    await outbox.add([digest("a@example.com"), digest("a@example.com")])
+
+    items = await outbox.pop(10)
+
+    # одинаковые письма различаются по id и не склеиваются
+    assert len({item["id"] for item in items}) == 2
+    assert await redis_client.llen(outbox.KEY) == 0
+    assert await redis_client.hlen(outbox.PROCESSING_KEY) == 2
+    assert await outbox.requeue_due() == 0
+
+    await outbox.ack(items[:1])
+
+    # воркер упал, не обработав второе письмо, и его срок истёк
+    await redis_client.zadd(outbox.DEADLINES_KEY, {items[1]["id"]: 0})
+    assert await outbox.requeue_due() == 1
+    assert [item["id"] for item in await outbox.pop(10)] == [items[1]["id"]]
+
+
+@pytest.mark.asyncio
+async def test_batch_stays_in_processing_when_worker_dies(
+    outbox, redis_client, monkeypatch
+):
+    class DyingSender:
+        async def send_batch(self, items):
+            raise RuntimeError("worker killed")
+
+    monkeypatch.setattr(email_tasks, "sender", DyingSender())
+    await outbox.add([digest("a@example.com")])
+
+    with pytest.raises(RuntimeError):
+        await email_tasks.async_dispatch_emails()
+
+    assert await redis_client.hlen(outbox.PROCESSING_KEY) == 1
+    assert await redis_client.zcard(outbox.DEADLINES_KEY) == 1
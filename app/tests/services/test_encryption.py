@@ -0,0 +1,76 @@
+import os
+from types import SimpleNamespace
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from app.core.encryption import MessageCipher
+from app.services.chat_cache import ChatCache
+from app.tasks import message_encryption
+
+
+@pytest.fixture
+def legacy_key():
+    return Fernet.generate_key()
+
+
+def test_roundtrip(legacy_key):
+    cipher = MessageCipher({1: os.urandom(32)}, legacy_key)
+    payload = cipher.encrypt("привет")
+    assert payload[:2] == bytes((MessageCipher.VERSION, 1))
+    assert cipher.decrypt(payload) == "привет"
+    assert not cipher.needs_rotation(payload)
+
+
+def test_reads_legacy_fernet(legacy_key):
+    cipher = MessageCipher({1: MessageCipher.derive_key(legacy_key)}, legacy_key)
+    token = Fernet(legacy_key).encrypt(b"old message").decode()
+    assert cipher.decrypt(token) == "old message"
+    assert cipher.needs_rotation(token)
+
+
+def test_key_rotation(legacy_key):
+    old_key, new_key = os.urandom(32), os.urandom(32)
+    old_cipher = MessageCipher({1: old_key}, legacy_key)
+    payload = old_cipher.encrypt("rotate me")
+    cipher = MessageCipher({2: new_key, 1: old_key}, legacy_key)
+    assert cipher.needs_rotation(payload)
+    assert cipher.decrypt(payload) == "rotate me"
+    assert not cipher.needs_rotation(cipher.encrypt("rotate me"))
+
+
+def test_tampered_payload(legacy_key):
+    cipher = MessageCipher({1: os.urandom(32), 2: os.urandom(32)}, legacy_key)
+    payload = bytearray(cipher.encrypt("secret"))
+    payload[-1] ^= 1
+    with pytest.raises(InvalidTag):
+        cipher.decrypt(bytes(payload))
+
+
+def test_key_id_must_fit_into_one_byte(legacy_key):
+    with pytest.raises(ValueError):
+        MessageCipher({256: os.urandom(32)}, legacy_key)
+
+
+@pytest.mark.asyncio
+async def test_reencryption_drops_cached_messages_of_migrated_chats(
+    redis_client, db_session, fake_pg, monkeypatch
+):
+    cache = ChatCache()
+    for chat_id in (1, 2, 3):
+        await redis_client.rpush(cache.recent_key(chat_id), "cached")
+    old = Fernet(os.environ["ENCRYPTION_KEY"]).encrypt(b"old").decode()
+    db_session.results = [
+        [
+            SimpleNamespace(id=1, chat_id=1, content=old, payload=None),
+            SimpleNamespace(id=2, chat_id=2, content=old, payload=None),
+        ],
+        [],
+    ]
+    monkeypatch.setattr(message_encryption, "PgSingleton", fake_pg)
+
+    migrated = await message_encryption.async_reencrypt_messages(pause=0)
+
+    assert migrated == 2
+    assert not await redis_client.exists(cache.recent_key(1), cache.recent_key(2))
+    assert await redis_client.exists(cache.recent_key(3))
+    assert await redis_client.get(cache.version_key(1)) == b"1"
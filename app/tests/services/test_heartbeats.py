@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from app.tasks import heartbeats
+from app.tasks.analytics import refresh_analytics_views
+from app.tasks.email_tasks import dispatch_emails
+from app.tasks.notifications import send_notification
+from app.tasks.outbox import relay_outbox
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.__dict__.update(headers)
+
+
+class FakeTask:
+    name = "app.tasks.example.work"
+    heartbeats = True
+
+    def __init__(self, **headers):
+        self.request = FakeRequest(**headers)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(heartbeats, "_client", client)
+    return client
+
+
+def test_finished_task_is_unregistered(client):
+    heartbeats.register_task("t1", FakeTask(), args=(1,), kwargs={"a": 2})
+    assert client.zscore(heartbeats.HEARTBEATS_KEY, "t1") is not None
+
+    heartbeats.unregister_task("t1")
+
+    assert client.zcard(heartbeats.HEARTBEATS_KEY) == 0
+    assert client.hlen(heartbeats.RUNNING_KEY) == 0
+
+
+def test_claim_returns_only_tasks_without_recent_heartbeat(client):
+    heartbeats.register_task("old", FakeTask(stuck_attempts=1), args=(1,))
+    heartbeats.register_task("alive", FakeTask())
+    client.zadd(heartbeats.HEARTBEATS_KEY, {"old": time.time() - 700})
+    client.zadd(heartbeats.HEARTBEATS_KEY, {"alive": time.time() - 700})
+    heartbeats.heartbeat("alive")
+
+    claimed = heartbeats.claim_stale(600)
+
+    assert [(task_id, info["attempts"]) for task_id, info in claimed] == [("old", 1)]
+    assert claimed[0][1]["args"] == [1]
+    assert heartbeats.claim_stale(600) == []
+    assert client.zrange(heartbeats.HEARTBEATS_KEY, 0, -1) == [b"alive"]
+
+
+def test_heartbeat_does_not_revive_claimed_task(client):
+    heartbeats.register_task("t1", FakeTask())
+    client.zadd(heartbeats.HEARTBEATS_KEY, {"t1": 0})
+    heartbeats.claim_stale(600)
+
+    heartbeats.heartbeat("t1")
+
+    assert client.zcard(heartbeats.HEARTBEATS_KEY) == 0
+
+
+def test_tasks_without_heartbeats_are_not_tracked(client):
+    task = FakeTask()
+    task.heartbeats = False
+
+    heartbeats.register_task("t1", task)
+
+    assert client.zcard(heartbeats.HEARTBEATS_KEY) == 0
+    assert heartbeats.claim_stale(0) == []
+
+
+def test_tasks_calling_heartbeat_opt_in():
+    assert heartbeats.uses_heartbeats(relay_outbox)
+    assert heartbeats.uses_heartbeats(dispatch_emails)
+    assert heartbeats.uses_heartbeats(refresh_analytics_views)
+    assert not heartbeats.uses_heartbeats(send_notification)
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_beats_while_block_runs(monkeypatch):
+    beats = []
+    monkeypatch.setattr(heartbeats, "heartbeat", beats.append)
+
+    async with heartbeats.keep_alive(0.01):
+        # долгий запрос, между шагами которого heartbeat() не вызвать
+        await asyncio.sleep(0.05)
+    count = len(beats)
+    await asyncio.sleep(0.03)
+
+    assert count >= 2
+    assert len(beats) == count
@@ -0,0 +1,164 @@
+import uuid
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.users import PerformerStats
+from app.services.leaderboard import Leaderboard, increment_stats_query
+from app.services.orders import completed_by
+from app.tasks import leaderboard as leaderboard_task
+from app.tasks.leaderboard import (
+    lock_stats_query,
+    missing_stats_query,
+    reconcile_stats_queries,
+)
+
+ALICE, BOB, CAROL = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+def stats(user_id, completed=0, reviews=0, score=0) -> PerformerStats:
+    return PerformerStats(
+        user_id=user_id,
+        completed_orders=completed,
+        reviews_count=reviews,
+        score_sum=score,
+    )
+
+
+async def batches(*pages):
+    for page in pages:
+        yield page
+
+
+@pytest.fixture
+def leaderboard(redis_client):
+    return Leaderboard()
+
+
+def test_increment_is_single_upsert_returning_totals():
+    sql = str(
+        increment_stats_query(ALICE, reviews_count=1, score_sum=5).compile(
+            dialect=postgresql.dialect()
+        )
+    )
+
+    assert "ON CONFLICT (user_id) DO UPDATE SET" in sql
+    assert (
+        "reviews_count = (performer_stats.reviews_count + excluded.reviews_count)"
+        in sql
+    )
+    assert "RETURNING performer_stats.user_id" in sql
+
+
+def test_reconcile_only_rewrites_drifted_rows():
+    upsert, reset = reconcile_stats_queries([ALICE, BOB])
+    upsert_sql = str(upsert.compile(dialect=postgresql.dialect()))
+    reset_sql = str(reset.compile(dialect=postgresql.dialect()))
+
+    assert "performer_stats.score_sum != excluded.score_sum" in upsert_sql
+    assert "orders.assign_to IN" in upsert_sql
+    assert "reviews.score IS NOT NULL" in upsert_sql
+    assert "performer_stats.user_id IN" in reset_sql
+    assert "performer_stats.user_id NOT IN" in reset_sql
+
+
+def test_reconcile_locks_batches_in_user_order():
+    sql = str(lock_stats_query(ALICE, 100).compile(dialect=postgresql.dialect()))
+
+    assert "performer_stats.user_id >" in sql
+    assert "ORDER BY performer_stats.user_id" in sql
+    assert sql.endswith("FOR UPDATE")
+
+
+def test_missing_rows_do_not_overwrite_concurrent_inserts():
+    sql = str(missing_stats_query().compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("INSERT INTO performer_stats")
+    assert sql.endswith("ON CONFLICT (user_id) DO NOTHING")
+
+
+def test_completed_order_is_credited_to_assignee():
+    assert completed_by(3, ALICE) == ALICE
+    assert completed_by(2, ALICE) is None
+    assert completed_by(3, None) is None
+
+
+@pytest.mark.asyncio
+async def test_pages_and_profile_are_read_from_sorted_sets(leaderboard):
+    await leaderboard.update(stats(ALICE, completed=3, reviews=2, score=9))
+    await leaderboard.update(stats(BOB, completed=5, reviews=1, score=3))
+    await leaderboard.update(stats(CAROL, completed=1))
+
+    assert await leaderboard.page("rating", 0, 10) == [
+        (str(ALICE), 4.5),
+        (str(BOB), 3.0),
+    ]
+    assert [user for user, _ in await leaderboard.page("completed", 1, 2)] == [
+        str(ALICE),
+        str(CAROL),
+    ]
+    assert await leaderboard.profile(CAROL) == {
+        "completed_orders": 1,
+        "reviews_count": 0,
+        "rating": None,
+        "completed_rank": 3,
+        "rating_rank": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_update_writes_absolute_values(leaderboard):
+    await leaderboard.update(stats(ALICE, completed=2))
+    await leaderboard.update(stats(ALICE, completed=2))
+    await leaderboard.update(stats(BOB, completed=1))
+    await leaderboard.update(stats(BOB))
+
+    assert await leaderboard.page("completed", 0, 10) == [(str(ALICE), 2.0)]
+
+
+@pytest.mark.asyncio
+async def test_replace_swaps_in_rebuilt_boards(leaderboard):
+    await leaderboard.update(stats(ALICE, completed=7, reviews=1, score=1))
+
+    await leaderboard.replace(
+        batches([stats(BOB, completed=2)], [stats(CAROL, reviews=1, score=5)])
+    )
+
+    assert await leaderboard.page("completed", 0, 10) == [(str(BOB), 2.0)]
+    assert await leaderboard.page("rating", 0, 10) == [(str(CAROL), 5.0)]
+
+
+@pytest.mark.asyncio
+async def test_replace_with_no_stats_clears_boards(leaderboard):
+    await leaderboard.update(stats(ALICE, completed=7))
+
+    await leaderboard.replace(batches())
+
+    assert await leaderboard.page("completed", 0, 10) == []
+
+
+@pytest.mark.asyncio
+async def test_reconcile_rewrites_performers_updated_during_rebuild(
+    leaderboard, db_session, fake_pg, monkeypatch
+):
+    async def rebuilt(batch_size):
+        yield [stats(ALICE, completed=1), stats(BOB, completed=4)]
+        # исполнитель получил заказ после чтения своей пачки
+        await leaderboard.update(stats(ALICE, completed=2))
+        await leaderboard.update(stats(ALICE, completed=3))
+
+    monkeypatch.setattr(leaderboard_task, "PgSingleton", fake_pg)
+    monkeypatch.setattr(leaderboard_task, "leaderboard", leaderboard)
+    monkeypatch.setattr(leaderboard_task, "stats_batches", rebuilt)
+    # пачек для пересчёта нет, недостающих строк нет, затем перечитывание
+    db_session.results = [[], [], [stats(ALICE, completed=3)]]
+
+    assert await leaderboard_task.async_reconcile_leaderboard() == 0
+
+    assert "performer_stats.user_id IN" in db_session.executed[-1]
+    assert await leaderboard.page("completed", 0, 10) == [
+        (str(BOB), 4.0),
+        (str(ALICE), 3.0),
+    ]
+    # следующая пересборка начинает учёт заново
+    assert await leaderboard.replace(batches()) == []
@@ -0,0 +1,41 @@
+import uuid
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.chat import messages_page_query
+
+USER = uuid.uuid4()
+
+
+def compile_sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_first_page_is_newest_first_without_offset():
+    sql = compile_sql(messages_page_query(1, USER, limit=50))
+
+    assert "ORDER BY messages.created_at DESC, messages.id DESC" in sql
+    assert "LIMIT" in sql
+    assert "OFFSET" not in sql
+
+
+def test_before_cursor_reads_older_messages_by_row_comparison():
+    sql = compile_sql(messages_page_query(1, USER, before_id=100))
+
+    assert "(messages.created_at, messages.id) < ((SELECT messages.created_at" in sql
+    assert "ORDER BY messages.created_at DESC, messages.id DESC" in sql
+
+
+def test_after_cursor_reads_newer_messages_in_chronological_order():
+    sql = compile_sql(messages_page_query(1, USER, after_id=100))
+
+    assert "(messages.created_at, messages.id) > ((SELECT messages.created_at" in sql
+    assert "ORDER BY messages.created_at, messages.id" in sql
+    assert "DESC" not in sql
+
+
+def test_access_check_is_embedded_into_page_query():
+    sql = compile_sql(messages_page_query(1, USER))
+
+    assert "EXISTS (SELECT chat_participants.chat_id" in sql
+    assert "chats.customer_id = " in sql
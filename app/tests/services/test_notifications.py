@@ -0,0 +1,132 @@
+import uuid
+
+import pytest
+
+from app.services.notifications import NotificationBatcher
+from app.tasks import notifications
+
+ALICE, BOB, CAROL = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+RECIPIENTS = [(ALICE, "alice@example.com"), (BOB, "bob@example.com"), (CAROL, "c@x")]
+
+
+class FakeOutbox:
+    def __init__(self, failing=False):
+        self.items = []
+        self.failing = failing
+
+    async def add(self, items):
+        if self.failing:
+            raise ConnectionError("outbox unavailable")
+        self.items.extend(items)
+
+
+class FakePresence:
+    def __init__(self, online):
+        self.online = online
+
+    async def get_many(self, user_ids):
+        return {user_id: {"online": user_id in self.online} for user_id in user_ids}
+
+
+@pytest.fixture
+def digest(redis_client, db_session, fake_pg, monkeypatch):
+    async def setup(counts, online=(), failing=False):
+        outbox = FakeOutbox(failing)
+        batcher = NotificationBatcher()
+        for sender, count in counts.items():
+            for _ in range(count):
+                await batcher.add(7, sender)
+        db_session.results = [RECIPIENTS]
+        monkeypatch.setattr(notifications, "PgSingleton", fake_pg)
+        monkeypatch.setattr(notifications, "batcher", batcher)
+        monkeypatch.setattr(notifications, "presence", FakePresence(set(online)))
+        monkeypatch.setattr(notifications, "outbox", outbox)
+        return outbox
+
+    return setup
+
+
+@pytest.mark.asyncio
+async def test_digest_counts_foreign_messages_and_skips_online(digest, db_session):
+    outbox = await digest({ALICE: 25, BOB: 5}, online=[CAROL])
+
+    assert await notifications.async_send_notification(7) == 2
+    assert len(db_session.executed) == 1
+    assert sorted((item["to"], item["context"]["text"]) for item in outbox.items) == [
+        ("alice@example.com", "5 new messages in chat 7"),
+        ("bob@example.com", "25 new messages in chat 7"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_digest_without_pending_messages_skips_database(digest, db_session):
+    await digest({})
+
+    assert await notifications.async_send_notification(7) == 0
+    assert db_session.executed == []
+
+
+@pytest.mark.asyncio
+async def test_failed_digest_is_returned_to_window_and_rescheduled(
+    digest, redis_client, monkeypatch
+):
+    await digest({ALICE: 2}, failing=True)
+    scheduled = []
+    monkeypatch.setattr(
+        notifications.send_notification,
+        "apply_async",
+        lambda **kwargs: scheduled.append(kwargs),
+    )
+
+    with pytest.raises(ConnectionError):
+        await notifications.async_send_notification(7)
+
+    assert await redis_client.hgetall(NotificationBatcher.key(7)) == {
+        str(ALICE).encode(): b"2"
+    }
+    assert scheduled == [{"args": (7,), "countdown": NotificationBatcher.WINDOW}]
+
+
+@pytest.mark.asyncio
+async def test_failed_digest_joins_already_open_window(
+    digest, redis_client, monkeypatch
+):
+    await digest({ALICE: 2}, failing=True)
+    scheduled = []
+    monkeypatch.setattr(
+        notifications.send_notification,
+        "apply_async",
+        lambda **kwargs: scheduled.append(kwargs),
+    )
+    batcher = notifications.batcher
+
+    async def pop_and_receive(chat_id):
+        counts = await NotificationBatcher.pop(batcher, chat_id)
+        # пока дайджест собирается, в чат пишут снова - окно уже открыто
+        await batcher.add(chat_id, BOB)
+        return counts
+
+    monkeypatch.setattr(batcher, "pop", pop_and_receive)
+
+    with pytest.raises(ConnectionError):
+        await notifications.async_send_notification(7)
+
+    assert await redis_client.hgetall(NotificationBatcher.key(7)) == {
+        str(ALICE).encode(): b"2",
+        str(BOB).encode(): b"1",
+    }
+    assert scheduled == []
+
+
+def test_task_queued_by_previous_release_is_accepted(monkeypatch):
+    sent = []
+
+    async def send(chat_id):
+        sent.append(chat_id)
+        return 0
+
+    monkeypatch.setattr(notifications, "async_send_notification", send)
+
+    notifications.send_notification.run(7, "old message text")
+
+    assert sent == [7]
@@ -0,0 +1,80 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.orders import (
+    ASSIGNED_ROLE,
+    CREATED_ROLE,
+    counter_deltas,
+    counters_upsert_query,
+    user_orders_query,
+)
+from app.tasks.order_counters import counter_drift_query
+
+CUSTOMER, PERFORMER, OTHER = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+def test_created_order_counts_for_customer_and_assignee():
+    assert counter_deltas(None, (CUSTOMER, PERFORMER, 1)) == {
+        (CUSTOMER, CREATED_ROLE, 1): 1,
+        (PERFORMER, ASSIGNED_ROLE, 1): 1,
+    }
+
+
+def test_status_change_moves_counts_between_statuses():
+    assert counter_deltas((CUSTOMER, PERFORMER, 2), (CUSTOMER, PERFORMER, 3)) == {
+        (CUSTOMER, CREATED_ROLE, 2): -1,
+        (CUSTOMER, CREATED_ROLE, 3): 1,
+        (PERFORMER, ASSIGNED_ROLE, 2): -1,
+        (PERFORMER, ASSIGNED_ROLE, 3): 1,
+    }
+
+
+def test_reassignment_only_touches_assignees():
+    assert counter_deltas((CUSTOMER, PERFORMER, 2), (CUSTOMER, OTHER, 2)) == {
+        (PERFORMER, ASSIGNED_ROLE, 2): -1,
+        (OTHER, ASSIGNED_ROLE, 2): 1,
+    }
+
+
+def test_unchanged_order_needs_no_write():
+    assert counter_deltas((CUSTOMER, None, 1), (CUSTOMER, None, 1)) == {}
+
+
+def test_deleted_order_is_subtracted():
+    assert counter_deltas((CUSTOMER, None, 1), None) == {
+        (CUSTOMER, CREATED_ROLE, 1): -1
+    }
+
+
+def test_counters_are_incremented_in_one_statement():
+    deltas = counter_deltas((CUSTOMER, PERFORMER, 2), (CUSTOMER, PERFORMER, 3))
+    sql = str(counters_upsert_query(deltas).compile(dialect=postgresql.dialect()))
+
+    assert sql.count("INSERT INTO user_order_counters") == 1
+    assert "ON CONFLICT (user_id, role, status_id) DO UPDATE" in sql
+    assert "count = (user_order_counters.count + excluded.count)" in sql
+
+
+def test_user_orders_are_keyset_paginated():
+    sql = str(
+        user_orders_query(
+            PERFORMER, ASSIGNED_ROLE, datetime(2025, 1, 1), uuid.uuid4()
+        ).compile(dialect=postgresql.dialect())
+    )
+
+    assert "WHERE orders.assign_to = " in sql
+    assert "(orders.created_at, orders.id) <" in sql
+    assert "ORDER BY orders.created_at DESC, orders.id DESC" in sql
+
+
+def test_rebuild_reads_only_drifted_counters():
+    sql = str(counter_drift_query().compile(dialect=postgresql.dialect()))
+
+    assert "FULL OUTER JOIN user_order_counters" in sql
+    assert "AS drift" in sql
+    assert sql.rstrip().endswith(
+        "!= coalesce(user_order_counters.count, %(coalesce_2)s)"
+    )
+    assert "LOCK TABLE" not in sql
@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.orders import feed_query, is_open, matching_performers_query
+from app.tasks import outbox
+
+
+def compile_sql(query) -> str:
+    return str(
+        query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True}
+        )
+    )
+
+
+def test_feed_reads_partial_index_per_skill():
+    sql = compile_sql(
+        feed_query(uuid.uuid4(), datetime(2025, 1, 1), uuid.uuid4(), limit=20)
+    )
+
+    assert "JOIN LATERAL" in sql
+    assert "order_skills.skill_id = skills.skill_id AND order_skills.is_open" in sql
+    assert "(order_skills.created_at, order_skills.order_id) <" in sql
+    assert "ORDER BY order_skills.created_at DESC, order_skills.order_id DESC" in sql
+    assert sql.count("LIMIT") == 2
+
+
+def test_first_feed_page_has_no_cursor():
+    sql = compile_sql(feed_query(uuid.uuid4()))
+
+    assert "order_skills.created_at, order_skills.order_id) <" not in sql
+
+
+def test_performers_are_paged_by_id():
+    sql = compile_sql(matching_performers_query([1, 2], uuid.uuid4(), uuid.uuid4()))
+
+    assert (
+        "user_skills_connector.skill_id IN (%(skill_id_1_1)s, %(skill_id_1_2)s)" in sql
+    )
+    assert "user_skills_connector.user_id >" in sql
+    assert sql.endswith("ORDER BY users.id")
+
+
+def test_only_new_unassigned_orders_are_open():
+    assert is_open(1, None)
+    assert not is_open(1, uuid.uuid4())
+    assert not is_open(2, None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "payload, scheduled",
+    [
+        ({"order_id": "o", "status_id": 1, "assign_to": None, "skills": [1]}, ["o"]),
+        ({"order_id": "o", "status_id": 1, "assign_to": None, "skills": []}, []),
+        ({"order_id": "o", "status_id": 1, "assign_to": "u", "skills": [1]}, []),
+        ({"order_id": "o", "status_id": 1, "assign_to": None}, []),
+    ],
+)
+async def test_fanout_is_scheduled_for_open_orders_with_skills(
+    payload, scheduled, monkeypatch
+):
+    calls = []
+
+    class FakeTask:
+        def delay(self, order_id):
+            calls.append(order_id)
+
+    monkeypatch.setattr(outbox, "notify_matching_performers", FakeTask())
+
+    await outbox.schedule_skill_fanout(payload)
+
+    assert calls == scheduled
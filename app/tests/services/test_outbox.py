@@ -0,0 +1,148 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.outbox import OutboxEvent
+from app.services.outbox import (
+    MESSAGE_CREATED,
+    ORDER_UPDATED,
+    add_event,
+    done_key,
+    pending_events_query,
+    stream_key,
+)
+from app.tasks import outbox
+
+
+def make_event(event_id, topic=MESSAGE_CREATED, payload=None):
+    return OutboxEvent(
+        id=event_id,
+        topic=topic,
+        aggregate_id=str(event_id),
+        payload=payload or {"n": event_id},
+        attempts=0,
+    )
+
+
+def test_event_payload_is_json_ready(db_session):
+    order_id = uuid.uuid4()
+    deadline = datetime(2025, 5, 1, 12, 0)
+
+    add_event(
+        db_session,
+        ORDER_UPDATED,
+        {"order_id": order_id, "deadline": deadline},
+        order_id,
+    )
+
+    [event] = db_session.added
+    assert event.aggregate_id == str(order_id)
+    assert event.payload == {
+        "order_id": str(order_id),
+        "deadline": "2025-05-01T12:00:00",
+    }
+
+
+def test_pending_events_skip_dead_and_postponed_events():
+    sql = str(pending_events_query(100, 42).compile(dialect=postgresql.dialect()))
+
+    assert "outbox_events.dead_at IS NULL" in sql
+    assert "outbox_events.retry_at <= now()" in sql
+    assert "outbox_events.id >" in sql
+    assert "ORDER BY outbox_events.id" in sql
+    assert sql.endswith("FOR UPDATE SKIP LOCKED")
+
+
+@pytest.mark.asyncio
+async def test_publish_writes_streams_and_runs_handlers(redis_client, monkeypatch):
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    monkeypatch.setattr(outbox, "HANDLERS", {MESSAGE_CREATED: [handler]})
+    events = [
+        OutboxEvent(id=1, topic=MESSAGE_CREATED, aggregate_id="7", payload={"a": 1}),
+        OutboxEvent(id=2, topic=ORDER_UPDATED, aggregate_id="x", payload={"b": 2}),
+    ]
+
+    assert await outbox.publish(events) == {}
+
+    [(_, fields)] = await redis_client.xrange(stream_key(MESSAGE_CREATED))
+    assert fields[b"id"] == b"1"
+    assert json.loads(fields[b"payload"]) == {"a": 1}
+    assert await redis_client.xlen(stream_key(ORDER_UPDATED)) == 1
+    assert handled == [{"a": 1}]
+
+
+@pytest.mark.asyncio
+async def test_redelivered_event_is_not_published_or_handled_twice(
+    redis_client, monkeypatch
+):
+    handled = []
+
+    async def handler(payload):
+        handled.append(payload)
+
+    monkeypatch.setattr(outbox, "HANDLERS", {MESSAGE_CREATED: [handler]})
+
+    # ретранслятор упал после публикации, до удаления строки
+    await outbox.publish([make_event(1)])
+    await outbox.publish([make_event(1)])
+
+    assert await redis_client.xlen(stream_key(MESSAGE_CREATED)) == 1
+    assert handled == [{"n": 1}]
+
+
+@pytest.mark.asyncio
+async def test_failing_handler_postpones_only_its_event(
+    redis_client, db_session, fake_pg, monkeypatch
+):
+    handled = []
+
+    async def handler(payload):
+        if payload["n"] == 1:
+            raise RuntimeError("broker down")
+        handled.append(payload)
+
+    monkeypatch.setattr(outbox, "HANDLERS", {MESSAGE_CREATED: [handler]})
+    monkeypatch.setattr(outbox, "PgSingleton", fake_pg)
+    failing, delivered = make_event(1), make_event(2)
+    db_session.results = [[failing, delivered]]
+
+    assert await outbox.async_relay_outbox(batch_size=10) == 1
+
+    assert handled == [{"n": 2}]
+    [_, delete_sql] = db_session.executed
+    assert delete_sql.startswith("DELETE FROM outbox_events")
+    assert db_session.commits == 1
+    assert failing.attempts == 1
+    assert "broker down" in failing.last_error
+    assert failing.retry_at > datetime.utcnow()
+    assert failing.dead_at is None
+    # отметка снята: при следующей попытке обработчик будет вызван снова
+    assert not await redis_client.exists(done_key(1, "handler"))
+    assert await redis_client.exists(done_key(2, "handler"))
+
+
+@pytest.mark.asyncio
+async def test_event_goes_to_dead_letter_after_max_attempts(
+    redis_client, db_session, fake_pg, monkeypatch
+):
+    async def handler(payload):
+        raise RuntimeError("bad payload")
+
+    monkeypatch.setattr(outbox, "HANDLERS", {MESSAGE_CREATED: [handler]})
+    monkeypatch.setattr(outbox, "PgSingleton", fake_pg)
+    event = make_event(1)
+    event.attempts = outbox.OUTBOX_MAX_ATTEMPTS - 1
+    db_session.results = [[event]]
+
+    assert await outbox.async_relay_outbox(batch_size=10) == 0
+
+    assert event.attempts == outbox.OUTBOX_MAX_ATTEMPTS
+    assert event.dead_at is not None
+    assert len(db_session.executed) == 1
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from app.services.presence import PresenceCoalescer
+
+
+@pytest.mark.asyncio
+async def test_coalescer_merges_events_per_chat():
+    published = []
+
+    async def publish(chat_id, events):
+        published.append((chat_id, events))
+
+    coalescer = PresenceCoalescer(publish)
+    coalescer.INTERVAL = 0.01
+    for _ in range(50):
+        coalescer.add(1, "typing", "alice", True)
+        coalescer.add(1, "typing", "bob", True)
+    coalescer.add(1, "typing", "alice", False)
+    coalescer.add(1, "presence", "bob", True)
+    coalescer.add(2, "typing", "carol", True)
+    await asyncio.sleep(0.05)
+
+    assert sorted(published, key=lambda event: event[0]) == [
+        (1, {"typing": {"alice": False, "bob": True}, "presence": {"bob": True}}),
+        (2, {"typing": {"carol": True}}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_coalescer_starts_new_window_after_flush():
+    published = []
+
+    async def publish(chat_id, events):
+        published.append(events)
+
+    coalescer = PresenceCoalescer(publish)
+    coalescer.INTERVAL = 0.01
+    coalescer.add(1, "typing", "alice", True)
+    await asyncio.sleep(0.03)
+    coalescer.add(1, "typing", "alice", False)
+    await asyncio.sleep(0.03)
+
+    assert published == [{"typing": {"alice": True}}, {"typing": {"alice": False}}]
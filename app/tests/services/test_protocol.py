@@ -0,0 +1,61 @@
+import uuid
+import pytest
+from app.utils.websocket.protocol import (
+    JSON,
+    LEGACY,
+    MSGPACK,
+    ProtocolError,
+    envelope,
+    negotiate,
+)
+
+
+class FakeWebSocket:
+    def __init__(self, subprotocols=(), query_params=None):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.query_params = query_params or {}
+
+
+@pytest.mark.parametrize("codec", [JSON, MSGPACK])
+def test_roundtrip_single_and_batch(codec):
+    user_id = uuid.uuid4()
+    message = envelope("message", 7, {"user_id": user_id, "message": "hi"}, "c-1")
+    typing = envelope("typing", 7, {"typing": {str(user_id): True}})
+
+    (frame,) = codec.encode([message])
+    (decoded,) = codec.decode(frame)
+    assert decoded["cmid"] == "c-1"
+    assert decoded["payload"] == {"user_id": str(user_id), "message": "hi"}
+
+    (batch,) = codec.encode([message, typing])
+    assert [item["type"] for item in codec.decode(batch)] == ["message", "typing"]
+
+
+def test_legacy_format_is_unchanged():
+    payload = {"message_id": 1, "user_id": "u", "username": "bob", "message": "hi"}
+    frames = LEGACY.encode([envelope("message", 3, payload), envelope("ping")])
+    assert frames == [
+        "ws_data: {'chat_id': 3, 'message_id': 1, 'user_id': 'u', "
+        "'username': 'bob', 'message': 'hi'}",
+        '{"type": "ping"}',
+    ]
+    assert LEGACY.decode('{"type": "typing", "active": false}')[0]["type"] == "typing"
+    assert LEGACY.decode('{"text": 1}')[0]["payload"] == {"message": '{"text": 1}'}
+
+
+def test_invalid_frames():
+    with pytest.raises(ProtocolError):
+        JSON.decode("not json")
+    with pytest.raises(ProtocolError):
+        JSON.decode('{"v": 2, "type": "message"}')
+    with pytest.raises(ProtocolError):
+        MSGPACK.decode("text frame")
+
+
+def test_negotiate():
+    assert negotiate(FakeWebSocket(["x", "iplance.v1.msgpack"])) == (
+        MSGPACK,
+        "iplance.v1.msgpack",
+    )
+    assert negotiate(FakeWebSocket(query_params={"format": "json"})) == (JSON, None)
+    assert negotiate(FakeWebSocket()) == (LEGACY, None)
@@ -0,0 +1,28 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.users import UsersApi
+from app.schemas.users import ReviewCreate
+
+CUSTOMER, PERFORMER = uuid.uuid4(), uuid.uuid4()
+
+
+@pytest.mark.asyncio
+async def test_review_requires_completed_order(db_session, fake_pg, monkeypatch):
+    monkeypatch.setattr(UsersApi, "db_connection", fake_pg())
+    # исполнитель существует, завершённого заказа нет
+    db_session.results = [[SimpleNamespace(id=PERFORMER)], [False]]
+
+    with pytest.raises(HTTPException) as error:
+        await UsersApi().create_review(
+            PERFORMER,
+            ReviewCreate(text="ok", score=5),
+            current_user=SimpleNamespace(id=CUSTOMER),
+        )
+
+    assert error.value.status_code == 403
+    assert "orders.status_id" in db_session.executed[-1]
+    assert db_session.added == []
@@ -0,0 +1,77 @@
+import time
+import pytest
+from app.utils.websocket.protocol import CODECS
+from app.utils.websocket.websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    scope = {"subprotocols": []}
+    query_params = {}
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+
+def add_connection(manager, user_id, idle_for=0, chat_id=None):
+    websocket = FakeWebSocket()
+    manager.active_connections.setdefault(user_id, []).append(websocket)
+    manager.last_activity[websocket] = time.monotonic() - idle_for
+    if chat_id is not None:
+        manager.chats[websocket] = chat_id
+    return websocket
+
+
+@pytest.mark.asyncio
+async def test_reap_closes_idle_and_pings_alive():
+    manager = ConnectionManager()
+    idle = add_connection(manager, "alice", idle_for=manager.IDLE_TIMEOUT + 1)
+    alive = add_connection(manager, "alice")
+
+    await manager.reap()
+
+    assert idle.close_code == 1001
+    assert alive.sent == ['{"type": "ping"}']
+    assert manager.active_connections == {"alice": [alive]}
+    assert manager.connection_count == 1
+
+
+@pytest.mark.asyncio
+async def test_successful_ping_keeps_legacy_client_alive():
+    manager = ConnectionManager()
+    almost_idle = manager.IDLE_TIMEOUT - 1
+    legacy = add_connection(manager, "alice", idle_for=almost_idle)
+    versioned = add_connection(manager, "bob", idle_for=almost_idle)
+    manager.codecs[versioned] = CODECS["json"]
+
+    await manager.reap()
+
+    # старый клиент не умеет pong: активность - успешная отправка ping
+    assert manager.last_activity[legacy] > time.monotonic() - 1
+    assert manager.last_activity[versioned] < time.monotonic() - almost_idle + 1
+
+
+@pytest.mark.asyncio
+async def test_drain_closes_with_reconnect_hint():
+    manager = ConnectionManager()
+    websocket = add_connection(manager, "bob")
+
+    await manager.drain(retry_after=3)
+
+    assert manager.draining
+    assert websocket.close_code == 1012
+    assert '"retry_after": 3' in websocket.sent[0]
+    assert manager.connection_count == 0
+
+    rejected = FakeWebSocket()
+    assert not await manager.connect(rejected, "bob")
+    assert rejected.close_code == 1012
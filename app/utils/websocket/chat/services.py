@@ -1,35 +1,105 @@
 import datetime
+import logging
+import os
 
-from sqlalchemy import select
+from sqlalchemy import update
 from app.models.chat import Chat, Message
 from app.api.base import BaseApi
+from app.services.chat import messages_page_query
+from app.services.decryption import message_decryptor
+from app.services.chat_cache import ChatCache
+from app.services.outbox import MESSAGE_CREATED, add_event
+from app.services.search import index_message
+
+logger = logging.getLogger(__name__)
+chat_cache = ChatCache()
+REPLAY_LIMIT = int(os.getenv("WS_REPLAY_LIMIT", 500))
 
 
 async def validate_chat_and_user(db, chat_id: int, user_id) -> Chat:
     """
     Проверяет существование чата и принадлежность пользователя к чату.
+    Состав участников берётся из кэша ChatCache.
     """
-    chat = await db.execute(select(Chat).where(Chat.id == chat_id))
-    chat = chat.scalars().first()
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise ValueError("Чат не найден.")
-    if user_id not in [chat.customer_id, chat.performer_id]:
+    if not await chat_cache.is_member(db, chat_id, user_id):
         raise ValueError("Пользователь не найден.")
     return chat
 
 
 async def save_message(db, chat_id: int, sender_id, content: str) -> Message:
     """
-    Сохраняет сообщение в базе данных.
+    Сохраняет сообщение в базе данных
+    и в той же транзакции обновляет последнее сообщение чата
+    и записывает слепой индекс для поиска
+    и событие outbox для уведомлений.
     """
-    encrypted_content = BaseApi.security.cipher.encrypt(content.encode()).decode()
     message = Message(
         chat_id=chat_id,
         sender_id=sender_id,
-        content=encrypted_content,
+        payload=BaseApi.security.message_cipher.encrypt(content),
         created_at=datetime.datetime.utcnow(),
     )
     db.add(message)
+    await db.flush()
+    await index_message(db, chat_id, message.id, content)
+    await db.execute(
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .values(last_message_at=message.created_at, last_message_id=message.id)
+    )
+    add_event(
+        db,
+        MESSAGE_CREATED,
+        {"chat_id": chat_id, "message_id": message.id, "sender_id": sender_id},
+        aggregate_id=chat_id,
+    )
     await db.commit()
     await db.refresh(message)
+    try:
+        await chat_cache.push(message)
+    except Exception as e:
+        logger.error(f"Ошибка записи сообщения в кэш чата {chat_id}: {e}")
     return message
+
+
+async def get_missed_messages(
+    db, chat_id: int, user_id, last_message_id: int
+) -> tuple[list[dict], bool]:
+    """
+    Сообщения чата новее last_message_id в хронологическом порядке.
+    Сначала читается кэш последних сообщений, если он не покрывает
+    пропуск - индексный диапазон в БД.
+    Второй элемент результата - признак того, что пропущено больше
+    REPLAY_LIMIT сообщений и остальное нужно догрузить через API.
+    """
+    cached = await chat_cache.get_after(chat_id, last_message_id)
+    if cached is not None:
+        messages = [
+            (item["id"], item["sender_id"], chat_cache.ciphertext(item))
+            for item in cached
+        ]
+    else:
+        rows = await db.execute(
+            messages_page_query(
+                chat_id, user_id, after_id=last_message_id, limit=REPLAY_LIMIT + 1
+            )
+        )
+        messages = [
+            (row.id, row.sender_id, row.ciphertext) for row in rows.scalars().all()
+        ]
+    truncated = len(messages) > REPLAY_LIMIT
+    messages = messages[:REPLAY_LIMIT]
+    texts = await message_decryptor.decrypt_many(
+        (message_id, ciphertext) for message_id, _, ciphertext in messages
+    )
+    return [
+        {
+            "message_id": message_id,
+            "user_id": sender_id,
+            "message": text,
+        }
+        for (message_id, sender_id, _), text in zip(messages, texts)
+    ], truncated
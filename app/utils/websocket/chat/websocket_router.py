@@ -1,44 +1,202 @@
+import asyncio
+import logging
+import os
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.core.database import PgSingleton
+from app.services.delivery import UnreadCounters
+from app.services.presence import Presence, PresenceCoalescer
 from app.utils.websocket.chat.services import (
+    chat_cache,
     validate_chat_and_user,
     save_message,
+    get_missed_messages,
 )
+from app.utils.websocket.protocol import ProtocolError, envelope, receive_frame
 from app.utils.websocket.websocket_manager import (
+    CLOSE_POLICY_VIOLATION,
     ConnectionManager,
     get_current_user_websocket,
 )
 
+logger = logging.getLogger(__name__)
+DRAIN_TIMEOUT = float(os.getenv("WS_DRAIN_TIMEOUT", 10))
+DRAIN_RETRY_AFTER = int(os.getenv("WS_DRAIN_RETRY_AFTER", 5))
+REPLAY_BATCH_SIZE = 100
+
 router = APIRouter()
 manager = ConnectionManager()
+unread_counters = UnreadCounters()
+presence = Presence()
+# задачи обработчиков открытых сокетов, их дожидается drain_websockets
+active_sessions: set[asyncio.Task] = set()
+
+
+async def publish_presence(chat_id: int, events: dict):
+    """Отправляет склеенные события присутствия и набора участникам в сети."""
+    async with PgSingleton().session as db:
+        members = await chat_cache.get_members(db, chat_id)
+    await manager.fan_out(
+        [envelope(kind, chat_id, {kind: states}) for kind, states in events.items()],
+        members,
+        queue_offline=False,
+    )
+
+
+presence_events = PresenceCoalescer(publish_presence)
+
+
+async def send_chat_state(websocket: WebSocket, db, chat_id: int):
+    """Присутствие участников и кто сейчас печатает - сразу после подключения."""
+    members = await chat_cache.get_members(db, chat_id)
+    statuses = await presence.get_many(members)
+    typing = await presence.get_typing(chat_id, members)
+    state = {
+        "presence": {
+            str(member): status["online"] for member, status in statuses.items()
+        },
+        "typing": {str(member): True for member in typing},
+    }
+    await manager.send(websocket, [envelope("state", chat_id, state)])
+
+
+async def replay_missed(websocket: WebSocket, db, chat_id: int, user_id, after_id):
+    """Досылает пропущенные сообщения пачками по REPLAY_BATCH_SIZE в одном фрейме."""
+    missed, truncated = await get_missed_messages(db, chat_id, user_id, after_id)
+    envelopes = [envelope("message", chat_id, payload) for payload in missed]
+    if truncated:
+        envelopes.append(
+            envelope("replay_truncated", chat_id, {"replay_truncated": True})
+        )
+    for start in range(0, len(envelopes), REPLAY_BATCH_SIZE):
+        await manager.send(websocket, envelopes[start : start + REPLAY_BATCH_SIZE])
+
+
+async def handle_message(item: dict, chat_id: int, user) -> bool:
+    """
+    Сохраняет сообщение клиента и рассылает его участникам чата.
+    Возвращает False, если пользователь больше не участник чата:
+    состав группы может меняться, пока открыт сокет.
+    """
+    text = item["payload"].get("message")
+    if not isinstance(text, str) or not text:
+        return True
+    async with PgSingleton().session as db:
+        # без копии в памяти: удаление из группы в другом процессе
+        # должно запрещать отправку сразу
+        members = await chat_cache.get_members(db, chat_id, local=False)
+        if user.id not in members:
+            return False
+        if await presence.set_typing(chat_id, user.id, False):
+            presence_events.add(chat_id, "typing", user.id, False)
+        message = await save_message(db, chat_id, user.id, text)
+    # у кого чат открыт, тот получит сообщение сразу и прочитает его
+    await unread_counters.increment(
+        chat_id, members - {user.id} - manager.viewers(chat_id, members)
+    )
+    payload = {
+        "message_id": message.id,
+        "user_id": user.id,
+        "username": user.username,
+        "message": text,
+    }
+    await manager.fan_out(
+        [envelope("message", chat_id, payload, cmid=item.get("cmid"))], members
+    )
+    return True
+
+
+async def handle_control(item: dict, chat_id: int, user_id):
+    if item["type"] == "typing":
+        is_typing = bool(item["payload"].get("active", True))
+        if await presence.set_typing(chat_id, user_id, is_typing):
+            presence_events.add(chat_id, "typing", user_id, is_typing)
 
 
 @router.websocket("/ws/chat/{chat_id}")
-async def websocket_endpoint(websocket: WebSocket, token: str, chat_id: int):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str,
+    chat_id: int,
+    last_message_id: Optional[int] = None,
+):
+    """
+    Чат по WebSocket, формат фреймов описан в app.utils.websocket.protocol.
+    При переподключении клиент передаёт last_message_id - ID последнего
+    полученного сообщения, и сервер досылает только пропущенные.
+    Конверты typing, heartbeat и pong - служебные, они обновляют набор
+    текста и присутствие и в чат не сохраняются.
+    Сессия БД открывается на каждую операцию и не держит соединение
+    из пула, пока сокет простаивает.
+    """
+    user = await get_current_user_websocket(token)
+    if not user:
+        return
     try:
         async with PgSingleton().session as db:
-            user = await get_current_user_websocket(token)
-            if user:
-                chat = await validate_chat_and_user(db, chat_id, user.id)
-                await manager.connect(websocket, user.id)
-                await manager.broadcast(
-                    f"Пользователь {user.username} присоединился к чату."
-                )
-                while True:
-                    data = await websocket.receive_text()
-                    if data:
-                        await save_message(db, chat.id, user.id, data)
-                        result_data = {
-                            "user_id": user.id,
-                            "username": user.username,
-                            "message": data,
-                        }
-                        await manager.broadcast(f"ws_data: {result_data}")
-
+            chat = await validate_chat_and_user(db, chat_id, user.id)
     except ValueError as e:
-        await manager.broadcast(str(e))
-        await manager.disconnect(websocket, user.id)
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason=str(e))
+        return
+    if not await manager.connect(
+        websocket, user.id, chat_id, replaying=last_message_id is not None
+    ):
+        return
+    codec = manager.codecs[websocket]
+    session = asyncio.current_task()
+    active_sessions.add(session)
+    try:
+        await unread_counters.reset(user.id, chat.id)
+        async with PgSingleton().session as db:
+            if last_message_id is not None:
+                await replay_missed(websocket, db, chat.id, user.id, last_message_id)
+            await presence.heartbeat(user.id)
+            await send_chat_state(websocket, db, chat.id)
+        presence_events.add(chat.id, "presence", user.id, True)
+        while True:
+            frame = await receive_frame(websocket)
+            manager.touch(websocket)
+            await presence.heartbeat(user.id)
+            try:
+                items = codec.decode(frame)
+            except ProtocolError as e:
+                await manager.send(
+                    websocket, [envelope("error", chat.id, {"detail": str(e)})]
+                )
+                continue
+            for item in items:
+                if item["type"] != "message":
+                    await handle_control(item, chat.id, user.id)
+                elif not await handle_message(item, chat.id, user):
+                    await websocket.close(
+                        code=CLOSE_POLICY_VIOLATION, reason="Not a chat member"
+                    )
+                    return
 
     except WebSocketDisconnect:
+        pass
+
+    finally:
+        active_sessions.discard(session)
         await manager.disconnect(websocket, user.id)
-        await manager.broadcast(f"Пользователь {user.username} покинул чат.")
+        try:
+            if await presence.set_typing(chat.id, user.id, False):
+                presence_events.add(chat.id, "typing", user.id, False)
+            if user.id not in manager.active_connections:
+                await presence.go_offline(user.id)
+                presence_events.add(chat.id, "presence", user.id, False)
+        except Exception as e:
+            logger.error(f"Ошибка обновления присутствия {user.id}: {e}")
+
+
+async def drain_websockets(timeout: float = DRAIN_TIMEOUT):
+    """
+    Остановка сервера: досылает склеенные события, закрывает сокеты
+    с подсказкой о переподключении и ждёт завершения их обработчиков,
+    пока соединения с БД и Redis ещё открыты.
+    """
+    manager.draining = True
+    await presence_events.flush()
+    await manager.drain(retry_after=DRAIN_RETRY_AFTER)
+    if active_sessions:
+        await asyncio.wait(list(active_sessions), timeout=timeout)
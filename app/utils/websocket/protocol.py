@@ -0,0 +1,179 @@
+"""
+Протокол WebSocket чата.
+
+Каждое событие - конверт:
+    {"v": 1, "type": "message", "chat": 42, "cmid": "...", "payload": {...}}
+    v       - версия протокола;
+    type    - тип события (message, typing, presence, state, ping, ...);
+    chat    - ID чата или None для служебных событий соединения;
+    cmid    - ID сообщения, присвоенный клиентом, возвращается в рассылке;
+    payload - данные события.
+
+Фрейм содержит один конверт или список конвертов (пакет).
+Формат выбирается при подключении подпротоколом Sec-WebSocket-Protocol
+(iplance.v1.json / iplance.v1.msgpack) или параметром ?format=json|msgpack.
+Клиенты без подпротокола получают прежний текстовый формат "ws_data: {...}".
+"""
+
+import json
+from datetime import datetime
+from uuid import UUID
+
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect
+
+PROTOCOL_VERSION = 1
+CONTROL_TYPES = ("typing", "heartbeat", "pong")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def envelope(
+    type: str, chat: int | None = None, payload: dict | None = None, cmid=None
+) -> dict:
+    return {
+        "v": PROTOCOL_VERSION,
+        "type": type,
+        "chat": chat,
+        "cmid": cmid,
+        "payload": payload or {},
+    }
+
+
+def _default(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unsupported type: {type(value).__name__}")
+
+
+def dumps(envelopes: list[dict]) -> str:
+    """JSON для хранения конвертов, например в очереди доставки."""
+    return json.dumps(envelopes, separators=(",", ":"), default=_default)
+
+
+def _validate(frame) -> list[dict]:
+    envelopes = frame if isinstance(frame, list) else [frame]
+    for item in envelopes:
+        if not isinstance(item, dict) or not isinstance(item.get("type"), str):
+            raise ProtocolError("Envelope must be an object with a type")
+        if item.get("v", PROTOCOL_VERSION) != PROTOCOL_VERSION:
+            raise ProtocolError(f"Unsupported protocol version: {item['v']}")
+        if not isinstance(item.setdefault("payload", {}), dict):
+            raise ProtocolError("Envelope payload must be an object")
+    return envelopes
+
+
+class JsonCodec:
+    name = "json"
+    subprotocol = "iplance.v1.json"
+    binary = False
+
+    def encode(self, envelopes: list[dict]) -> list[str]:
+        frame = envelopes[0] if len(envelopes) == 1 else envelopes
+        return [json.dumps(frame, separators=(",", ":"), default=_default)]
+
+    def decode(self, data: str | bytes) -> list[dict]:
+        try:
+            return _validate(json.loads(data))
+        except ValueError as e:
+            raise ProtocolError(str(e)) from e
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    subprotocol = "iplance.v1.msgpack"
+    binary = True
+
+    def encode(self, envelopes: list[dict]) -> list[bytes]:
+        frame = envelopes[0] if len(envelopes) == 1 else envelopes
+        return [msgpack.packb(frame, default=_default)]
+
+    def decode(self, data: str | bytes) -> list[dict]:
+        if isinstance(data, str):
+            raise ProtocolError("MessagePack frames must be binary")
+        try:
+            return _validate(msgpack.unpackb(data))
+        except (ValueError, msgpack.UnpackException) as e:
+            raise ProtocolError(str(e)) from e
+
+
+class LegacyCodec:
+    """
+    Прежний формат: текстовый фрейм "ws_data: {...}" на каждое событие чата,
+    служебные события - JSON. От клиента принимается текст сообщения
+    или JSON вида {"type": "typing"}.
+    """
+
+    name = "legacy"
+    subprotocol = None
+    binary = False
+
+    def encode(self, envelopes: list[dict]) -> list[str]:
+        frames = []
+        for item in envelopes:
+            if item["chat"] is None:
+                frames.append(
+                    json.dumps(
+                        {"type": item["type"], **item["payload"]}, default=_default
+                    )
+                )
+            else:
+                frames.append(
+                    f"ws_data: {dict(chat_id=item['chat'], **item['payload'])}"
+                )
+        return frames
+
+    def decode(self, data: str | bytes) -> list[dict]:
+        if isinstance(data, bytes):
+            data = data.decode()
+        if data.startswith("{"):
+            try:
+                frame = json.loads(data)
+            except ValueError:
+                frame = None
+            if isinstance(frame, dict) and frame.get("type") in CONTROL_TYPES:
+                return [envelope(frame["type"], payload=frame)]
+        return [envelope("message", payload={"message": data})]
+
+
+Codec = JsonCodec | MsgpackCodec | LegacyCodec
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+LEGACY = LegacyCodec()
+CODECS = {codec.name: codec for codec in (JSON, MSGPACK)}
+SUBPROTOCOLS = {codec.subprotocol: codec for codec in (JSON, MSGPACK)}
+
+
+def negotiate(websocket: WebSocket) -> tuple[Codec, str | None]:
+    """
+    Выбирает формат по первому поддерживаемому подпротоколу клиента,
+    затем по параметру format. Возвращает кодек и подпротокол для accept().
+    """
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        if subprotocol in SUBPROTOCOLS:
+            return SUBPROTOCOLS[subprotocol], subprotocol
+    codec = CODECS.get(websocket.query_params.get("format", ""), LEGACY)
+    return codec, None
+
+
+async def receive_frame(websocket: WebSocket) -> str | bytes:
+    """Текстовый или бинарный фрейм клиента."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("text") is not None:
+        return message["text"]
+    return message.get("bytes") or b""
+
+
+async def send_envelopes(websocket: WebSocket, codec: Codec, envelopes: list[dict]):
+    for frame in codec.encode(envelopes):
+        if codec.binary:
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
@@ -1,4 +1,8 @@
-from typing import List, Dict
+import asyncio
+import json
+import logging
+import time
+from typing import Iterable, List, Dict
 from uuid import UUID
 from sqlalchemy import func
 from fastapi import WebSocket
@@ -6,28 +10,239 @@ from jose import JWTError, jwt
 from sqlalchemy.future import select
 
 from app.core.database import PgSingleton
+from app.core.metrics import WS_CONNECTIONS, WS_REAPED
 from app.models.users import Users
+from app.services.delivery import DeliveryQueue
+from app.utils.websocket.protocol import (
+    LEGACY,
+    Codec,
+    dumps,
+    envelope,
+    negotiate,
+    send_envelopes,
+)
 import os
 
+logger = logging.getLogger(__name__)
+
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_SERVICE_RESTART = 1012
+CLOSE_TRY_AGAIN_LATER = 1013
+
 
 class ConnectionManager:
+    """
+    Подключения WebSocket текущего процесса.
+
+    Раз в PING_INTERVAL секунд всем подключениям отправляется ping,
+    а подключения, от которых ничего не приходило дольше IDLE_TIMEOUT
+    (в том числе полуоткрытые TCP-соединения), закрываются.
+    Клиенты старого формата не знают конвертов ping/pong, для них
+    активностью считается успешная отправка; мёртвые соединения таких
+    клиентов закрывает ping на уровне протокола (ws_ping_interval uvicorn).
+    Число подключений ограничено на пользователя и на процесс.
+    """
+
+    PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 20))
+    IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 60))
+    MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 5))
+    MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", 10000))
+
     def __init__(self):
         self.active_connections: Dict[UUID, List[WebSocket]] = {}
+        self.last_activity: Dict[WebSocket, float] = {}
+        self.codecs: Dict[WebSocket, Codec] = {}
+        # чат, открытый в подключении
+        self.chats: Dict[WebSocket, int] = {}
+        self.delivery_queue = DeliveryQueue()
+        self.draining = False
+        self._heartbeat_task: asyncio.Task | None = None
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.last_activity)
 
-    async def connect(self, websocket: WebSocket, user_id):
-        """Добавляет WebSocket подключение для конкретного пользователя."""
-        await websocket.accept()
-        if user_id not in self.active_connections:
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id,
+        chat_id: int | None = None,
+        replaying: bool = False,
+    ) -> bool:
+        """
+        Добавляет WebSocket подключение для конкретного пользователя,
+        chat_id - чат, который открыт в подключении.
+        Формат фреймов согласуется при подключении (см. protocol.negotiate).
+        Первое подключение пользователя получает сообщения,
+        накопленные в очереди доставки, пока он был не в сети.
+        replaying - клиент переподключился с last_message_id: сообщения
+        chat_id дошлёт replay_missed, и из очереди они не отправляются.
+        Возвращает False, если подключение отклонено из-за лимитов
+        или остановки сервера - сокет к этому моменту уже закрыт.
+        """
+        codec, subprotocol = negotiate(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        if self.draining:
+            await websocket.close(code=CLOSE_SERVICE_RESTART, reason="Server restart")
+            return False
+        user_connections = self.active_connections.get(user_id, [])
+        if (
+            self.connection_count >= self.MAX_CONNECTIONS
+            or len(user_connections) >= self.MAX_CONNECTIONS_PER_USER
+        ):
+            await websocket.close(
+                code=CLOSE_TRY_AGAIN_LATER, reason="Too many connections"
+            )
+            return False
+        is_first = user_id not in self.active_connections
+        if is_first:
             self.active_connections[user_id] = []
         self.active_connections[user_id].append(websocket)
+        self.last_activity[websocket] = time.monotonic()
+        self.codecs[websocket] = codec
+        if chat_id is not None:
+            self.chats[websocket] = chat_id
+        WS_CONNECTIONS.inc()
+        if is_first:
+            skip_chat = chat_id if replaying else None
+            try:
+                await self.delivery_queue.drain(
+                    user_id,
+                    lambda queued: self.send_queued(websocket, queued, skip_chat),
+                )
+            except Exception as e:
+                logger.error(f"Ошибка доставки очереди пользователю {user_id}: {e}")
+        return True
 
     async def disconnect(self, websocket: WebSocket, user_id):
         """Удаляет WebSocket подключение для конкретного пользователя."""
-        if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
+        if self.last_activity.pop(websocket, None) is not None:
+            WS_CONNECTIONS.dec()
+        self.codecs.pop(websocket, None)
+        self.chats.pop(websocket, None)
+        user_connections = self.active_connections.get(user_id)
+        if user_connections and websocket in user_connections:
+            user_connections.remove(websocket)
+            if not user_connections:
                 del self.active_connections[user_id]
 
+    async def send(self, websocket: WebSocket, envelopes: list[dict]):
+        """Отправляет конверты одному подключению в его формате."""
+        await send_envelopes(websocket, self.codecs.get(websocket, LEGACY), envelopes)
+
+    async def send_queued(
+        self, websocket: WebSocket, queued: list[str], skip_chat: int | None = None
+    ):
+        """
+        Отправляет пачку из очереди доставки одним фреймом.
+        Сообщения чата skip_chat пропускаются.
+        Записи старого формата (до конвертов) уходят как есть.
+        """
+        envelopes = []
+        for item in queued:
+            try:
+                envelopes.extend(
+                    queued_envelope
+                    for queued_envelope in json.loads(item)
+                    if queued_envelope["type"] != "message"
+                    or queued_envelope["chat"] != skip_chat
+                )
+            except ValueError:
+                await websocket.send_text(item)
+        if envelopes:
+            await self.send(websocket, envelopes)
+
+    def viewers(self, chat_id: int, user_ids: Iterable[UUID]) -> set:
+        """Пользователи из user_ids, у которых чат открыт в этом процессе."""
+        return {
+            user_id
+            for user_id in user_ids
+            if any(
+                self.chats.get(websocket) == chat_id
+                for websocket in self.active_connections.get(user_id, ())
+            )
+        }
+
+    def touch(self, websocket: WebSocket):
+        """Отмечает активность подключения: любой фрейм от клиента, включая pong."""
+        if websocket in self.last_activity:
+            self.last_activity[websocket] = time.monotonic()
+
+    def start(self):
+        """Запускает фоновые ping и закрытие неактивных подключений."""
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.PING_INTERVAL)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Ошибка проверки WebSocket подключений: {e}")
+
+    async def reap(self):
+        """Закрывает неактивные подключения и пингует остальные."""
+        deadline = time.monotonic() - self.IDLE_TIMEOUT
+        alive, idle = [], []
+        for user_id, user_connections in list(self.active_connections.items()):
+            for websocket in list(user_connections):
+                if self.last_activity.get(websocket, 0) < deadline:
+                    idle.append((user_id, websocket))
+                else:
+                    alive.append(websocket)
+        for user_id, websocket in idle:
+            await self.disconnect(websocket, user_id)
+            WS_REAPED.inc()
+            try:
+                await asyncio.wait_for(
+                    websocket.close(code=CLOSE_GOING_AWAY, reason="Idle timeout"),
+                    timeout=1,
+                )
+            except Exception:
+                # полуоткрытое соединение: закрыть вежливо уже не получится
+                pass
+        if idle:
+            logger.info(f"Закрыто неактивных WebSocket подключений: {len(idle)}")
+        failed = await self._send_many(alive, [envelope("ping")])
+        for websocket in alive:
+            if self.codecs.get(websocket, LEGACY) is LEGACY and websocket not in failed:
+                self.touch(websocket)
+
+    async def drain(self, retry_after: int = 5):
+        """
+        Остановка сервера: новые подключения больше не принимаются,
+        текущим отправляется подсказка о переподключении,
+        и они закрываются с кодом 1012 (service restart).
+        """
+        self.draining = True
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        reconnect = [envelope("reconnect", payload={"retry_after": retry_after})]
+        connections = [
+            (user_id, websocket)
+            for user_id, user_connections in self.active_connections.items()
+            for websocket in user_connections
+        ]
+
+        async def close(user_id, websocket: WebSocket):
+            codec = self.codecs.get(websocket, LEGACY)
+            await self.disconnect(websocket, user_id)
+            try:
+                await send_envelopes(websocket, codec, reconnect)
+                await websocket.close(
+                    code=CLOSE_SERVICE_RESTART, reason="Server restart"
+                )
+            except Exception:
+                pass
+
+        await asyncio.gather(
+            *(close(user_id, websocket) for user_id, websocket in connections)
+        )
+        logger.info(f"Закрыто WebSocket подключений при остановке: {len(connections)}")
+
     async def broadcast(self, message: str):
         """Отправляет сообщение всем активным подключениям."""
         for user_connections in self.active_connections.values():
@@ -35,13 +250,70 @@ class ConnectionManager:
                 await connection.send_text(message)
 
     async def send_personal_message(self, message: str, user_id):
-        """Отправляет сообщение конкретному пользователю, если он подключен."""
+        """
+        Отправляет сообщение конкретному пользователю, если он подключен,
+        иначе кладёт его в очередь доставки.
+        """
         if user_id in self.active_connections:
             for connection in self.active_connections[user_id]:
                 await connection.send_text(message)
         else:
-            # TODO нужны варианты доставки сообщения, если пользователь вне чата
-            pass
+            try:
+                await self.delivery_queue.enqueue(user_id, message)
+            except Exception as e:
+                logger.error(f"Ошибка постановки в очередь для {user_id}: {e}")
+
+    async def _send_many(
+        self, connections: list[WebSocket], envelopes: list[dict]
+    ) -> set[WebSocket]:
+        """
+        Параллельная отправка нескольким подключениям.
+        Фрейм кодируется один раз на формат, а не на каждое подключение.
+        Возвращает подключения, отправка в которые не удалась.
+        """
+        frames: Dict[str, list] = {}
+        sends, receivers = [], []
+        for websocket in connections:
+            codec = self.codecs.get(websocket, LEGACY)
+            if codec.name not in frames:
+                frames[codec.name] = codec.encode(envelopes)
+            send = websocket.send_bytes if codec.binary else websocket.send_text
+            for frame in frames[codec.name]:
+                sends.append(send(frame))
+                receivers.append(websocket)
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        failed = set()
+        for websocket, result in zip(receivers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка отправки сообщения: {result}")
+                failed.add(websocket)
+        return failed
+
+    async def fan_out(
+        self,
+        envelopes: list[dict],
+        user_ids: Iterable[UUID],
+        queue_offline: bool = True,
+    ):
+        """
+        Рассылает конверты участникам чата.
+        Подключённым отправка идёт параллельно, чтобы один медленный клиент
+        не задерживал остальных; не подключённым - одним пайплайном в очереди.
+        Служебные события (queue_offline=False) не подключённым не доставляются.
+        """
+        connections, offline = [], []
+        for user_id in user_ids:
+            if user_id in self.active_connections:
+                connections.extend(self.active_connections[user_id])
+            else:
+                offline.append(user_id)
+        if connections:
+            await self._send_many(connections, envelopes)
+        if offline and queue_offline:
+            try:
+                await self.delivery_queue.enqueue_many(offline, dumps(envelopes))
+            except Exception as e:
+                logger.error(f"Ошибка постановки в очередь: {e}")
 
 
 async def get_current_user_websocket(access_token) -> Users | None: